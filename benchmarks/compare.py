@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""Compare two benchmarks/run.py results and fail on regressions.
+
+    $ python benchmarks/compare.py baseline.json current.json --threshold 0.15
+
+Latencies (median_ms) regress when they grow, throughputs (*_per_s) when they
+shrink, by more than the threshold.
+"""
+
+import argparse
+import json
+import sys
+
+
+def metrics(results):
+    """Flatten results to {name: (value, higher_is_better)}."""
+    flat = {}
+    for bench, result in results.items():
+        if result.get("skipped"):
+            continue
+        for key, value in result.items():
+            if isinstance(value, dict) and "median_ms" in value:
+                flat[f"{bench}.{key}.median_ms"] = (value["median_ms"], False)
+            elif key.endswith("_per_s"):
+                flat[f"{bench}.{key}"] = (value, True)
+    return flat
+
+
+def compare(baseline, current, threshold):
+    """Return [(metric, before, after, change, regressed)] for the common metrics."""
+    before, after = metrics(baseline["results"]), metrics(current["results"])
+    rows = []
+    for name in sorted(set(before) & set(after)):
+        (old, higher_is_better), (new, _) = before[name], after[name]
+        change = (new - old) / old if old else 0.0
+        regressed = -change > threshold if higher_is_better else change > threshold
+        rows.append((name, old, new, change, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Allowed relative change (default 0.15).")
+    args = parser.parse_args()
+
+    with open(args.baseline) as fp:
+        baseline = json.load(fp)
+    with open(args.current) as fp:
+        current = json.load(fp)
+
+    rows = compare(baseline, current, args.threshold)
+    for name, old, new, change, regressed in rows:
+        mark = "🛑" if regressed else "  "
+        print(f"{mark} {name:40} {old:12.2f} {new:12.2f} {change:+8.1%}")
+
+    if any(row[-1] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
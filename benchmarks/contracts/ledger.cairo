@@ -0,0 +1,37 @@
+%lang starknet
+
+from starkware.cairo.common.cairo_builtins import HashBuiltin
+from starkware.cairo.common.uint256 import Uint256, uint256_add
+
+@storage_var
+func balances(account: felt) -> (amount: Uint256) {
+}
+
+@external
+func credit{syscall_ptr: felt*, pedersen_ptr: HashBuiltin*, range_check_ptr}(
+    account: felt, amount: Uint256
+) {
+    let (current) = balances.read(account);
+    let (updated, _) = uint256_add(current, amount);
+    balances.write(account, updated);
+    return ();
+}
+
+@external
+func credit_many{syscall_ptr: felt*, pedersen_ptr: HashBuiltin*, range_check_ptr}(
+    accounts_len: felt, accounts: felt*, amount: Uint256
+) {
+    if (accounts_len == 0) {
+        return ();
+    }
+    credit(accounts[0], amount);
+    return credit_many(accounts_len - 1, accounts + 1, amount);
+}
+
+@view
+func balance_of{syscall_ptr: felt*, pedersen_ptr: HashBuiltin*, range_check_ptr}(
+    account: felt
+) -> (amount: Uint256) {
+    let (amount) = balances.read(account);
+    return (amount=amount);
+}
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+"""Local stand-in for the StarkNet feeder gateway and gateway.
+
+It accepts every transaction, answers view calls with fixed values and reports
+transactions as ACCEPTED_ON_L2 after `accept_after` status queries, each in a
+block of its own where every call of an __execute__ emits an event (keys: the
+selector, data: the call's calldata). It is only meant to take the network out
+of sarayu benchmarks.
+
+    $ python benchmarks/mock_gateway.py --port 5055 --latency 5
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class MockState:
+    def __init__(self, latency=0.0, accept_after=1):
+        self.latency = latency
+        self.accept_after = accept_after
+        self.lock = threading.Lock()
+        self.nonces = {}
+        self.balances = {}
+        self.transactions = {}
+        self.counter = itertools.count(1)
+        self.block_number = 0
+        self.blocks = {}
+        self.classes = set()
+        # Block hashes change with every /load, as on a restored devnet.
+        self.epoch = 0
+
+    def add_transaction(self, tx):
+        with self.lock:
+            n = next(self.counter)
+            tx_hash = "0x" + hashlib.sha256(f"{n}:{json.dumps(tx, sort_keys=True)}".encode()).hexdigest()[:63]
+            self.transactions[int(tx_hash, 16)] = {"queries": 0, "tx": tx, "block_number": None}
+            response = {"code": "TRANSACTION_RECEIVED", "transaction_hash": tx_hash}
+            if tx.get("type") == "DEPLOY":
+                response["address"] = "0x" + hashlib.sha256(tx_hash.encode()).hexdigest()[:63]
+            if tx.get("type") == "DECLARE":
+                # Not the real class hash: the mock only remembers what was declared.
+                class_hash = "0x" + hashlib.sha256(json.dumps(tx["contract_class"]).encode()).hexdigest()[:63]
+                self.classes.add(int(class_hash, 16))
+                response["class_hash"] = class_hash
+            if "sender_address" in tx:
+                sender = int(tx["sender_address"], 16)
+                self.nonces[sender] = self.nonces.get(sender, 0) + 1
+            return response
+
+    def dump(self):
+        return {"nonces": self.nonces, "balances": self.balances, "block_number": self.block_number}
+
+    def load(self, dump):
+        with self.lock:
+            self.nonces = {int(k): v for k, v in dump["nonces"].items()}
+            self.balances = {int(k): v for k, v in dump["balances"].items()}
+            self.block_number = dump["block_number"]
+            self.transactions = {}
+            self.blocks = {}
+            self.epoch += 1
+
+    def tx_status(self, tx_hash):
+        with self.lock:
+            entry = self.transactions.get(int(tx_hash, 16))
+            if entry is None:
+                return {"tx_status": "NOT_RECEIVED"}
+            entry["queries"] += 1
+            if entry["queries"] < self.accept_after:
+                return {"tx_status": "RECEIVED"}
+            if entry["block_number"] is None:
+                self.block_number += 1
+                entry["block_number"] = self.block_number
+                self.blocks[self.block_number] = [(tx_hash, entry["tx"])]
+            return {"tx_status": "ACCEPTED_ON_L2", "block_number": entry["block_number"]}
+
+    def _block_hash(self, number):
+        return "0x" + hashlib.sha256(f"{self.epoch}:{number}".encode()).hexdigest()[:63]
+
+    def get_block(self, number):
+        with self.lock:
+            number = self.block_number if number in (None, "latest", "pending") else int(number)
+            if number > self.block_number:
+                return None
+            transactions, receipts = [], []
+            for index, (tx_hash, tx) in enumerate(self.blocks.get(number, [])):
+                transactions.append({"transaction_hash": tx_hash, **tx})
+                receipts.append({"transaction_index": index, "transaction_hash": tx_hash,
+                                 "events": _execute_events(tx), "actual_fee": "0x0"})
+            return {"block_number": number, "block_hash": self._block_hash(number),
+                    "parent_block_hash": self._block_hash(number - 1), "status": "ACCEPTED_ON_L2",
+                    "gas_price": hex(GAS_PRICE),
+                    "timestamp": 1660000000 + number, "transactions": transactions,
+                    "transaction_receipts": receipts}
+
+
+# Fees: a fixed gas price, and gas growing with the calldata.
+GAS_PRICE = 100000000000
+
+
+def estimate_fee(tx):
+    gas_usage = 2000 + 10 * len(tx.get("calldata", []))
+    return {"overall_fee": gas_usage * GAS_PRICE, "gas_price": GAS_PRICE, "gas_usage": gas_usage, "unit": "wei"}
+
+
+def _execute_events(tx):
+    """One event per call of an __execute__ calldata: [calls, (to, selector, offset, len)*, len, data*]."""
+    calldata = [int(str(x), 0) for x in tx.get("calldata", [])]
+    if "sender_address" not in tx or len(calldata) == 0:
+        return []
+    calls = calldata[0]
+    data = calldata[2 + 4 * calls:]
+    events = []
+    for i in range(calls):
+        to, selector, offset, length = calldata[1 + 4 * i:5 + 4 * i]
+        events.append({"from_address": hex(to), "keys": [hex(selector)],
+                       "data": [hex(x) for x in data[offset:offset + length]]})
+    return events
+
+
+class MockGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately: without this, Nagle's algorithm
+    # and delayed ACKs add ~40ms to every keep-alive request.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, method):
+        state = self.server.state
+        if state.latency:
+            time.sleep(state.latency)
+
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        body = None
+        if method == "POST":
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+
+        path = url.path.rstrip("/")
+        if path == "/is_alive":
+            return self._reply("Alive!!!")
+        if path == "/feeder_gateway/call_contract":
+            return self._reply({"result": ["0x2a", "0x0"]})
+        if path == "/feeder_gateway/get_nonce":
+            address = int(query["contractAddress"], 16)
+            return self._reply(hex(state.nonces.get(address, 0)))
+        if path == "/feeder_gateway/get_transaction_status":
+            return self._reply(state.tx_status(query["transactionHash"]))
+        if path == "/feeder_gateway/get_block":
+            block = state.get_block(query.get("blockNumber"))
+            if block is None:
+                return self._reply({"code": "StarknetErrorCode.BLOCK_NOT_FOUND",
+                                    "message": "Block number not found"}, 500)
+            return self._reply(block)
+        if path == "/dump":
+            with state.lock, open(body["path"], "w") as fp:
+                json.dump(state.dump(), fp)
+            return self._reply({})
+        if path == "/load":
+            with open(body["path"]) as fp:
+                state.load(json.load(fp))
+            return self._reply({})
+        if path == "/mint":
+            with state.lock:
+                address = int(body["address"], 16)
+                state.balances[address] = state.balances.get(address, 0) + body["amount"]
+                return self._reply({"new_balance": state.balances[address], "unit": "wei"})
+        if path == "/feeder_gateway/get_class_by_hash":
+            if int(query["classHash"], 16) not in state.classes:
+                return self._reply({"code": "StarknetErrorCode.UNDECLARED_CLASS",
+                                    "message": "Class is not declared"}, 500)
+            return self._reply({"abi": []})
+        if path == "/feeder_gateway/estimate_fee":
+            return self._reply(estimate_fee(body))
+        if path == "/feeder_gateway/estimate_fee_bulk":
+            return self._reply([estimate_fee(tx) for tx in body])
+        if path == "/gateway/add_transaction":
+            return self._reply(state.add_transaction(body))
+        return self._reply({"code": "StarknetErrorCode.UNKNOWN", "message": f"no route {path}"}, 404)
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+
+def start_mock_gateway(host="127.0.0.1", port=0, latency=0.0, accept_after=1):
+    """Start the mock gateway in a background thread. Returns (server, url)."""
+    # Listen backlog large enough for concurrent benchmark clients (the default is 5).
+    ThreadingHTTPServer.request_queue_size = 128
+    server = ThreadingHTTPServer((host, port), MockGatewayHandler)
+    server.daemon_threads = True
+    server.state = MockState(latency, accept_after)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--latency", type=float, default=0.0, help="Added latency per request, in ms.")
+    parser.add_argument("--accept-after", type=int, default=1)
+    args = parser.parse_args()
+
+    server, url = start_mock_gateway(args.host, args.port, args.latency / 1000, args.accept_after)
+    print(f"mock gateway listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
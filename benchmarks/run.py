@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+"""Latency and throughput benchmarks for sarayu commands.
+
+Everything runs offline against benchmarks/mock_gateway.py, in a temporary
+workspace seeded with the sample contracts of benchmarks/contracts.
+
+- cold: a fresh `sarayu` process per command (what a shell script pays)
+- warm: the command function called in-process (shell / daemon mode)
+- throughput: sequential invokes versus one invoke-batch of the same calls
+
+    $ python benchmarks/run.py --output bench.json
+    $ python benchmarks/compare.py baseline.json bench.json --threshold 0.15
+
+Benchmarks that need starkware (selectors, signing, class hashes) or
+starknet-compile are reported as skipped when those are not installed.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from mock_gateway import start_mock_gateway  # noqa: E402
+
+PRIVATE_KEY = "0x1234567890abcdef"
+CONTRACTS = ("balance", "ledger")
+
+
+def stats(samples):
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_ms": statistics.mean(samples) * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+    }
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return stats(samples)
+
+
+def setup_workspace(with_account):
+    """Register the sample contracts (and the benchmark account) in the workspace."""
+    from sarayulib.utils import deployments_register
+
+    os.makedirs(".cache/out", exist_ok=True)
+    shutil.copy(os.path.join(ROOT, "sarayulib/artifacts/account_contract.json"), ".cache/out/bench.json")
+    for i, name in enumerate(CONTRACTS):
+        deployments_register(0x1000 + i, os.path.join(BENCH_DIR, "contracts/abis", f"{name}.json"),
+                             "localhost", name)
+
+    if with_account:
+        from sarayulib.cmd.setup import get_public_key, accounts_register
+        from sarayulib.utils import normalize_number
+
+        address = 0x2000
+        deployments_register(address, os.path.join(ROOT, "sarayulib/artifacts/account_abi.json"),
+                             "localhost", "account-0")
+        accounts_register(get_public_key(normalize_number(PRIVATE_KEY)), address, 0,
+                          "BENCH_PRIVATE_KEY", "localhost")
+
+
+def cold(argv, repeat):
+    env = dict(os.environ, SARAYU_NO_DAEMON="1")
+    command = [sys.executable, os.path.join(ROOT, "sarayu"), *argv]
+
+    def run():
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return timed(run, repeat)
+
+
+def bench_call(repeat):
+    from sarayulib.cmd.call import call_function
+    return {
+        "cold": cold(["call", "balance", "get_balance"], max(1, repeat // 5)),
+        "warm": timed(lambda: call_function("balance", "get_balance"), repeat),
+    }
+
+
+def bench_deploy(repeat):
+    from sarayulib.cmd.deploy import deploy_contract
+    counter = iter(range(10 ** 6))
+    return {
+        "cold": cold(["deploy", "bench", "--alias", "bench-cold"], 1),
+        "warm": timed(lambda: deploy_contract("bench", f"bench-{next(counter)}"), repeat),
+    }
+
+
+def bench_invoke(repeat):
+    from sarayulib.cmd.invoke import invoke_function
+    return {
+        "cold": cold(["invoke", "balance", "increase_balance", "1", "--pkey", "BENCH_PRIVATE_KEY"],
+                     max(1, repeat // 5)),
+        "warm": timed(lambda: invoke_function("balance", "increase_balance", ["1"], "BENCH_PRIVATE_KEY"),
+                      repeat),
+    }
+
+
+def bench_throughput(count):
+    """The same calls (contract, function and calldata), invoked one by one and with invoke-batch."""
+    from sarayulib.cmd.invoke import invoke_function
+    from sarayulib.cmd.invoke_batch import invoke_batch
+
+    calls = [{"alias": "ledger", "function": "credit", "args": [i, i, 0]} for i in range(count)]
+
+    start = time.perf_counter()
+    for call in calls:
+        invoke_function(call["alias"], call["function"], [str(x) for x in call["args"]], "BENCH_PRIVATE_KEY")
+    sequential = time.perf_counter() - start
+
+    with open("manifest.json", "w") as fp:
+        json.dump(calls, fp)
+    start = time.perf_counter()
+    invoke_batch("manifest.json", "BENCH_PRIVATE_KEY")
+    batched = time.perf_counter() - start
+
+    return {
+        "calls": count,
+        "sequential_calls_per_s": count / sequential,
+        "batched_calls_per_s": count / batched,
+    }
+
+
+def bench_compile(repeat):
+    from sarayulib.cmd.compile import compile_contracts
+    directory = os.path.join(BENCH_DIR, "contracts")
+    return {"warm": timed(lambda: compile_contracts((), directory), repeat)}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--calls", type=int, default=200, help="Calls for the throughput benchmark.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock gateway latency, in ms.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    server, url = start_mock_gateway(latency=args.latency / 1000)
+    # Also exported to the `sarayu` subprocesses of the cold benchmarks.
+    os.environ.update({
+        "SARAYU_GATEWAY_URL": url,
+        "SARAYU_TRANSPORT": os.environ.get("SARAYU_TRANSPORT", "http"),
+        "STARKNET_LOCAL_NET": "1",
+        "BENCH_PRIVATE_KEY": PRIVATE_KEY,
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])),
+    })
+    logging.disable(logging.CRITICAL)
+
+    try:
+        import starkware  # noqa: F401
+        has_starkware = True
+    except ImportError:
+        has_starkware = False
+    has_compiler = shutil.which("starknet-compile") is not None
+
+    benchmarks = {
+        # Selectors, class hashes and account keys all come from starkware.
+        "call": (bench_call, args.repeat, has_starkware),
+        "deploy": (bench_deploy, args.repeat, has_starkware),
+        "invoke": (bench_invoke, args.repeat, has_starkware),
+        "throughput": (bench_throughput, args.calls, has_starkware),
+        "compile": (bench_compile, 1, has_compiler and has_starkware),
+    }
+
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workspace:
+        os.chdir(workspace)
+        try:
+            setup_workspace(has_starkware)
+            for name, (bench, n, available) in benchmarks.items():
+                if not available:
+                    results[name] = {"skipped": True}
+                    print(f"{name:12} skipped")
+                    continue
+                results[name] = bench(n)
+                print(f"{name:12} {json.dumps(results[name])}")
+        finally:
+            os.chdir(cwd)
+            server.shutdown()
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "transport": os.environ["SARAYU_TRANSPORT"],
+            "latency_ms": args.latency,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""Startup-time benchmark for sarayu commands.
+
+For every command, a fresh interpreter imports the CLI and the modules the
+command needs, under `python -X importtime`. The median cumulative import time
+of the top-level imports, the number of imported modules and the heaviest
+imports are written as JSON. Modules the bare interpreter imports at startup
+(`python -X importtime -c pass`) are not counted.
+
+    $ python benchmarks/startup.py --output startup.json
+    $ python benchmarks/startup.py --baseline startup.json --threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# command -> module imported when the command runs
+COMMANDS = {
+    "--help": None,
+    "node": "sarayulib.cmd.node",
+    "compile": "sarayulib.cmd.compile",
+    "deploy": "sarayulib.cmd.deploy",
+    "call": "sarayulib.cmd.call",
+    "invoke": "sarayulib.cmd.invoke",
+    "invoke-batch": "sarayulib.cmd.invoke_batch",
+    "setup": "sarayulib.cmd.setup",
+    "txstatus": "sarayulib.cmd.tx_status",
+    "shell": "sarayulib.cmd.shell",
+}
+
+
+def parse_importtime(stderr):
+    """Return [(module, self_us, cumulative_us, depth)] from -X importtime output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def _importtime(code):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env, text=True)
+    return process, time.perf_counter() - start
+
+
+def interpreter_imports():
+    """Names of the modules imported by the interpreter startup itself."""
+    process, _ = _importtime("pass")
+    return {name for name, _, _, _ in parse_importtime(process.stderr)}
+
+
+def measure(module, excluded=frozenset()):
+    code = "import sarayulib.cli"
+    if module is not None:
+        code += f"; import {module}"
+
+    process, wall = _importtime(code)
+    imports = [i for i in parse_importtime(process.stderr) if i[0] not in excluded]
+    return {
+        "ok": process.returncode == 0,
+        "wall_ms": wall * 1000,
+        # Top-level imports: their cumulative times include the nested ones.
+        "import_us": sum(c for _, _, c, depth in imports if depth == 0),
+        "modules": len(imports),
+        "heaviest": sorted(((n, c) for n, _, c, _ in imports), key=lambda x: -x[1])[:10],
+    }
+
+
+def run(repeat):
+    results = {}
+    excluded = interpreter_imports()
+    for command, module in COMMANDS.items():
+        runs = [measure(module, excluded) for _ in range(repeat)]
+        median = sorted(runs, key=lambda r: r["import_us"])[len(runs) // 2]
+        results[command] = {
+            "ok": all(r["ok"] for r in runs),
+            "import_ms": median["import_us"] / 1000,
+            "wall_ms": statistics.median(r["wall_ms"] for r in runs),
+            "modules": median["modules"],
+            "heaviest": median["heaviest"],
+        }
+        status = "" if results[command]["ok"] else "  (import failed)"
+        print(f"{command:14} {results[command]['import_ms']:8.1f} ms import "
+              f"{results[command]['wall_ms']:8.1f} ms wall {median['modules']:5} modules{status}")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return the commands whose import time regressed by more than threshold."""
+    regressions = []
+    for command, result in results.items():
+        if command not in baseline or not result["ok"]:
+            continue
+        before, after = baseline[command]["import_ms"], result["import_ms"]
+        if before > 0 and (after - before) / before > threshold:
+            regressions.append((command, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Compare with a previous JSON result.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed relative import time increase (default 0.2).")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            regressions = compare(results, json.load(fp), args.threshold)
+        for command, before, after in regressions:
+            print(f"🛑 {command}: {before:.1f} ms -> {after:.1f} ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""ABI index: selectors and calldata layouts, built once per ABI file.
+
+Indexes are cached per path and invalidated by the content hash of the ABI
+file, so repeated calls to the same contract don't parse JSON or compute
+Keccak selectors again.
+"""
+
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+from sarayulib.calldata import encode_felts, split_uint256
+from sarayulib.utils import is_string, normalize_number, str_to_felt
+from sarayulib.trace import span
+
+
+@lru_cache(maxsize=None)
+def get_selector(name):
+    """Memoized get_selector_from_name."""
+    from starkware.starknet.public.abi import get_selector_from_name
+
+    return get_selector_from_name(name)
+
+
+def to_felt(value):
+    """Convert an int, a decimal/hex string or a short string to a felt."""
+    if isinstance(value, int):
+        return value
+    if is_string(value):
+        return str_to_felt(value)
+    return normalize_number(value)
+
+
+def _split_tuple(type_):
+    """Split '(a: felt, b: Uint256)' or '(felt, felt)' into [(name, type)]."""
+    members, depth, current = [], 0, ""
+    for char in type_[1:-1]:
+        if char == "," and depth == 0:
+            members.append(current.strip())
+            current = ""
+            continue
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        current += char
+    if current.strip():
+        members.append(current.strip())
+
+    result = []
+    for i, member in enumerate(members):
+        name, sep, member_type = member.partition(":")
+        result.append((name.strip(), member_type.strip()) if sep else (str(i), member.strip()))
+    return result
+
+
+def _arguments(entries):
+    """
+    Group ABI arguments, folding the Cairo `x_len: felt, x: T*` pairs into one
+    array argument. Returns [(name, type, is_array)].
+    """
+    arguments = []
+    for entry in entries:
+        name, type_ = entry["name"], entry["type"]
+        if type_.endswith("*") and arguments and arguments[-1][0] == f"{name}_len":
+            arguments[-1] = (name, type_[:-1], True)
+        else:
+            arguments.append((name, type_, False))
+    return arguments
+
+
+class AbiIndex:
+    """Functions, selectors and struct layouts of one ABI."""
+
+    def __init__(self, abi, digest=None):
+        self.digest = digest
+        self.structs = {}
+        self.functions = {}
+        self.events = {}
+        for entry in abi:
+            if entry["type"] == "struct":
+                self.structs[entry["name"]] = [(m["name"], m["type"]) for m in entry["members"]]
+            elif entry["type"] in ("function", "constructor", "l1_handler"):
+                self.functions[entry["name"]] = {
+                    "selector": get_selector(entry["name"]),
+                    "inputs": _arguments(entry["inputs"]),
+                    "outputs": _arguments(entry.get("outputs", [])),
+                }
+            elif entry["type"] == "event":
+                self.events[entry["name"]] = {
+                    "selector": get_selector(entry["name"]),
+                    "data": _arguments(entry["data"]),
+                }
+
+    def function(self, name):
+        if name not in self.functions:
+            raise ValueError(f"Function {name} is not in the ABI")
+        return self.functions[name]
+
+    def selector(self, name):
+        return self.function(name)["selector"]
+
+    # Encoding
+
+    def _encode_value(self, type_, value, out):
+        if type_ == "felt" or type_.endswith("*"):
+            out.append(to_felt(value))
+            return
+        if type_ == "Uint256" and not isinstance(value, (list, tuple, dict)):
+            out.extend(split_uint256([value]))
+            return
+        members = _split_tuple(type_) if type_.startswith("(") else self.structs[type_]
+        if isinstance(value, dict):
+            values = [value[name] for name, _ in members]
+        else:
+            values = list(value)
+        if len(values) != len(members):
+            raise ValueError(f"Expected {len(members)} members for {type_}, got {len(values)}")
+        for (_, member_type), member_value in zip(members, values):
+            self._encode_value(member_type, member_value, out)
+
+    def encode_inputs(self, function, values):
+        """
+        Encode function inputs to calldata felts.
+        - Flat values (ints or strings) are taken as calldata already, as on the
+          command line: only short strings and hex are converted.
+        - Structured values follow the declared inputs: dicts or lists for
+          structs and tuples, lists for arrays (their length is added). A
+          Uint256 can be given as one number. Inputs can also be given as a
+          dict by name.
+        """
+        if not isinstance(values, dict) and all(not isinstance(v, (list, tuple, dict)) for v in values):
+            return encode_felts(values)
+
+        inputs = self.function(function)["inputs"]
+        if isinstance(values, dict):
+            values = [values[name] for name, _, _ in inputs]
+        if len(values) != len(inputs):
+            raise ValueError(f"{function} expects {len(inputs)} arguments, got {len(values)}")
+
+        out = []
+        for (name, type_, is_array), value in zip(inputs, values):
+            if is_array:
+                out.append(len(value))
+                # Large arrays (see sarayulib.calldata) are encoded in bulk.
+                if type_ == "felt":
+                    out.extend(encode_felts(value))
+                elif type_ == "Uint256" and all(not isinstance(v, (list, tuple, dict)) for v in value):
+                    out.extend(split_uint256(value))
+                else:
+                    for item in value:
+                        self._encode_value(type_, item, out)
+            else:
+                self._encode_value(type_, value, out)
+        return out
+
+    # Decoding
+
+    def _decode_value(self, type_, felts, pos):
+        if type_ == "felt" or type_.endswith("*"):
+            return felts[pos], pos + 1
+        members = _split_tuple(type_) if type_.startswith("(") else self.structs[type_]
+        value = {}
+        for name, member_type in members:
+            value[name], pos = self._decode_value(member_type, felts, pos)
+        if type_.startswith("(") and all(name.isdigit() for name, _ in members):
+            value = list(value.values())
+        return value, pos
+
+    def decode_outputs(self, function, felts):
+        """Decode result felts to {output name: value}, rebuilding structs and arrays."""
+        return self._decode_arguments(self.function(function)["outputs"], felts)
+
+    def event_name(self, selector):
+        """The name of the event whose first key is selector, or None."""
+        selector = normalize_number(selector)
+        return next((name for name, e in self.events.items() if e["selector"] == selector), None)
+
+    def decode_event(self, name, felts):
+        """Decode the data felts of an event to {member name: value}."""
+        if name not in self.events:
+            raise ValueError(f"Event {name} is not in the ABI")
+        return self._decode_arguments(self.events[name]["data"], felts)
+
+    def _decode_arguments(self, arguments, felts):
+        felts = [normalize_number(f) for f in felts]
+        result, pos = {}, 0
+        for name, type_, is_array in arguments:
+            if is_array:
+                length, pos = felts[pos], pos + 1
+                items = []
+                for _ in range(length):
+                    item, pos = self._decode_value(type_, felts, pos)
+                    items.append(item)
+                result[name] = items
+            else:
+                result[name], pos = self._decode_value(type_, felts, pos)
+        return result
+
+
+_by_path = {}
+_by_digest = {}
+
+
+def load_abi_index(path):
+    """Return the AbiIndex of an ABI file, rebuilding it only when its content changes."""
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _by_path.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with span("abi index", path=path):
+        with open(path, "rb") as fp:
+            content = fp.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if digest not in _by_digest:
+            _by_digest[digest] = AbiIndex(json.loads(content), digest)
+    _by_path[path] = (key, _by_digest[digest])
+    return _by_digest[digest]
@@ -0,0 +1,167 @@
+"""Cache of view call results (`sarayu call --cache`).
+
+Results are keyed by (network, gateway url, address, selector, inputs, block):
+
+- a block number names an immutable state, so its results are kept for
+  CALL_CACHE_BLOCK_TTL; except on localhost, where a restarted or restored
+  devnet reuses block numbers for other states: there they are kept for `ttl`
+- "latest" is resolved to the current block number and hash, themselves
+  cached for `ttl`, so results are reused until a new block is seen
+- "pending" results are kept for `ttl`
+
+Entries live in an in-memory LRU and in `.cache/<network>.calls.db` (SQLite),
+which is shared by every sarayu process working in the directory.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sarayulib.abi import get_selector
+from sarayulib.trace import span
+from sarayulib.utils import gateway_url, hex_address, normalize_number, state_path
+from sarayulib.constants import (
+    CACHE_DIR, CALL_CACHE_SIZE, CALL_CACHE_TTL, CALL_CACHE_DISK_SIZE, CALL_CACHE_BLOCK_TTL,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    key     TEXT PRIMARY KEY,
+    value   TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS calls_expires ON calls (expires);
+"""
+
+# Every PRUNE_EVERY disk writes, expired rows and rows above the size bound are dropped.
+PRUNE_EVERY = 256
+
+# Networks whose chain can be restarted or restored (devnets): a block number
+# does not name one state there.
+RESETTABLE_NETWORKS = ("localhost",)
+
+
+def get_call_cache_db_name(network):
+    return state_path(f"{CACHE_DIR}/{network}.calls.db")
+
+
+class CallCache:
+    """Two-tier (memory LRU, SQLite) cache of call results with TTLs."""
+
+    def __init__(self, network="localhost", size=CALL_CACHE_SIZE, ttl=CALL_CACHE_TTL,
+                 disk_size=CALL_CACHE_DISK_SIZE, path=None):
+        self.network = network
+        self.size = size
+        self.ttl = ttl
+        self.disk_size = disk_size
+        self.path = path or os.path.abspath(get_call_cache_db_name(network))
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Return the cached value of key, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    return entry[1]
+                del self._memory[key]
+
+        row = self._db().execute("SELECT value, expires FROM calls WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= now:
+            return None
+        value = json.loads(row[0])
+        self._remember(key, value, row[1])
+        return value
+
+    def put(self, key, value, ttl=None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        self._remember(key, value, expires)
+        conn = self._db()
+        conn.execute("INSERT OR REPLACE INTO calls (key, value, expires) VALUES (?, ?, ?)",
+                     (key, json.dumps(value), expires))
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self._prune(conn)
+
+    def _remember(self, key, value, expires):
+        with self._lock:
+            self._memory[key] = (expires, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.size:
+                self._memory.popitem(last=False)
+
+    def _prune(self, conn):
+        conn.execute("DELETE FROM calls WHERE expires <= ?", (time.time(),))
+        conn.execute("DELETE FROM calls WHERE key IN (SELECT key FROM calls ORDER BY expires LIMIT "
+                     "max(0, (SELECT count(*) FROM calls) - ?))", (self.disk_size,))
+
+    def latest(self, transport):
+        """Number, hash and gas price of the latest block, refreshed at most every `ttl` seconds."""
+        key = f"latest:{self.network}:{gateway_url(self.network)}"
+        latest = self.get(key)
+        if latest is None or "block_hash" not in latest:
+            with span("latest block"):
+                block = transport.get_block("latest")
+            latest = {"block_number": block["block_number"], "block_hash": block.get("block_hash"),
+                      "gas_price": normalize_number(block.get("gas_price") or 0)}
+            self.put(key, latest)
+        return latest
+
+    def head(self, transport):
+        """The latest block number, refreshed at most every `ttl` seconds."""
+        return self.latest(transport)["block_number"]
+
+    def call(self, transport, address, abi, function, inputs, block="pending"):
+        """transport.call() through the cache."""
+        block_hash = None
+        if block == "latest":
+            latest = self.latest(transport)
+            block, block_hash = latest["block_number"], latest["block_hash"]
+        if block == "pending" or self.network in RESETTABLE_NETWORKS and block_hash is None:
+            ttl = self.ttl
+        else:
+            ttl = CALL_CACHE_BLOCK_TTL
+        if block != "pending":
+            block = int(block)
+
+        key = json.dumps([self.network, gateway_url(self.network), hex_address(address),
+                          hex(get_selector(function)), [str(normalize_number(x)) for x in inputs],
+                          block, block_hash])
+        result = self.get(key)
+        if result is not None:
+            return result
+        result = transport.call(address, abi, function, inputs, block)
+        self.put(key, result, ttl)
+        return result
+
+
+_CACHES = {}
+
+
+def get_call_cache(network="localhost"):
+    """
+    Return the process-wide call cache of a network in the current directory
+    (the daemon serves several), resolved on every call.
+    """
+    path = os.path.abspath(get_call_cache_db_name(network))
+    if (network, path) not in _CACHES:
+        _CACHES[(network, path)] = CallCache(network, path=path)
+    return _CACHES[(network, path)]
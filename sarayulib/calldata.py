@@ -0,0 +1,152 @@
+"""Calldata encoding in bulk, and felt arrays read from files.
+
+An argument `@path` of `sarayu call` or `sarayu invoke` is replaced by the array
+stored in the file, and encoded as a Cairo array argument (its length first):
+
+- `.bin`: raw 32-byte big-endian words, memory-mapped.
+- `.json`: a list of values (ints, hex or short strings, or lists and dicts
+  for arrays of structs).
+- any other extension (`.csv`, `.txt`): ints, hex or short strings separated
+  by commas or whitespace.
+
+Items of a `Uint256` array are given as plain numbers and split into their
+(low, high) felts. A call whose calldata is over the limit (CALLDATA_MAX_FELTS,
+or `--max-calldata`) is split into calls over consecutive chunks of its array
+argument, with the other arguments unchanged. Calldata without exactly one
+array argument is sent as it is, whatever its size.
+"""
+
+import json
+import logging
+import math
+import mmap
+import os
+
+from sarayulib.utils import is_string, normalize_number, str_to_felt
+
+WORD_SIZE = 32
+_LOW_MASK = 2**128 - 1
+
+
+class CalldataError(ValueError):
+    """Raised when arguments cannot be read or encoded for a function."""
+
+    def to_dict(self):
+        """Structured form of the error, as TransportError.to_dict()."""
+        return {"error": "calldata", "status": None, "message": str(self)}
+
+
+def encode_felts(values):
+    """
+    Convert ints, decimal or hex strings and short strings to felts. The
+    common cases are recognized without parsing twice, which matters for
+    arrays of tens of thousands of values.
+    """
+    out = []
+    append = out.append
+    for value in values:
+        if type(value) is int:
+            append(value)
+        elif type(value) is str and value.isdecimal():
+            append(int(value))
+        elif type(value) is str and value.startswith("0x"):
+            try:
+                append(int(value, 16))
+            except ValueError:
+                append(str_to_felt(value))
+        elif is_string(value):
+            append(str_to_felt(value))
+        else:
+            append(normalize_number(value))
+    return out
+
+
+def split_uint256(values):
+    """[low, high] felts of each Uint256 value."""
+    numbers = encode_felts(values)
+    if numbers and (min(numbers) < 0 or max(numbers) >= 2**256):
+        raise ValueError(f"{next(x for x in numbers if not 0 <= x < 2**256)} is out of range for a Uint256")
+    out = [0] * (2 * len(numbers))
+    out[0::2] = [x & _LOW_MASK for x in numbers]
+    out[1::2] = [x >> 128 for x in numbers]
+    return out
+
+
+def read_words(path):
+    """The 32-byte big-endian words of a binary file."""
+    size = os.path.getsize(path)
+    if size % WORD_SIZE != 0:
+        raise ValueError(f"{path}: {size} bytes is not a whole number of {WORD_SIZE}-byte words")
+    if size == 0:
+        return []
+    with open(path, "rb") as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        from_bytes = int.from_bytes
+        return [from_bytes(data[i:i + WORD_SIZE], "big") for i in range(0, size, WORD_SIZE)]
+
+
+def read_values(path):
+    """The array stored in a file (see the module docstring for the formats)."""
+    if path.endswith(".bin"):
+        return read_words(path)
+    if path.endswith(".json"):
+        with open(path) as fp:
+            values = json.load(fp)
+        if not isinstance(values, list):
+            raise ValueError(f"{path}: expected a JSON list")
+        return values
+    with open(path) as fp:
+        return [value.strip("\"'") for value in fp.read().replace(",", " ").split()]
+
+
+def expand_arguments(arguments):
+    """Replace the `@path` arguments with the arrays stored in the files."""
+    return [read_values(a[1:]) if isinstance(a, str) and a.startswith("@") else a for a in arguments]
+
+
+def encode_calls(index, function, arguments, max_felts):
+    """
+    Read the `@path` arguments and encode them with split_arguments. Failures
+    are raised as CalldataError.
+    """
+    try:
+        return split_arguments(index, function, expand_arguments(arguments), max_felts)
+    except (OSError, ValueError, KeyError, TypeError) as err:
+        raise CalldataError(f"{function}: {err}") from err
+
+
+def split_arguments(index, function, arguments, max_felts):
+    """
+    Return [(arguments, calldata)] of the calls that encode arguments in at
+    most max_felts calldata felts each: one call, or one per chunk of the
+    (only) array argument. Calldata that cannot be split is one call.
+    """
+    calldata = index.encode_inputs(function, arguments)
+    if max_felts is None or len(calldata) <= max_felts:
+        return [(arguments, calldata)]
+
+    arrays = [i for i, argument in enumerate(arguments) if isinstance(argument, list)]
+    if len(arrays) != 1:
+        # Flat calldata (given felt by felt), or several arrays: sent as it is.
+        if arrays:
+            logging.warning(f"⚠️  {function}: {len(calldata)} calldata felts is over {max_felts}, "
+                            "but only calls with one array argument can be split")
+        return [(arguments, calldata)]
+    position = arrays[0]
+    items = arguments[position]
+
+    def with_items(chunk):
+        return arguments[:position] + [chunk] + arguments[position + 1:]
+
+    base = len(index.encode_inputs(function, with_items([])))
+    per_item = math.ceil((len(calldata) - base) / len(items))
+    size = (max_felts - base) // per_item
+    if size < 1:
+        logging.warning(f"⚠️  {function}: the other arguments already take {base} of the "
+                        f"{max_felts} calldata felts: not split")
+        return [(arguments, calldata)]
+
+    calls = []
+    for start in range(0, len(items), size):
+        chunk = with_items(items[start:start + size])
+        calls.append((chunk, index.encode_inputs(function, chunk)))
+    return calls
@@ -0,0 +1,166 @@
+"""Content-addressed store of compiled contracts.
+
+Compiled contracts are kept once per class hash in
+`.cache/classes/<class_hash>.json.gz`, gzip-compressed and without their
+debug info (which the class hash does not cover and the gateway does not
+need). `.cache/classes/index.json` maps contract names to class hashes, so
+identical contracts compiled under different names share one artifact, and
+caches the class hash of every compiled file digest, so it is computed once.
+
+Which classes are declared on a network is recorded in its deployments
+registry (see sarayulib.deployments).
+"""
+
+import contextlib
+import fcntl
+import functools
+import gzip
+import hashlib
+import json
+import os
+
+from sarayulib.trace import span
+from sarayulib.transport import compress_contract
+from sarayulib.utils import hex_address
+from sarayulib.constants import CLASSES_DIR, OUTPUT_DIR
+
+
+def get_class_file_name(class_hash):
+    return f"{CLASSES_DIR}/{hex_address(class_hash)}.json.gz"
+
+
+def get_index_file_name():
+    return f"{CLASSES_DIR}/index.json"
+
+
+def compute_class_hash(contract):
+    """Class hash of a compiled contract (a dict). Runs the StarkNet OS hash: slow."""
+    from starkware.starknet.core.os.class_hash import compute_class_hash as _compute
+    from starkware.starknet.services.api.contract_class import ContractClass
+
+    with span("class hash"):
+        return _compute(ContractClass.load(contract))
+
+
+@contextlib.contextmanager
+def _index():
+    """The store index, locked for update."""
+    os.makedirs(CLASSES_DIR, exist_ok=True)
+    file = get_index_file_name()
+    with open(f"{file}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        index = {"names": {}, "digests": {}}
+        if os.path.exists(file):
+            with open(file) as fp:
+                index = json.load(fp)
+        yield index
+        tmp = f"{file}.{os.getpid()}.tmp"
+        with open(tmp, "w") as fp:
+            json.dump(index, fp, indent=2)
+        os.replace(tmp, file)
+
+
+def _load_index():
+    file = get_index_file_name()
+    if not os.path.exists(file):
+        return {"names": {}, "digests": {}}
+    with open(file) as fp:
+        return json.load(fp)
+
+
+def ingest(name, path):
+    """
+    Add the compiled contract at path to the store under name. Returns its
+    class hash. The class hash is only computed for contents not seen before.
+    """
+    with open(path, "rb") as fp:
+        data = fp.read()
+    digest = hashlib.sha256(data).hexdigest()
+
+    index = _load_index()
+    class_hash = index["digests"].get(digest)
+    if class_hash is not None and index["names"].get(name) == class_hash:
+        return int(class_hash, 16)
+    if class_hash is None:
+        contract = json.loads(data)
+        class_hash = hex_address(compute_class_hash(contract))
+        file = get_class_file_name(int(class_hash, 16))
+        if not os.path.exists(file):
+            contract["program"]["debug_info"] = None
+            os.makedirs(CLASSES_DIR, exist_ok=True)
+            tmp = f"{file}.{os.getpid()}.tmp"
+            with gzip.open(tmp, "wt") as fp:
+                json.dump(contract, fp)
+            os.replace(tmp, file)
+
+    with _index() as index:
+        index["digests"][digest] = class_hash
+        index["names"][name] = class_hash
+    return int(class_hash, 16)
+
+
+def ingest_file(item):
+    """
+    Ingest a compiled (name, path) and remove the compiled file. Returns the
+    class hash. Takes a single tuple so it can be mapped over a process pool.
+    """
+    name, path = item
+    class_hash = ingest(name, path)
+    os.remove(path)
+    return class_hash
+
+
+def class_hash_of(name):
+    """
+    The class hash of a compiled contract name, or None. A compiled file left
+    in .cache/out (by an older sarayu or another tool) is ingested first.
+    """
+    path = f"{OUTPUT_DIR}/{name}.json"
+    if os.path.exists(path):
+        return ingest(name, path)
+    class_hash = _load_index()["names"].get(name)
+    return int(class_hash, 16) if class_hash is not None else None
+
+
+class CompiledClass:
+    """A class of the store. Transports upload definition(), or give path() to the starknet CLI."""
+
+    def __init__(self, class_hash, name=None):
+        self.class_hash = class_hash
+        self.name = name
+
+    def contract(self):
+        return _load_contract(self.class_hash)
+
+    def definition(self):
+        """The contract definition as the gateway takes it (compressed program)."""
+        return _definition(self.class_hash)
+
+    def path(self):
+        """An uncompressed file of the contract, written on first use."""
+        path = f"{CLASSES_DIR}/{hex_address(self.class_hash)}.json"
+        if not os.path.exists(path):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as fp:
+                json.dump(self.contract(), fp)
+            os.replace(tmp, path)
+        return path
+
+
+def load_class(name):
+    """Return the CompiledClass of a compiled contract name."""
+    class_hash = class_hash_of(name)
+    if class_hash is None:
+        raise FileNotFoundError(f"{name} is not compiled: no {OUTPUT_DIR}/{name}.json and not in {CLASSES_DIR}")
+    return CompiledClass(class_hash, name)
+
+
+@functools.lru_cache(maxsize=16)
+def _load_contract(class_hash):
+    with gzip.open(get_class_file_name(class_hash), "rt") as fp:
+        return json.load(fp)
+
+
+@functools.lru_cache(maxsize=16)
+def _definition(class_hash):
+    return compress_contract(_load_contract(class_hash))
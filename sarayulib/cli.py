@@ -1,16 +1,14 @@
 #!/usr/bin/env python
 """ sarayu CLI entry point """
+import json
 import logging
 import click
 import os
+import sys
 import sarayulib.constants as consts
-from sarayulib.cmd.setup import account_setup
-from sarayulib.cmd.node import node as node_cmd
-from sarayulib.cmd.compile import compile_contracts as compile_cmd
-from sarayulib.cmd.deploy import deploy_contract as deploy_cmd
-from sarayulib.cmd.call import call_function as call_cmd
-from sarayulib.cmd.invoke import invoke_function as invoke_cmd
-from sarayulib.cmd.tx_status import get_tx_status as txstatus_cmd
+
+# Command modules are imported inside the commands that use them, so that
+# `sarayu --help` or `sarayu node` don't pay for the starkware imports.
 
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 
@@ -41,34 +39,126 @@ def _validate_network(_ctx, _param, value):
     # raise if value is invalid
     raise click.BadParameter(f"'{value}'. Use one of {consts.NETWORKS}")
 
+def pool_options(f):
+  """Configure the --pool and --pool-strategy options for the cli."""
+  f = click.option("--pool-strategy", type=click.Choice(consts.POOL_STRATEGIES), default=consts.POOL_STRATEGY,
+                   show_default=True, help="How --pool picks the next account.")(f)
+  return click.option("--pool", is_flag=True,
+                      help="Spread transactions over every account of <network>.accounts.json.")(f)
+
+def max_fee_option(f):
+  """Configure the --max-fee option for the cli."""
+  return click.option("--max-fee", default=None,
+                      help="Maximum fee in wei, or auto to estimate it "
+                           "[default: auto on goerli and mainnet, 0 on localhost].")(f)
+
+def max_calldata_option(f):
+  """Configure the --max-calldata option for the cli."""
+  return click.option("--max-calldata", default=consts.CALLDATA_MAX_FELTS, show_default=True,
+                      help="Split calls with more calldata felts over chunks of their array argument.")(f)
+
+def _account_pool(pool, strategy, network):
+  if not pool:
+    return None
+  from sarayulib.pool import AccountPool
+  return AccountPool(network, strategy)
+
+def _print_result(out):
+  """Print a command result. A structured error is printed as JSON and sets the exit code."""
+  if isinstance(out, dict) and "error" in out:
+    print(json.dumps(out))
+    sys.exit(1)
+  print(out)
+
+def _validate_block(_ctx, _param, value):
+    """Accept latest, pending or a block number."""
+    if value in ("latest", "pending"):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise click.BadParameter(f"'{value}'. Use latest, pending or a block number.")
+
 
 @click.group()
-def cli():
+@click.option("--trace", is_flag=True, help="Time each phase of the command.")
+@click.option("--trace-format", type=click.Choice(["tree", "chrome"]), default="tree", show_default=True,
+              help="Print a tree, or emit Chrome trace-event JSON.")
+@click.option("--trace-file", default=None, help="Write the trace to this file instead of stderr.")
+@click.option("--retries", type=int, default=None,
+              help=f"Retries of transient gateway failures [default: {consts.RETRY_ATTEMPTS}].")
+@click.option("--retry-delay", type=float, default=None,
+              help=f"Base backoff delay in seconds, doubled on each retry [default: {consts.RETRY_BASE_DELAY}].")
+@click.pass_context
+def cli(ctx, trace, trace_format, trace_file, retries, retry_delay):
     """
     sarayu CLI group.
     """
-    pass
+    # The transports read the retry policy from the environment on each request.
+    if retries is not None:
+        os.environ["SARAYU_RETRY_ATTEMPTS"] = str(retries)
+    if retry_delay is not None:
+        os.environ["SARAYU_RETRY_BASE_DELAY"] = str(retry_delay)
+    if trace:
+        import sarayulib.trace as tracer
+
+        tracer.enable()
+        command_span = tracer.span(f"sarayu {ctx.invoked_subcommand}")
+        command_span.__enter__()
+
+        def report():
+            command_span.__exit__(None, None, None)
+            tracer.disable()
+            tracer.report(trace_format, trace_file)
+        ctx.call_on_close(report)
 
 @cli.command()
 @click.option("--pkey", default="STARKNET_PRIVATE_KEY")
+@click.option("--count", type=int, default=None, help="Deploy this many accounts with keys derived from --seed.")
+@click.option("--seed", default="STARKNET_ACCOUNT_SEED", show_default=True,
+              help="Env var holding the seed of the derived keys.")
+@click.option("--fund", type=int, default=None, help="Mint this amount of fee tokens to each new account (devnet).")
+@click.option("--concurrency", default=consts.SETUP_CONCURRENCY, show_default=True,
+              help="Maximum concurrent deployments.")
 @network_option
-def setup(pkey, network):
+def setup(pkey, count, seed, fund, concurrency, network):
     """Deploy an account contract\n
     
     syntax:\n
-      sarayu setup --pkey "STARKNET_PRIVATE_KEY" --network "localhost"
+      sarayu setup --pkey "STARKNET_PRIVATE_KEY" --network "localhost"\n
+      sarayu setup --count 500 --seed "STARKNET_ACCOUNT_SEED" --fund 1000000000000000000
 
     """
+    if count is not None:
+      from sarayulib.cmd.setup import accounts_setup_many
+      accounts_setup_many(seed, count, network, fund, concurrency)
+      return
+    from sarayulib.cmd.setup import account_setup
     account_setup(pkey, network)
 
 @cli.command()
 @click.argument("contracts", nargs=-1)
 @click.option("--directory")
-def compile(contracts, directory):
+@click.option("--jobs", "-j", type=int, default=None,
+              help="Number of concurrent compilations. Defaults to the CPU count.")
+@click.option("--cairo-path", default=None, help="Extra import roots, separated by ':'.")
+@click.option("--force", is_flag=True, help="Compile even the contracts that did not change.")
+@click.option("--watch", is_flag=True, help="Keep running and compile the affected contracts on every save.")
+def compile(contracts, directory, jobs, cairo_path, force, watch):
   """
   Compile the contracts.
+
+  Only the contracts whose source, imported files (under the contracts
+  directory and --cairo-path) or compiler version changed since their last
+  compilation are compiled again.
   """
-  compile_cmd(contracts, directory)
+  cairo_path = cairo_path.split(":") if cairo_path else []
+  if watch:
+    from sarayulib.cmd.compile import watch_contracts
+    watch_contracts(contracts, directory, jobs, cairo_path)
+    return
+  from sarayulib.cmd.compile import compile_contracts as compile_cmd
+  compile_cmd(contracts, directory, jobs, cairo_path, force)
 
 @cli.command()
 @click.option("--host", default="127.0.0.1")
@@ -90,54 +180,386 @@ def node(host, port, seed):
     Direct StarkNet command:\n
       starknet-devnet --host localhost -p 5050 --seed 1001
     """
+    from sarayulib.cmd.node import node as node_cmd
     node_cmd(host, port, seed)
 
+@cli.group()
+def devnet():
+  """
+  Manage a pool of local devnets for parallel test shards.
+
+  $ sarayu devnet start -n 4\n
+  $ sarayu devnet lease -- sh -c "sarayu setup --count 20 && sarayu devnet snapshot base"\n
+  $ sarayu devnet lease --restore base -- pytest tests/shard_1
+  """
+
+@devnet.command("start")
+@click.option("--count", "-n", default=1, show_default=True, help="Number of devnets to start.")
+@click.option("--host", default="127.0.0.1")
+@click.option("--seed", type=int, default=None)
+@click.argument("devnet_args", nargs=-1)
+def devnet_start(count, host, seed, devnet_args):
+  """Start devnets on free ports (extra arguments go to starknet-devnet)."""
+  from sarayulib.devnet import start_devnets
+  for instance in start_devnets(count, host, seed, devnet_args):
+    print(instance["url"])
+
+@devnet.command("status")
+def devnet_status():
+  """List the devnets of the pool."""
+  from sarayulib.devnet import devnet_status as status_cmd
+  for instance, alive, leased in status_cmd():
+    print(instance["url"], "alive" if alive else "dead", "leased" if leased else "free")
+
+@devnet.command("stop")
+def devnet_stop():
+  """Stop every devnet of the pool."""
+  from sarayulib.devnet import stop_devnets
+  for instance in stop_devnets():
+    print("stopped", instance["url"])
+
+@devnet.command("snapshot")
+@click.argument("name")
+@click.option("--url", default=None, help="Devnet to dump. Defaults to the localhost gateway.")
+def devnet_snapshot(name, url):
+  """Dump the devnet state as snapshot NAME."""
+  from sarayulib.devnet import snapshot
+  print(snapshot(name, url))
+
+@devnet.command("restore")
+@click.argument("name")
+@click.option("--url", default=None, help="Devnet to load into. Defaults to the localhost gateway.")
+def devnet_restore(name, url):
+  """Load snapshot NAME into a devnet."""
+  from sarayulib.devnet import restore
+  restore(name, url)
+
+@devnet.command("lease", context_settings={"ignore_unknown_options": True})
+@click.option("--restore", "restore_snapshot", default=None, help="Snapshot to load into the leased devnet.")
+@click.option("--timeout", default=consts.DEVNET_LEASE_TIMEOUT, show_default=True,
+              help="Seconds to wait for a free devnet.")
+@click.argument("command", nargs=-1, required=True, type=click.UNPROCESSED)
+def devnet_lease(restore_snapshot, timeout, command):
+  """
+  Run COMMAND with a devnet of the pool to itself.
+
+  SARAYU_GATEWAY_URL points the command (and the sarayu commands it runs) to
+  the leased devnet; the lease ends when the command exits. The sarayu
+  commands run in the child itself, not on a running daemon.
+  """
+  import subprocess
+  from sarayulib.devnet import lease_devnet
+  with lease_devnet(restore_snapshot, timeout) as lease:
+    logging.info(f"🔒 Leased {lease.url}")
+    returncode = subprocess.call(command, env=dict(os.environ, SARAYU_NO_DAEMON="1"))
+  sys.exit(returncode)
+
 @cli.command()
-@click.argument("contract_name", nargs=1)
+@click.argument("contract_name", nargs=1, required=False)
 @click.option("--alias")
+@click.option("--manifest", help="Deploy every contract of a JSON/YAML manifest.")
+@click.option("--concurrency", default=consts.DEPLOY_CONCURRENCY, show_default=True,
+              help="Maximum concurrent deployments with --manifest.")
+@click.option("--pkey", default="STARKNET_PRIVATE_KEY", show_default=True,
+              help="Account to declare classes and deploy through, if set and deployed.")
+@max_fee_option
 @network_option
-def deploy(contract_name, alias, network):
+def deploy(contract_name, alias, manifest, concurrency, pkey, max_fee, network):
   """
-  Deploy a StarkNet contract.
+  Deploy a StarkNet contract, or every contract of a manifest.
+
+  The manifest lists {"name", "alias", "inputs", "depends_on"} entries; an
+  input "${alias}" is replaced by the address of that deployment. Contracts
+  without pending dependencies are deployed concurrently.
+
+  Through the --pkey account, a class is declared once per network and its
+  instances are deployed with the Universal Deployer Contract, without
+  uploading it again. Otherwise each deployment uploads the class.\n
+
+  $ sarayu deploy --manifest deploy.yaml
   """
-  deploy_cmd(contract_name,alias,network)
+  if manifest is None and contract_name is None:
+    raise click.UsageError("Missing CONTRACT_NAME (or --manifest).")
+  from sarayulib.transport import TransportError
+  try:
+    if manifest is not None:
+      from sarayulib.cmd.deploy import deploy_manifest
+      for name, address in deploy_manifest(manifest, network, concurrency, pkey, max_fee).items():
+        print(name, hex(address))
+      return
+    from sarayulib.cmd.deploy import deploy_contract as deploy_cmd
+    deploy_cmd(contract_name, alias, network, pkey, max_fee)
+  except TransportError as err:
+    logging.error(f"\n😰 {err}")
+    _print_result(err.to_dict())
 
 @cli.command()
 @click.argument("address_or_alias", nargs=1)
 @click.argument("view_function", nargs=1)
 @click.argument("params", nargs=-1)
+@click.option("--decode", is_flag=True, help="Decode the outputs with the contract ABI and print them as JSON.")
+@click.option("--block", default="pending", show_default=True, callback=_validate_block,
+              help="Block to call at: latest, pending or a block number.")
+@click.option("--cache", is_flag=True, help="Reuse results cached for the same block (see README).")
+@max_calldata_option
 @network_option
-def call(address_or_alias, view_function, params, network):
-  """Call functions of StarkNet contracts."""
-  out = call_cmd(address_or_alias, view_function, params, network)
-  print(out)
+def call(address_or_alias, view_function, params, decode, block, cache, max_calldata, network):
+  """
+  Call functions of StarkNet contracts.
+
+  A param @FILE is an array read from a .bin (32-byte words), .json or .csv file.
+  """
+  from sarayulib.cmd.call import call_function as call_cmd
+  out = call_cmd(address_or_alias, view_function, params, network, decode, block, cache, max_calldata)
+  _print_result(out)
+
+@cli.command("call-many")
+@click.argument("input_file", type=click.File("r"), default="-")
+@click.option("--concurrency", default=consts.CALL_MANY_CONCURRENCY, show_default=True,
+              help="Maximum concurrent calls.")
+@click.option("--unordered", is_flag=True, help="Print results as they complete instead of in input order.")
+@click.option("--decode", is_flag=True, help="Decode the outputs with the contract ABI.")
+@click.option("--block", default="pending", show_default=True, callback=_validate_block,
+              help="Default block to call at: latest, pending or a block number.")
+@click.option("--cache", is_flag=True, help="Reuse results cached for the same block.")
+@network_option
+def call_many(input_file, concurrency, unordered, decode, block, cache, network):
+  """
+  Run view calls read as JSONL from INPUT_FILE (default stdin).
+
+  Each line is {"alias": alias or address, "function": .., "inputs": [..]}
+  (optionally with "id" and "block") or [alias, function, [inputs]]. One JSON
+  result line is printed per call.\n
+
+  $ cat balances.jsonl | sarayu call-many --concurrency 64 > out.jsonl
+  """
+  from sarayulib.cmd.call_many import call_many as call_many_cmd
+  for outcome in call_many_cmd(input_file, network, concurrency, not unordered, decode, block, cache):
+    print(json.dumps(outcome), flush=True)
+
+@cli.group()
+def index():
+  """
+  Index the transactions and events of registered contracts locally.
+
+  $ sarayu index sync\n
+  $ sarayu index events token --name Transfer --from-block 100 --to-block 200 --decode
+  """
+
+@index.command("sync")
+@click.option("--from-block", type=int, default=None, help="Index from this block instead of the last synced one.")
+@click.option("--to-block", type=int, default=None, help="Stop at this block instead of the latest one.")
+@click.option("--concurrency", default=consts.INDEX_CONCURRENCY, show_default=True,
+              help="Maximum concurrent block requests.")
+@network_option
+def index_sync(from_block, to_block, concurrency, network):
+  """Pull new blocks into <network>.index.db."""
+  from sarayulib.indexer import sync_index
+  blocks, transactions, events = sync_index(network, from_block, to_block, concurrency)
+  logging.info(f"✅ Indexed {blocks} blocks: {transactions} transactions, {events} events")
+
+@index.command("events")
+@click.argument("address_or_alias")
+@click.option("--name", default=None, help="Only the events of this name.")
+@click.option("--from-block", type=int, default=None)
+@click.option("--to-block", type=int, default=None)
+@click.option("--decode", is_flag=True, help="Add the event name and its data decoded with the contract ABI.")
+@network_option
+def index_events(address_or_alias, name, from_block, to_block, decode, network):
+  """Print the indexed events of a contract as JSON lines."""
+  from sarayulib.indexer import query_events
+  for event in query_events(address_or_alias, network, name, from_block, to_block, decode):
+    print(json.dumps(event))
 
 @cli.command()
 @click.argument("contract_alias", nargs=1)
 @click.argument("invoke_function", nargs=1)
 @click.argument("arguments", nargs=-1)
 @click.option("--pkey", default="STARKNET_PRIVATE_KEY")
+@max_fee_option
+@max_calldata_option
+@pool_options
 @network_option
-def invoke(contract_alias, invoke_function, arguments, pkey, network):
+def invoke(contract_alias, invoke_function, arguments, pkey, max_fee, max_calldata, pool, pool_strategy, network):
   """
   Invoke a StarkNet contract.
-  
+
+  An argument @FILE is an array read from a .bin (32-byte words), .json or
+  .csv file. Calldata over --max-calldata felts is split into several
+  transactions, over chunks of the array.
   """
+  from sarayulib.cmd.invoke import invoke_function as invoke_cmd
   logging.debug("arguments list: ", arguments)
-  out = invoke_cmd(contract_alias, invoke_function, arguments, pkey, network)
-  print(out)
+  out = invoke_cmd(contract_alias, invoke_function, arguments, pkey, network,
+                   _account_pool(pool, pool_strategy, network), max_fee, max_calldata)
+  _print_result(out)
+
+@cli.command("invoke-batch")
+@click.argument("manifest", nargs=1)
+@click.option("--pkey", default="STARKNET_PRIVATE_KEY")
+@click.option("--max-calldata", default=consts.BATCH_MAX_CALLDATA, show_default=True,
+              help="Maximum calldata felts per __execute__ transaction.")
+@click.option("--max-calls", default=consts.BATCH_MAX_CALLS, show_default=True,
+              help="Maximum calls per __execute__ transaction.")
+@max_fee_option
+@pool_options
+@network_option
+def invoke_batch(manifest, pkey, max_calldata, max_calls, max_fee, pool, pool_strategy, network):
+  """
+  Invoke many StarkNet contract functions from a manifest.
+
+  The manifest is a JSON list of {"alias", "function", "args"} objects or a CSV
+  file of alias,function,arg1,arg2,... rows. Calls are packed into as few
+  __execute__ transactions as the budgets allow. With --pool, the transactions
+  are sent concurrently from the pool accounts. With --max-fee auto, the fees
+  of all transactions are estimated in one pass.\n
+
+  syntax:\n
+    sarayu invoke-batch calls.csv --max-calldata 1000 --network "localhost"
+  """
+  from sarayulib.cmd.invoke_batch import invoke_batch as invoke_batch_cmd
+  results = invoke_batch_cmd(manifest, pkey, network, max_calldata, max_calls,
+                             _account_pool(pool, pool_strategy, network), max_fee)
+  for result in results or []:
+    print(json.dumps(result))
+
+@cli.command()
+@click.argument("input_file", nargs=1)
+@click.argument("output_file", nargs=1)
+@click.option("--jobs", "-j", type=int, default=None,
+              help="Number of signing processes. Defaults to the CPU count.")
+@network_option
+def presign(input_file, output_file, jobs, network):
+  """
+  Sign transactions in bulk for a later replay.
+
+  INPUT_FILE is JSONL, one transaction per line:\n
+    {"pkey": "STARKNET_PRIVATE_KEY", "calls": [["balance", "increase_balance", [10]]]}
+
+  Hashes and signatures are computed across a process pool; OUTPUT_FILE keeps
+  the input order.
+  """
+  from sarayulib.cmd.presign import presign_transactions
+  presign_transactions(input_file, output_file, network, jobs)
+
+@cli.command()
+@click.argument("signed_file", nargs=1)
+@click.option("--wait", is_flag=True, help="Wait until every transaction reaches a terminal status.")
+@network_option
+def replay(signed_file, wait, network):
+  """
+  Send transactions signed by `sarayu presign`, in order.
+  """
+  from sarayulib.cmd.presign import replay_transactions
+  replay_transactions(signed_file, network, wait)
 
 @cli.command()
-@click.argument("tx_hash", nargs=1)
+@click.argument("spec", nargs=1)
+@click.option("--duration", type=float, default=None, help="Seconds to run. Overrides the spec.")
+@click.option("--rate", type=float, default=None, help="Target operations per second (0: closed loop). Overrides the spec.")
+@click.option("--concurrency", type=int, default=None,
+              help="Workers (closed loop without --rate). Overrides the spec.")
+@click.option("--no-wait", is_flag=True, help="Only measure submission, do not poll for acceptance.")
+@click.option("--output", help="Write the report as JSON to this file.")
+@pool_options
 @network_option
-def txstatus(tx_hash,network):
+def loadtest(spec, duration, rate, concurrency, no_wait, output, pool, pool_strategy, network):
   """
-  Get TX_STATUS info for a transaction hash.
+  Run a call/invoke workload and report TPS, latency percentiles and rejections.
+
+  SPEC is a JSON (or YAML, with PyYAML installed) workload:\n
+    {"contract": "balance", "duration": 30, "rate": 20,\n
+     "functions": [\n
+       {"name": "increase_balance", "weight": 3, "args": [{"range": [1, 100]}]},\n
+       {"name": "get_balance", "type": "call"}]}
+
+  Arguments are literals or {"range": [a, b]}, {"choice": [..]}, {"seq": n}
+  generators. Without a rate, `concurrency` workers run back to back. An
+  optional "max_fee" (wei or "auto") applies to every invoke.\n
+
+  $ sarayu node & sarayu loadtest workload.json --duration 60
+  """
+  from sarayulib.utils import load_document
+  from sarayulib.cmd.loadtest import run_loadtest, format_report
+  report = run_loadtest(load_document(spec), network, duration, rate, concurrency, False if no_wait else None,
+                        _account_pool(pool, pool_strategy, network))
+  print(format_report(report))
+  if output:
+    with open(output, "w") as fp:
+      json.dump(report, fp, indent=2)
+
+@cli.command()
+@click.argument("tx_hashes", nargs=-1)
+@click.option("--file", "hashes_file", type=click.File("r"),
+              help="Read transaction hashes from a file, one per line ('-' for stdin).")
+@click.option("--wait", is_flag=True, help="Wait until every transaction reaches a terminal status.")
+@click.option("--timeout", default=consts.TX_WAIT_TIMEOUT, show_default=True,
+              help="Seconds to wait for each transaction.")
+@click.option("--concurrency", default=consts.TX_WAIT_CONCURRENCY, show_default=True,
+              help="Maximum concurrent status queries.")
+@network_option
+def txstatus(tx_hashes, hashes_file, wait, timeout, concurrency, network):
+  """
+  Get TX_STATUS info for transaction hashes.
+
+  With --wait, the hashes are polled concurrently and each result is printed
+  as soon as the transaction is ACCEPTED_ON_L2, ACCEPTED_ON_L1 or REJECTED.\n
+
+  $ sarayu txstatus 0x12.. 0x34.. --wait\n
+  $ cat hashes.txt | sarayu txstatus --file - --wait
 
   Direct StarkNet command:\n
     $ starknet tx_status --hash <hash beginning with 0x> --feeder_gateway_url=http://127.0.0.1:5050/
   """
-  out = txstatus_cmd(tx_hash,network)
+  from sarayulib.cmd.tx_status import get_tx_status as txstatus_cmd
+  from sarayulib.cmd.tx_status import wait_for_txs as wait_txs_cmd
+
+  tx_hashes = list(tx_hashes)
+  if hashes_file is not None:
+    tx_hashes.extend(line.strip() for line in hashes_file if line.strip())
+
+  if not wait:
+    for tx_hash in tx_hashes:
+      print(tx_hash, txstatus_cmd(tx_hash, network))
+    return
+
+  def on_result(tx_hash, status):
+    print(tx_hash, status, flush=True)
+
+  wait_txs_cmd(tx_hashes, network, on_result, concurrency=concurrency, timeout=timeout)
+
+@cli.command()
+def shell():
+  """
+  Start an interactive sarayu shell.
+
+  Commands run in one process, so imports, registries, keys and gateway
+  connections stay warm between them.\n
+
+  sarayu> call balance get_balance
+  """
+  from sarayulib.cmd.shell import shell as shell_cmd
+  shell_cmd(cli)
+
+@cli.command()
+@click.option("--socket", "socket_path", default=None,
+              help=f"UNIX socket to listen on. Defaults to $SARAYU_SOCKET or {consts.DAEMON_SOCKET}.")
+@click.option("--stop", is_flag=True, help="Stop the running daemon.")
+def daemon(socket_path, stop):
+  """
+  Run the sarayu daemon in the foreground.
+
+  While it runs, the sarayu command forwards every invocation to it and the
+  commands run with warm state. Set SARAYU_NO_DAEMON=1 to bypass it.
+  """
+  from sarayulib.cmd.shell import serve
+
+  if stop:
+    from sarayulib.client import shutdown
+    if not shutdown(socket_path):
+      print("No sarayu daemon is running.")
+    return
+  serve(cli, socket_path)
 
 @cli.command()
 def setlocal():
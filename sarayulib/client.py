@@ -0,0 +1,102 @@
+"""Forward sarayu commands to a running daemon (see sarayulib/cmd/shell.py).
+
+Only the standard library is imported here, so forwarding a command does not
+pay for the imports the daemon keeps warm.
+"""
+
+import json
+import os
+import socket
+import sys
+
+from sarayulib.constants import DAEMON_SOCKET
+
+# Commands that must run in the calling process. `devnet lease` runs a child
+# that may itself call sarayu: on the daemon, the two would wait on each other.
+# `node` (and `compile --watch`) run until interrupted and would hold the daemon.
+LOCAL_COMMANDS = ("daemon", "shell", "devnet", "node")
+
+# Options of the sarayu group (before the command) that take a value.
+GLOBAL_VALUE_OPTIONS = ("--trace-format", "--trace-file", "--retries", "--retry-delay")
+
+
+def _command(argv):
+    """argv from the command name on, past the global options."""
+    i = 0
+    while i < len(argv) and argv[i].startswith("-"):
+        i += 2 if argv[i] in GLOBAL_VALUE_OPTIONS else 1
+    return argv[i:]
+
+
+def _reads_stdin(command):
+    """Whether the command reads the client's stdin, which the daemon does not see."""
+    if "-" in command:
+        return True
+    # call-many reads stdin unless given an input file.
+    return (len(command) > 0 and command[0] == "call-many"
+            and not any(os.path.isfile(arg) for arg in command[1:] if not arg.startswith("-")))
+
+
+def runs_locally(argv):
+    """Whether argv must run in the calling process."""
+    command = _command(argv)
+    if len(command) == 0:
+        return False
+    if command[0] in LOCAL_COMMANDS or _reads_stdin(command):
+        return True
+    return command[0] == "compile" and "--watch" in command
+
+
+def forward(argv, path=None):
+    """
+    Run argv on the daemon and return its exit code.
+    Returns None when the command should run locally instead.
+    """
+    if os.environ.get("SARAYU_NO_DAEMON") or runs_locally(argv):
+        return None
+
+    path = os.path.expanduser(path or os.environ.get("SARAYU_SOCKET", DAEMON_SOCKET))
+    if not os.path.exists(path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+
+    request = {"argv": list(argv), "cwd": os.getcwd(), "env": dict(os.environ)}
+    with sock:
+        try:
+            sock.sendall(json.dumps(request).encode() + b"\n")
+        except OSError:
+            # The daemon is going away and did not get the command: run it here.
+            return None
+        try:
+            for line in sock.makefile("rb"):
+                message = json.loads(line)
+                if "exit" in message:
+                    return message["exit"]
+                stream = sys.stdout if message["stream"] == "stdout" else sys.stderr
+                stream.write(message["data"])
+                stream.flush()
+        except (OSError, ValueError):
+            pass
+    # The daemon stopped in the middle of the command.
+    sys.stderr.write("sarayu: the daemon stopped in the middle of the command\n")
+    return 1
+
+
+def shutdown(path=None):
+    """Ask the daemon to stop. Returns whether one was running."""
+    path = os.path.expanduser(path or os.environ.get("SARAYU_SOCKET", DAEMON_SOCKET))
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        return False
+    with sock:
+        sock.sendall(json.dumps({"shutdown": True}).encode() + b"\n")
+        sock.makefile("rb").readline()
+    return True
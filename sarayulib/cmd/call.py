@@ -1,49 +1,78 @@
 #!./bin/python
 
+import json
 import logging
-import subprocess
-import os
 
 from sarayulib.utils import (
-    GATEWAY,
-    is_string, normalize_number, hex_address,
-    deployments_load, set_network_var,
+    is_string, normalize_number,
+    deployments_load,
     stringify
 )
+from sarayulib.transport import get_transport, TransportError
+from sarayulib.abi import load_abi_index
+from sarayulib.cache import get_call_cache
+from sarayulib.calldata import CalldataError, encode_calls
+from sarayulib.constants import CALLDATA_MAX_FELTS
 
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 
-def call_function(address_or_alias, view_function, params=[], network="localhost"):
+def prepare_call(address_or_alias, view_function, params, network="localhost"):
+    """Resolve the contract and encode the inputs. Returns (address, abi, abi_index, calldata)."""
+    address, abi, index, calldata = prepare_calls(address_or_alias, view_function, params, network, None)
+    return address, abi, index, calldata[0]
+
+def prepare_calls(address_or_alias, view_function, params, network="localhost", max_calldata=CALLDATA_MAX_FELTS):
+    """
+    Like prepare_call, with `@path` params read from files and the calldata
+    split in calls of at most max_calldata felts (see sarayulib.calldata).
+    Returns (address, abi, abi_index, [calldata]).
+    """
     if not is_string(address_or_alias):
         address_or_alias = normalize_number(address_or_alias)
 
     address, abi = next(deployments_load(address_or_alias, network))
     #print(hex_address(address))
 
-    command = ["starknet", "call", "--address", hex_address(address), "--abi", abi, "--function", view_function]
-
     if params is None:
         params = []
-    params = stringify(params, True)
-
-    if len(params) > 0:
-        command.append("--inputs")
-        command.extend(params)
+    index = load_abi_index(abi)
+    calls = encode_calls(index, view_function, list(params), max_calldata)
+    return address, abi, index, [stringify(calldata) for _, calldata in calls]
 
-    if set_network_var(network) is None:
-        command.append(f"--feeder_gateway_url={GATEWAY.get(network)}")
-        command.append(f"--gateway_url={GATEWAY.get(network)}")
+def execute_call(address, abi, view_function, params, network="localhost", block="pending", cache=False):
+    """Send a prepared call, through the call cache when asked to. Returns the result felts."""
+    transport = get_transport(network)
+    if cache:
+        return get_call_cache(network).call(transport, address, abi, view_function, params, block)
+    return transport.call(address, abi, view_function, params, block)
 
-    command.append("--no_wallet")
-
-    logging.debug(command)
+def call_function(address_or_alias, view_function, params=[], network="localhost", decode=False,
+                  block="pending", cache=False, max_calldata=CALLDATA_MAX_FELTS):
+    """
+    Call a view function at a block ("pending", "latest" or a number). Returns
+    the result felts separated by spaces or, with decode=True, the outputs
+    decoded with the contract ABI as JSON. With cache=True results are served
+    from the call cache (see sarayulib.cache). A failed call returns the
+    structured error (TransportError or CalldataError to_dict()). A call split for its
+    calldata size returns one result line per part.
+    """
+    try:
+        address, abi, index, calls = prepare_calls(address_or_alias, view_function, params, network, max_calldata)
+    except CalldataError as err:
+        logging.error(f"\n😰 {err}")
+        return err.to_dict()
 
     try:
-        out = subprocess.check_output(command).strip().decode("utf-8")
-    except subprocess.CalledProcessError:
-        p = subprocess.Popen(command, stderr=subprocess.PIPE)
-        _, error = p.communicate()
-        err_msg = error.decode()
+        lines = []
+        for params in calls:
+            result = execute_call(address, abi, view_function, params, network, block, cache)
+            if decode:
+                lines.append(json.dumps(index.decode_outputs(view_function, result)))
+            else:
+                lines.append(" ".join(result))
+        out = "\n".join(lines)
+    except TransportError as err:
+        err_msg = str(err)
 
         if "max_fee must be bigger than 0" in err_msg:
             logging.error("""\n😰 Whoops, looks like max fee is missing. Try with:\n
@@ -51,8 +80,10 @@ def call_function(address_or_alias, view_function, params=[], network="localhost
         elif "transactions should go through the __execute__ entrypoint." in err_msg:
             logging.error("\n\n😰 Whoops, looks like you're not using an account. Try with:\n"
                           "\nnile send [OPTIONS] SIGNER CONTRACT_NAME METHOD [PARAMS]")
-        
-        out=''
+        else:
+            logging.error(f"\n😰 {err_msg}")
+
+        out = err.to_dict()
     
     #print(out)
     return out
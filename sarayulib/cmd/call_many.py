@@ -0,0 +1,78 @@
+"""Run many view calls from a JSONL stream, with bounded concurrency."""
+
+import json
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from sarayulib.transport import TransportError
+from sarayulib.cmd.call import prepare_call, execute_call
+from sarayulib.constants import CALL_MANY_CONCURRENCY
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+def parse_spec(line):
+    """
+    Parse one input line:
+    - {"alias": alias or address, "function": .., "inputs": [..], "id": .., "block": ..}
+    - [alias or address, function, [inputs]]
+    """
+    spec = json.loads(line)
+    if isinstance(spec, list):
+        alias, function, *inputs = spec
+        return {"alias": alias, "function": function, "inputs": inputs[0] if inputs else []}
+    return spec
+
+def _run(number, line, network, decode, block, cache):
+    outcome = {"line": number}
+    try:
+        spec = parse_spec(line)
+        if "id" in spec:
+            outcome["id"] = spec["id"]
+        function = spec["function"]
+        address, abi, index, params = prepare_call(spec["alias"], function, spec.get("inputs", []), network)
+        result = execute_call(address, abi, function, params, network, spec.get("block", block), cache)
+        outcome["result"] = index.decode_outputs(function, result) if decode else result
+    except StopIteration:
+        outcome["error"] = f"unknown contract {spec['alias']}"
+    except TransportError as err:
+        outcome["error"] = str(err)
+        outcome["kind"] = err.kind
+    except (OSError, ValueError, KeyError) as err:
+        outcome["error"] = str(err) or type(err).__name__
+    return outcome
+
+def call_many(lines, network="localhost", concurrency=CALL_MANY_CONCURRENCY, ordered=True,
+              decode=False, block="pending", cache=False):
+    """
+    Run the calls of an iterable of JSONL lines and yield one outcome dict per
+    call, in input order or (ordered=False) as soon as each call completes.
+    At most 2 * concurrency calls are in flight or buffered, so memory does not
+    grow with the input.
+    """
+    window = 2 * concurrency
+    specs = ((n, line) for n, line in enumerate(lines) if line.strip())
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        def submit(n, line):
+            return pool.submit(_run, n, line, network, decode, block, cache)
+
+        if ordered:
+            pending = deque()
+            for n, line in specs:
+                pending.append(submit(n, line))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+            return
+
+        pending = set()
+        for n, line in specs:
+            pending.add(submit(n, line))
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in wait(pending).done:
+            yield future.result()
@@ -1,14 +1,27 @@
 #!./bin/python
 
 import sys
+import contextlib
+import hashlib
+import json
 import logging
+import re
 import subprocess
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
-from sarayulib.constants import OUTPUT_DIR, ABIS_DIR, CONTRACTS_DIR
+from sarayulib.classes import ingest_file, class_hash_of
+from sarayulib.constants import (
+    OUTPUT_DIR, ABIS_DIR, CONTRACTS_DIR, CLASSES_DIR, COMPILE_CACHE_FILE, COMPILE_WATCH_INTERVAL,
+)
+from sarayulib.trace import span
 
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 
+# `from a.b.c import x` (also with a parenthesized, multi-line name list).
+_IMPORT = re.compile(rb"^\s*from\s+([\w.]+)\s+import\b", re.M)
+
 def get_all_contracts(directory=None):
     """Get all cairo contracts in the default contract directory."""
 
@@ -18,10 +31,97 @@ def get_all_contracts(directory=None):
         files += [ os.path.join(dirpath, file) for file in filenames if file.endswith(ext) ]
     return files
 
-def compile_contracts(contracts, directory=None):
-    """Compile cairo contracts."""
+def compiler_version():
+    """The starknet-compile version, or None if it is not installed."""
+    try:
+        process = subprocess.run(["starknet-compile", "--version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except FileNotFoundError:
+        return None
+    return process.stdout.decode(errors="replace").strip()
+
+class CompileCache:
+    """
+    Keys of the last successful compilation of each contract, in
+    .cache/compile.json. A key covers the compiler version, the cairo path and
+    the content of every file in the contract's import closure, so a contract
+    is rebuilt only when one of them changed. The digest and imports of a file
+    are kept with its mtime and size, so unchanged files are not read again.
+    """
+
+    def __init__(self, cairo_path, version, path=COMPILE_CACHE_FILE):
+        self.cairo_path = cairo_path
+        self.version = version
+        self.path = path
+        self.data = {"files": {}, "contracts": {}}
+        if os.path.exists(path):
+            with open(path) as fp:
+                self.data = json.load(fp)
+
+    def _file(self, path):
+        """(digest, imported modules) of a source file."""
+        stat = os.stat(path)
+        entry = self.data["files"].get(path)
+        if entry is None or entry[:2] != [stat.st_mtime_ns, stat.st_size]:
+            with open(path, "rb") as fp:
+                source = fp.read()
+            imports = [m.decode() for m in _IMPORT.findall(source)]
+            entry = [stat.st_mtime_ns, stat.st_size, hashlib.sha256(source).hexdigest(), imports]
+            self.data["files"][path] = entry
+        return entry[2], entry[3]
+
+    def resolve(self, module):
+        """The file of a module under the cairo path, or None (e.g. a starkware library)."""
+        for root in self.cairo_path:
+            candidate = os.path.normpath(os.path.join(root, *module.split("."))) + ".cairo"
+            if os.path.exists(candidate):
+                return candidate
+        return None
+
+    def closure(self, contract):
+        """{path: digest} of a contract and every file it imports, transitively."""
+        closure, todo = {}, [os.path.normpath(contract)]
+        while todo:
+            path = todo.pop()
+            if path in closure:
+                continue
+            closure[path], imports = self._file(path)
+            todo.extend(p for p in map(self.resolve, imports) if p is not None)
+        return closure
+
+    def key(self, contract):
+        """The cache key of a contract, None if it cannot be read (starknet-compile reports it)."""
+        try:
+            closure = sorted(self.closure(contract).items())
+        except OSError:
+            return None
+        return hashlib.sha256(json.dumps([self.version, self.cairo_path, closure]).encode()).hexdigest()
+
+    def fresh(self, contract, key):
+        """Whether the contract was compiled with this key and its artifacts are still there."""
+        name = _name(contract)
+        return (key is not None and self.data["contracts"].get(contract) == key
+                and os.path.exists(f"{ABIS_DIR}/{name}.json") and class_hash_of(name) is not None)
+
+    def record(self, contract, key):
+        self.data["contracts"][contract] = key
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as fp:
+            json.dump(self.data, fp)
+        os.replace(tmp, self.path)
+
+def compile_contracts(contracts, directory=None, jobs=None, cairo_path=None, force=False):
+    """
+    Compile cairo contracts, running up to `jobs` compilations at once.
+    Contracts whose sources, imports and compiler did not change since their
+    last compilation are skipped, unless force is set.
+    """
 
     contracts_dir = directory if directory else CONTRACTS_DIR
+    jobs = jobs if jobs else (os.cpu_count() or 1)
+    cairo_path = [contracts_dir, *(cairo_path or [])]
 
     if not os.path.exists(OUTPUT_DIR):
         logging.info(f"📁 Creating {OUTPUT_DIR} to store output json files")
@@ -36,10 +136,35 @@ def compile_contracts(contracts, directory=None):
         logging.info( f"🤖 Compiling all Cairo contracts in the {contracts_dir} directory" )
         all_contracts = get_all_contracts(directory=contracts_dir)
 
-    results = [ _compile_contract(contract, contracts_dir) for contract in all_contracts ]
-    failed_contracts = [c for (c, r) in zip(all_contracts, results) if r != 0]
+    cache = CompileCache(cairo_path, compiler_version())
+    with span("compile cache", contracts=len(all_contracts)):
+        keys = {c: cache.key(c) for c in all_contracts}
+    if not force:
+        fresh = [c for c in all_contracts if cache.fresh(c, keys[c])]
+        if fresh:
+            logging.info(f"⚡ {len(fresh)} contracts up to date")
+        all_contracts = [c for c in all_contracts if c not in fresh]
+
+    # Compilation happens in starknet-compile subprocesses, so threads are
+    # enough to keep `jobs` of them running.
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(lambda c: _compile_contract(c, cairo_path), all_contracts))
+
+    failed_contracts = [c for (c, r) in zip(all_contracts, results) if r[0] != 0]
     failures = len(failed_contracts)
 
+    compiled = [c for (c, r) in zip(all_contracts, results) if r[0] == 0]
+    if compiled:
+        store_classes(compiled, jobs)
+    for contract in compiled:
+        cache.record(contract, keys[contract])
+    cache.save()
+
+    if len(all_contracts) > 0:
+        logging.info("⏱  Compilation times:")
+        for contract, (_, duration) in sorted(zip(all_contracts, results), key=lambda x: (-x[1][1], x[0])):
+            logging.info(f"   {duration:7.2f}s  {contract}")
+
     if failures == 0:
         logging.info("✅ Done")
     else:
@@ -47,22 +172,116 @@ def compile_contracts(contracts, directory=None):
         if failures > 1:
             exp += "s"  # pluralize
         logging.info(f"🛑 Failed to compile the following {exp}:")
-        for contract in failed_contracts:
+        for contract in sorted(failed_contracts):
             logging.info(f"   {contract}")
 
-def _compile_contract(path, directory=None):
+def store_classes(contracts, jobs=None):
+    """
+    Move compiled contracts into the class store (see sarayulib.classes).
+    Class hashes are CPU bound, so new contents are hashed in processes.
+    """
+    items = [(_name(path), f"{OUTPUT_DIR}/{_name(path)}.json") for path in contracts]
+    with span("store classes", contracts=len(items)):
+        if len(items) == 1 or jobs == 1:
+            class_hashes = [ingest_file(item) for item in items]
+        else:
+            with ProcessPoolExecutor(max_workers=min(jobs or os.cpu_count() or 1, len(items))) as pool:
+                class_hashes = list(pool.map(ingest_file, items))
+    logging.info(f"🗄  Stored {len(items)} contracts as {len(set(class_hashes))} classes in {CLASSES_DIR}")
+
+def _name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+def _compile_contract(path, cairo_path=None):
+    """Compile one contract. Returns (returncode, duration in seconds)."""
     base = os.path.basename(path)
     filename = os.path.splitext(base)[0]
-    logging.info(f"🔨 Compiling {path}")
-    contracts_dir = directory if directory else CONTRACTS_DIR
+    cairo_path = ":".join(cairo_path or [CONTRACTS_DIR])
+
+    cmd = f"""starknet-compile {path} --cairo_path={cairo_path} --output {OUTPUT_DIR}/{filename}.json --abi {ABIS_DIR}/{filename}.json"""
+
+    start = time.monotonic()
+    with span("compile", contract=path):
+        process = subprocess.run(cmd.split(), stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    duration = time.monotonic() - start
+
+    # Log the captured output in one record so parallel compilations don't interleave.
+    message = f"🔨 Compiled {path} in {duration:.2f}s"
+    if process.returncode != 0:
+        message = f"🛑 Failed {path} in {duration:.2f}s"
+    output = process.stdout.decode(errors="replace").rstrip()
+    if output:
+        message += "\n" + output
+    logging.info(message)
+
+    return process.returncode, duration
+
+def watch_contracts(contracts, directory=None, jobs=None, cairo_path=None, interval=COMPILE_WATCH_INTERVAL):
+    """Compile, then compile again the affected contracts whenever a source changes. Runs until interrupted."""
+    compile_contracts(contracts, directory, jobs, cairo_path)
+    roots = [directory if directory else CONTRACTS_DIR, *(cairo_path or [])]
+    logging.info(f"👀 Watching {', '.join(roots)}")
+    for changed in _changes(roots, interval):
+        logging.info(f"✏️  Changed: {', '.join(changed)}")
+        compile_contracts(contracts, directory, jobs, cairo_path)
+
+def _changes(roots, interval):
+    """Yield the lists of .cairo files that change under roots."""
+    try:
+        from inotify_simple import INotify, flags
+    except ImportError:
+        logging.debug("inotify_simple is not installed: polling for changes")
+        yield from _polled_changes(roots, interval)
+        return
+
+    inotify = INotify()
+    mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM | flags.CREATE | flags.DELETE
+    watches = {}
 
-    cmd = f"""starknet-compile {path} --cairo_path={contracts_dir} --output {OUTPUT_DIR}/{filename}.json --abi {ABIS_DIR}/{filename}.json"""
+    def watch(root):
+        for dirpath, _, _ in os.walk(root):
+            if dirpath not in watches.values():
+                watches[inotify.add_watch(dirpath, mask)] = dirpath
 
-    process = subprocess.Popen(cmd.split(), stdout=subprocess.PIPE)
-    process.communicate()
-    return process.returncode
+    for root in roots:
+        watch(root)
+    while True:
+        # read_delay gathers the events of one save (editors write, rename, ...).
+        events = inotify.read(read_delay=int(interval * 1000))
+        changed = set()
+        for event in events:
+            path = os.path.join(watches.get(event.wd, ""), event.name)
+            if event.mask & flags.ISDIR:
+                if event.mask & flags.CREATE:
+                    # Files may have been written in it before the watch was added.
+                    watch(path)
+                    changed.update(get_all_contracts(path))
+            elif path.endswith(".cairo"):
+                changed.add(path)
+        if changed:
+            yield sorted(changed)
 
+def _polled_changes(roots, interval):
+    def mtimes():
+        found = {}
+        for root in roots:
+            for dirpath, _, filenames in os.walk(root):
+                for file in filenames:
+                    if file.endswith(".cairo"):
+                        path = os.path.join(dirpath, file)
+                        with contextlib.suppress(FileNotFoundError):
+                            stat = os.stat(path)
+                            found[path] = (stat.st_mtime_ns, stat.st_size)
+        return found
 
+    seen = mtimes()
+    while True:
+        time.sleep(interval)
+        current = mtimes()
+        changed = sorted(p for p in seen.keys() | current.keys() if seen.get(p) != current.get(p))
+        seen = current
+        if changed:
+            yield changed
 
 if __name__ == "__main__":
     args = sys.argv
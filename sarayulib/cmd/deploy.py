@@ -1,36 +1,122 @@
 #!./bin/python
 
 import logging
-import subprocess
+import math
 import os
+import re
+import secrets
+from concurrent.futures import ThreadPoolExecutor
 
 from sarayulib.utils import (
-    GATEWAY,
-    hex_address, parse_information,
-    deployments_register,
-    set_network_var
+    hex_address, normalize_number, stringify,
+    deployments_register, deployments_load,
+    load_document,
     )
+from sarayulib.transport import get_transport, TransportError
+from sarayulib.deployments import register_deployments, is_declared, register_declared
+from sarayulib.classes import load_class
+from sarayulib.nonce import NonceManager
+from sarayulib.signing import sign_declare
+from sarayulib.fees import AUTO, resolve_max_fee, fee_multiplier
+from sarayulib.cmd.invoke import load_signer, build_execute_calldata, submit_execute
+from sarayulib.cmd.tx_status import wait_for_txs
 
-from sarayulib.constants import OUTPUT_DIR, ABIS_DIR, CONTRACTS_DIR
+from sarayulib.constants import (
+    ABIS_DIR, CONTRACTS_DIR, DEPLOY_CONCURRENCY, UDC_ADDRESS, QUERY_VERSION,
+)
 
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 
-def deploy_contract(contract_name, alias=None, network="localhost"):
-    """Deploy StarkNet smart contracts."""
-    logging.info(f"🚀 Deploying {contract_name}")
+ACCEPTED = ("ACCEPTED_ON_L2", "ACCEPTED_ON_L1")
+
+
+class DeploymentError(TransportError):
+    """Raised when deployments (or declarations) were sent but not accepted."""
 
-    command = ["starknet", "deploy", "--contract", f"{OUTPUT_DIR}/{contract_name}.json"]
 
+def deploy_signer(pkey="STARKNET_PRIVATE_KEY", network="localhost"):
+    """The account to declare and deploy through, or None if pkey is not set or not deployed."""
+    if pkey is None or pkey not in os.environ:
+        return None
+    return load_signer(pkey, network)
 
-    if set_network_var(network) is None:
-        command.append(f"--gateway_url={GATEWAY.get(network)}")
+def declare_class(compiled, signer, network="localhost", max_fee=None):
+    """
+    Declare a class through an account, once per network: classes recorded as
+    declared, or that the gateway already has, are skipped. Waits for the
+    declaration, and raises DeploymentError if it is not accepted. Returns the
+    tx hash, or None when skipped.
+    """
+    if is_declared(compiled.class_hash, network):
+        return None
+    transport = get_transport(network)
+    if transport.class_exists(compiled.class_hash):
+        register_declared(compiled.class_hash, None, network)
+        return None
 
-    command.append("--no_wallet")
-    logging.info(command)
+    priv_key, sender = signer
+    max_fee = resolve_max_fee(max_fee, network)
+    nonces = NonceManager(network)
+    nonce = nonces.reserve(sender)
+    try:
+        if max_fee == AUTO:
+            signature = sign_declare(sender, compiled.class_hash, nonce, priv_key, 0, QUERY_VERSION)
+            estimate = transport.estimate_declare_fee(sender, compiled, signature, nonce, QUERY_VERSION)
+            max_fee = math.ceil(normalize_number(estimate["overall_fee"]) * fee_multiplier())
+        signature = sign_declare(sender, compiled.class_hash, nonce, priv_key, max_fee)
+        _, tx_hash = transport.declare(sender, compiled, signature, nonce, max_fee)
+    except TransportError:
+        # The reserved nonce was not consumed.
+        nonces.resync(sender)
+        raise
+    logging.info(f"📜 Declaring {compiled.name} as {hex_address(compiled.class_hash)}: {hex(tx_hash)}")
 
-    output = subprocess.check_output(command)
+    status = wait_for_txs([hex(tx_hash)], network).get(hex(tx_hash))
+    if status not in ACCEPTED:
+        raise DeploymentError(f"Declaration of {compiled.name} failed ({status}, {hex(tx_hash)})",
+                              "revert" if status == "REJECTED" else None)
+    register_declared(compiled.class_hash, hex(tx_hash), network)
+    return tx_hash
 
-    address, tx_hash = parse_information(output)
+def deploy_class(compiled, inputs, signer, network="localhost", max_fee=None):
+    """
+    Deploy an instance of a declared class with the Universal Deployer
+    Contract: the class is not uploaded again. Returns (address, tx_hash).
+    """
+    from starkware.starknet.core.os.contract_address.contract_address import (
+        calculate_contract_address_from_hash,
+    )
+
+    priv_key, sender = signer
+    salt = secrets.randbits(251)
+    # deployContract(classHash, salt, unique, calldata_len, calldata)
+    calldata = [compiled.class_hash, salt, 0, len(inputs), *inputs]
+    execute_calldata = build_execute_calldata([[UDC_ADDRESS, "deployContract", calldata]])
+    tx_hash = submit_execute(sender, priv_key, execute_calldata, network, resolve_max_fee(max_fee, network))
+    # Not unique: the address does not depend on the deployer.
+    address = calculate_contract_address_from_hash(
+        salt=salt, class_hash=compiled.class_hash, constructor_calldata=inputs, deployer_address=0,
+    )
+    return address, normalize_number(tx_hash)
+
+def send_deploy(compiled, inputs=None, signer=None, network="localhost", max_fee=None):
+    """
+    Deploy a class of the store. With an account signer, the class is declared
+    once and instances go through the UDC; without, a DEPLOY transaction
+    uploads the class. Returns (address, tx_hash).
+    """
+    inputs = inputs or []
+    if signer is None:
+        return get_transport(network).deploy(compiled, inputs)
+    declare_class(compiled, signer, network, max_fee)
+    return deploy_class(compiled, inputs, signer, network, max_fee)
+
+def deploy_contract(contract_name, alias=None, network="localhost", pkey="STARKNET_PRIVATE_KEY", max_fee=None):
+    """Deploy StarkNet smart contracts."""
+    logging.info(f"🚀 Deploying {contract_name}")
+
+    compiled = load_class(contract_name)
+    address, tx_hash = send_deploy(compiled, [], deploy_signer(pkey, network), network, max_fee)
     logging.info(f"⏳ ️Deployment of {contract_name} successfully sent at {hex_address(address)}")
     logging.info(f"🧾 Transaction hash: {hex(tx_hash)}")
 
@@ -41,6 +127,140 @@ def deploy_contract(contract_name, alias=None, network="localhost"):
     return address
 
 
+_REFERENCE = re.compile(r"^\$\{([^}]+)\}$")
+
+def load_deploy_manifest(path):
+    """
+    Load deployment entries from a JSON or YAML manifest:
+
+        contracts:
+          - name: token            # compiled contract token (see sarayulib.classes)
+            alias: usdc            # defaults to name
+            inputs: [USDC, 6, "${owner}"]
+            depends_on: [owner]    # optional, ${alias} inputs are dependencies already
+
+    A bare list of entries is accepted too.
+    """
+    manifest = load_document(path)
+    entries = manifest["contracts"] if isinstance(manifest, dict) else manifest
+    contracts = {}
+    for entry in entries:
+        alias = entry.get("alias", entry["name"])
+        if alias in contracts:
+            raise Exception(f"Alias {alias} appears twice in {path}")
+        inputs = list(entry.get("inputs", []))
+        references = [m.group(1) for m in (_REFERENCE.match(str(x)) for x in inputs) if m]
+        contracts[alias] = {
+            "name": entry["name"],
+            "inputs": inputs,
+            "depends_on": list(dict.fromkeys([*entry.get("depends_on", []), *references])),
+        }
+    return contracts
+
+def deployment_layers(contracts):
+    """Group aliases in layers: every alias only depends on aliases of earlier layers."""
+    remaining = {alias: {d for d in c["depends_on"] if d in contracts} for alias, c in contracts.items()}
+    layers = []
+    while remaining:
+        layer = sorted(alias for alias, deps in remaining.items() if len(deps) == 0)
+        if len(layer) == 0:
+            raise Exception(f"Dependency cycle between {sorted(remaining)}")
+        layers.append(layer)
+        for alias in layer:
+            del remaining[alias]
+        for deps in remaining.values():
+            deps.difference_update(layer)
+    return layers
+
+def _resolve_inputs(inputs, addresses, network):
+    resolved = []
+    for x in inputs:
+        match = _REFERENCE.match(str(x))
+        if match is None:
+            resolved.append(normalize_number(stringify(x, True)))
+            continue
+        alias = match.group(1)
+        if alias not in addresses:
+            deployment = next(deployments_load(alias, network), None)
+            if deployment is None:
+                raise Exception(f"Unknown deployment {alias}")
+            addresses[alias] = deployment[0]
+        resolved.append(addresses[alias])
+    return resolved
+
+def deploy_manifest(manifest, network="localhost", concurrency=DEPLOY_CONCURRENCY, pkey="STARKNET_PRIVATE_KEY",
+                    max_fee=None):
+    """
+    Deploy every contract of a manifest. Independent contracts are deployed
+    concurrently, layer by layer, and each layer is awaited in parallel before
+    its dependents are sent. Accepted deployments are registered in one write,
+    then a DeploymentError lists the ones that failed to be sent or accepted.
+    Aliases already registered are skipped, so a failed run can be resumed.
+    Through the pkey account, each distinct class is declared once up front.
+    Returns {alias: address}.
+    """
+    contracts = load_deploy_manifest(manifest)
+    layers = deployment_layers(contracts)
+    signer = deploy_signer(pkey, network)
+    addresses, registered = {}, []
+
+    todo = [alias for alias in contracts if next(deployments_load(alias, network), None) is None]
+    classes = {name: load_class(name) for name in sorted({contracts[alias]["name"] for alias in todo})}
+    if signer is not None and classes:
+        unique = {c.class_hash: c for c in classes.values()}
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda c: declare_class(c, signer, network, max_fee), unique.values()))
+
+    def deploy(alias):
+        contract = contracts[alias]
+        inputs = _resolve_inputs(contract["inputs"], addresses, network)
+        try:
+            address, tx_hash = send_deploy(classes[contract["name"]], inputs, signer, network, max_fee)
+        except TransportError as err:
+            logging.error(f"❌ Deployment of {alias} failed: {err}")
+            return alias, None, err
+        logging.info(f"⏳ ️Deployment of {alias} successfully sent at {hex_address(address)}")
+        return alias, address, hex(tx_hash)
+
+    failed = []
+    try:
+        for depth, layer in enumerate(layers):
+            todo = []
+            for alias in layer:
+                deployment = next(deployments_load(alias, network), None)
+                if deployment is None:
+                    todo.append(alias)
+                else:
+                    addresses[alias] = deployment[0]
+            if len(todo) == 0:
+                continue
+            logging.info(f"🚀 Deploying layer {depth}: {', '.join(todo)}")
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(deploy, todo))
+            sent = [result for result in results if result[1] is not None]
+            failed.extend(f"{alias} ({err})" for alias, address, err in results if address is None)
+
+            # Whatever was sent is awaited and registered, even if other deployments failed.
+            statuses = wait_for_txs([tx_hash for *_, tx_hash in sent], network)
+            for alias, address, tx_hash in sent:
+                if statuses.get(tx_hash) in ACCEPTED:
+                    addresses[alias] = address
+                    registered.append((address, f"{ABIS_DIR}/{contracts[alias]['name']}.json", alias))
+                else:
+                    failed.append(f"{alias} ({statuses.get(tx_hash)}, {tx_hash})")
+            if failed:
+                # Dependents of the failed deployments cannot be sent.
+                break
+    finally:
+        if registered:
+            register_deployments(registered, network)
+            logging.info(f"📦 Registered {len(registered)} deployments")
+
+    if failed:
+        raise DeploymentError(f"Deployment failed: {', '.join(failed)}")
+    return {alias: addresses[alias] for alias in contracts}
+
+
 if __name__ == "__main__":
     #deploy_contract(('102-balance'))
     deploy_contract(('102-balance'), alias="balance", network="localhost")
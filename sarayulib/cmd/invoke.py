@@ -1,146 +1,169 @@
 #!./bin/python
 
 import logging
-import subprocess
 import os
 
-from starkware.crypto.signature.signature import private_to_stark_key, sign
-from sarayulib.cmd.setup import account_exists, account_load
-from starkware.starknet.core.os.transaction_hash.transaction_hash import TransactionHashPrefix, calculate_transaction_hash_common
-from starkware.starknet.definitions.general_config import StarknetChainId
+from sarayulib.cmd.setup import account_exists, account_load, get_public_key
+from sarayulib.signing import sign_execute
 
 from sarayulib.utils import (
-    GATEWAY,
-    is_string, normalize_number, hex_address,
+    normalize_number,
     deployments_load,
     from_call_to_call_array,
     stringify,
-    parse_send,
-    set_network_var,
 )
-from sarayulib.cmd.tx_status import get_tx_status
-from sarayulib.constants import MAX_FEE, TRANSACTION_VERSION
+from sarayulib.transport import get_transport, TransportError
+from sarayulib.nonce import NonceManager, is_nonce_error
+from sarayulib.abi import load_abi_index
+from sarayulib.calldata import CalldataError, encode_calls, encode_felts
+from sarayulib.trace import span
+from sarayulib.cmd.tx_status import get_tx_status, TERMINAL_STATUSES
+from sarayulib.fees import AUTO, get_fee_estimator, resolve_max_fee
+from sarayulib.constants import MAX_FEE, CALLDATA_MAX_FELTS
 
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 
 def get_nonce(contract_address, network="localhost"):
     """Get the current nonce."""
-    # Starknet CLI requires a hex string for get_nonce command
-    if not str(contract_address).startswith("0x"):
-        contract_address = hex(int(contract_address))
+    return get_transport(network).get_nonce(contract_address)
 
-    command = ["starknet", "get_nonce", "--contract_address", contract_address]
-
-    if network == "mainnet":
-        os.environ["STARKNET_NETWORK"] = "alpha-mainnet"
-    elif network == "goerli":
-        os.environ["STARKNET_NETWORK"] = "alpha-goerli"
-    else:
-        command.append(f"--feeder_gateway_url={GATEWAY.get(network)}")
-
-    logging.debug(command)
-
-    return int(subprocess.check_output(command).strip())
-
-def invoke_function(contract_alias, invoke_function, arguments, pkey="STARKNET_PRIVATE_KEY", network="localhost"):
-    ## out = send(network, signer_alias, contract_alias, function, arguments)
-
-    if not isinstance(arguments[0], list):
-        arguments = [arguments]
-
-    target_address, _ = next(deployments_load(contract_alias, network)) or contract_alias
-    calldata = [[int(x) for x in c] for c in arguments]
+def load_signer(pkey="STARKNET_PRIVATE_KEY", network="localhost"):
+    """Return (private_key, account_address) for the account of pkey, or None."""
+    with span("account load", pkey=pkey):
+        return _load_signer(pkey, network)
 
+def _load_signer(pkey, network):
     priv_key = normalize_number(os.environ[pkey])
-    public_key = private_to_stark_key(priv_key)
+    public_key = get_public_key(priv_key)
 
-    if account_exists(public_key, network):
-        data = next(account_load(public_key, network))
-        logging.debug("account exists: ", data)
-        address = data["address"]
-    else:
-        logging.error("Account not deployed.")
-        return
-
-    nonce = get_nonce(address, network)
-    logging.debug("nonce=", nonce)
-    
-    calls = [[target_address, invoke_function, c] for c in calldata]
-    call_array, calldata = from_call_to_call_array(calls)
-
-    execute_calldata = [len(call_array), *[x for t in call_array for x in t],
-                        len(calldata), *calldata,]
+    if not account_exists(public_key, network):
+        return None
 
+    data = next(account_load(public_key, network))
+    logging.debug(f"account exists: {data}")
+    address = data["address"]
     if isinstance(address, str):
-        sender = int(address, 16)
-    else:
-        sender = address
+        address = int(address, 16)
+    return priv_key, address
 
-    transaction_hash = calculate_transaction_hash_common(
-        tx_hash_prefix=TransactionHashPrefix.INVOKE,
-        version=TRANSACTION_VERSION,
-        contract_address=sender,
-        entry_point_selector=0,
-        calldata=execute_calldata,
-        max_fee=MAX_FEE,
-        chain_id=StarknetChainId.TESTNET.value,
-        additional_data=[nonce]
-    )
-
-    sig_r, sig_s = sign(transaction_hash, priv_key)
-    signature = [str(sig_r), str(sig_s)]
-
-    address, abi = next(deployments_load(address,network))
-    address = hex_address(address)
-
-    if execute_calldata is None:
-        execute_calldata = []
-    params = stringify(execute_calldata, True)
-
-    command = ["starknet", "invoke", "--address", address, "--abi", abi, "--function", "__execute__", ]
-
-    if set_network_var(network) is None:
-        command.append(f"--feeder_gateway_url={GATEWAY.get(network)}")
-        command.append(f"--gateway_url={GATEWAY.get(network)}")
-
-    if len(params) > 0:
-        command.append("--inputs")
-        command.extend(params)
-
-    if signature is not None:
-        command.append("--signature")
-        command.extend(signature)
-
-    command.append("--max_fee")
-    command.append(str(MAX_FEE))
+def build_execute_calldata(calls):
+    """Build the __execute__ calldata for a list of [to, function, calldata] calls."""
+    call_array, calldata = from_call_to_call_array(calls)
+    return [len(call_array), *[x for t in call_array for x in t],
+            len(calldata), *calldata,]
+
+def send_execute(sender, execute_calldata, signature, nonce, network="localhost", max_fee=MAX_FEE):
+    """Send a signed __execute__ transaction through the account. Returns the tx hash."""
+    address, abi = next(deployments_load(sender, network))
+    params = stringify(encode_felts(execute_calldata))
+    return get_transport(network).invoke(address, abi, "__execute__", params,
+                                         signature, max_fee, nonce=nonce)
+
+def submit_execute(sender, priv_key, execute_calldata, network="localhost", max_fee=MAX_FEE):
+    """
+    Sign and send an __execute__ transaction with a locally reserved nonce.
+    On a nonce mismatch the nonce is resynced and the transaction resent once.
+    With max_fee="auto" the fee is estimated (see sarayulib.fees), and estimated
+    again once if the gateway rejects it as insufficient.
+    """
+    nonces = NonceManager(network)
+    estimator = get_fee_estimator(network) if max_fee == AUTO else None
+    for attempt in range(2):
+        fee = max_fee
+        if estimator is not None:
+            fee = estimator.max_fee(sender, priv_key, execute_calldata)
+            logging.debug(f"max_fee={fee}")
+        with span("nonce reserve"):
+            nonce = nonces.reserve(sender)
+        logging.debug(f"nonce={nonce}")
+        signature = sign_execute(sender, execute_calldata, nonce, priv_key, fee)
+        try:
+            return send_execute(sender, execute_calldata, signature, nonce, network, fee)
+        except TransportError as err:
+            # The reserved nonce was not consumed: later reservations must not skip it.
+            nonces.resync(sender)
+            if attempt > 0:
+                raise
+            if err.kind == "fee" and estimator is not None:
+                estimator.forget(execute_calldata)
+            elif not is_nonce_error(err):
+                raise
+
+def log_invoke_error(err_msg):
+    if "max_fee must be bigger than 0" in err_msg:
+        logging.error("""\n😰 Whoops, looks like max fee is missing. Try with:\n--max-fee auto""")
+    elif "transactions should go through the __execute__ entrypoint." in err_msg:
+        logging.error(
+            "\n\n😰 Whoops, looks like you're not using an account. Try with:\n"
+            "\nnile send [OPTIONS] SIGNER CONTRACT_NAME METHOD [PARAMS]"
+        )
+    else:
+        logging.error(f"\n😰 {err_msg}")
+
+def invoke_function(contract_alias, invoke_function, arguments, pkey="STARKNET_PRIVATE_KEY", network="localhost",
+                    pool=None, max_fee=None, max_calldata=CALLDATA_MAX_FELTS):
+    """
+    Invoke a function through the pkey account, or the next account of an
+    AccountPool. max_fee is a number of wei or "auto" (see resolve_max_fee).
+    `@path` arguments are arrays read from files (see sarayulib.calldata). A
+    call with more than max_calldata calldata felts is split into several
+    transactions, sent in order.
+    """
+    ## out = send(network, signer_alias, contract_alias, function, arguments)
 
-    command.append("--no_wallet")
-    logging.debug(command)
+    if len(arguments) == 0 or not isinstance(arguments[0], list):
+        arguments = [arguments]
 
+    target_address, target_abi = next(deployments_load(contract_alias, network)) or contract_alias
+    index = load_abi_index(target_abi)
     try:
-        out = subprocess.check_output(command).strip().decode("utf-8")
-    except subprocess.CalledProcessError:
-        p = subprocess.Popen(command, stderr=subprocess.PIPE)
-        _, error = p.communicate()
-        err_msg = error.decode()
-
-        if "max_fee must be bigger than 0" in err_msg:
-            logging.error("""\n😰 Whoops, looks like max fee is missing. Try with:\n--max_fee=`MAX_FEE`""")
-        elif "transactions should go through the __execute__ entrypoint." in err_msg:
-            logging.error(
-                "\n\n😰 Whoops, looks like you're not using an account. Try with:\n"
-                "\nnile send [OPTIONS] SIGNER CONTRACT_NAME METHOD [PARAMS]"
-            )
-
-        out =''
-
-    logging.info(out)
-    
-    if(out):
-        _, tx_hash = parse_send(out)
-        out = get_tx_status(tx_hash, network)
-
-    return out
+        with span("encode calldata"):
+            splits = [[calldata for _, calldata in encode_calls(index, invoke_function, list(c), max_calldata)]
+                      for c in arguments]
+    except CalldataError as err:
+        logging.error(f"\n😰 {err}")
+        return err.to_dict()
+
+    if pool is None:
+        signer = load_signer(pkey, network)
+        if signer is None:
+            logging.error("Account not deployed.")
+            return
+        priv_key, sender = signer
+
+    # The calls go out in one multicall, unless one of them had to be split:
+    # then every part is a transaction of its own.
+    if all(len(split) == 1 for split in splits):
+        transactions = [[split[0] for split in splits]]
+    else:
+        transactions = [[calldata] for split in splits for calldata in split]
+        logging.info(f"✂️  Calldata over {max_calldata} felts: sending {len(transactions)} transactions")
+
+    max_fee = resolve_max_fee(max_fee, network)
+    statuses = []
+    for sent, calldata in enumerate(transactions):
+        calls = [[target_address, invoke_function, c] for c in calldata]
+        execute_calldata = build_execute_calldata(calls)
+        try:
+            if pool is None:
+                out = submit_execute(sender, priv_key, execute_calldata, network, max_fee)
+            else:
+                out = pool.submit(execute_calldata, max_fee)
+        except TransportError as err:
+            log_invoke_error(str(err))
+            if sent > 0:
+                logging.error(f"{sent} of {len(transactions)} transactions were sent before the failure")
+            return err.to_dict()
+
+        logging.info(out)
+
+        if(out):
+            tx_hash, out = out, get_tx_status(out, network)
+            if pool is not None and out in TERMINAL_STATUSES:
+                pool.settle(tx_hash)
+        statuses.append(out)
+
+    return "\n".join(str(s) for s in statuses) if len(statuses) > 1 else statuses[0]
     
 if __name__ == "__main__":
     #invoke_function("balance", "increase_balance", [220], pkey='STARKNET_PRIVATE_KEY',)
@@ -0,0 +1,153 @@
+"""Invoke many contract functions from a manifest, packed into multicall transactions."""
+
+import csv
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from sarayulib.utils import (
+    is_string, normalize_number,
+    deployments_load,
+)
+from sarayulib.calldata import encode_felts
+from sarayulib.transport import TransportError
+from sarayulib.cmd.invoke import (
+    load_signer,
+    build_execute_calldata, submit_execute,
+    log_invoke_error,
+)
+from sarayulib.cmd.tx_status import get_tx_status, TERMINAL_STATUSES
+from sarayulib.fees import AUTO, get_fee_estimator, resolve_max_fee
+from sarayulib.constants import BATCH_MAX_CALLDATA, BATCH_MAX_CALLS
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+# Every call adds an AccountCallArray entry (to, selector, data_offset, data_len).
+CALL_ARRAY_ENTRY_SIZE = 4
+# Every __execute__ starts with call_array_len and has calldata_len.
+EXECUTE_HEADER_SIZE = 2
+
+def load_manifest(path):
+    """
+    Load (alias, function, args) rows from a manifest file.
+    - .json: a list of {"alias": .., "function": .., "args": [..]} objects
+             or [alias, function, [args]] lists.
+    - .csv:  alias,function,arg1,arg2,... rows (an "alias,function" header is skipped).
+    """
+    rows = []
+    if path.endswith(".csv"):
+        with open(path, newline="") as fp:
+            for record in csv.reader(fp):
+                record = [r.strip() for r in record if r.strip() != ""]
+                if len(record) == 0 or record[:2] == ["alias", "function"]:
+                    continue
+                rows.append((record[0], record[1], record[2:]))
+    else:
+        with open(path) as fp:
+            for entry in json.load(fp):
+                if isinstance(entry, dict):
+                    rows.append((entry["alias"], entry["function"], entry.get("args", [])))
+                else:
+                    alias, function, *args = entry
+                    rows.append((alias, function, args[0] if args else []))
+    return rows
+
+def pack_calls(calls, max_calldata=BATCH_MAX_CALLDATA, max_calls=BATCH_MAX_CALLS):
+    """
+    Greedily pack (row, [to, function, calldata]) entries into batches so that
+    each __execute__ stays within the calldata and call budgets.
+    """
+    batches = []
+    current, size = [], EXECUTE_HEADER_SIZE
+    for row, call in calls:
+        cost = CALL_ARRAY_ENTRY_SIZE + len(call[2])
+        if current and (size + cost > max_calldata or len(current) >= max_calls):
+            batches.append(current)
+            current, size = [], EXECUTE_HEADER_SIZE
+        current.append((row, call))
+        size += cost
+    if current:
+        batches.append(current)
+    return batches
+
+def _resolve(rows, network):
+    calls, outcomes = [], {}
+    for row, (alias, function, args) in enumerate(rows):
+        target = alias if is_string(alias) else normalize_number(alias)
+        deployment = next(deployments_load(target, network), None)
+        if deployment is None:
+            outcomes[row] = {"status": "ERROR", "error": f"unknown contract {alias}"}
+            continue
+        calldata = encode_felts(args)
+        calls.append((row, [deployment[0], function, calldata]))
+    return calls, outcomes
+
+def invoke_batch(manifest, pkey="STARKNET_PRIVATE_KEY", network="localhost",
+                 max_calldata=BATCH_MAX_CALLDATA, max_calls=BATCH_MAX_CALLS, pool=None, max_fee=None):
+    """
+    Invoke every row of a manifest. Returns a list of per-row outcomes.
+    With an AccountPool the transactions are sent concurrently, one per account.
+    With max_fee "auto" the fees of all transactions are estimated in one pass
+    before the first one is sent.
+    """
+    rows = load_manifest(manifest)
+    logging.info(f"📜 Loaded {len(rows)} calls from {manifest}")
+
+    if pool is None:
+        signer = load_signer(pkey, network)
+        if signer is None:
+            logging.error("Account not deployed.")
+            return
+        priv_key, sender = signer
+        submit = lambda execute_calldata, fee: submit_execute(sender, priv_key, execute_calldata, network, fee)
+    else:
+        priv_key, sender = pool.signers[0]
+        submit = pool.submit
+
+    calls, outcomes = _resolve(rows, network)
+    batches = pack_calls(calls, max_calldata, max_calls)
+    logging.info(f"📦 Packed {len(calls)} calls into {len(batches)} transactions")
+
+    max_fee = resolve_max_fee(max_fee, network)
+    payloads = [build_execute_calldata([call for _, call in batch]) for batch in batches]
+    if max_fee == AUTO and payloads:
+        # Accounts of the pool share the account contract, so one sender's estimates do for all.
+        fees = get_fee_estimator(network).max_fees([(sender, priv_key, p) for p in payloads])
+        logging.info(f"⛽ Estimated max fees: {min(fees)}..{max(fees)} wei")
+    else:
+        fees = [max_fee] * len(payloads)
+
+    def send(args):
+        batch, execute_calldata, fee = args
+        try:
+            tx_hash = submit(execute_calldata, fee)
+        except TransportError as err:
+            log_invoke_error(str(err))
+            for row, _ in batch:
+                outcomes[row] = {"status": "ERROR", "kind": err.kind, "error": str(err)}
+            return None
+        logging.info(f"🧾 Transaction hash: {tx_hash} ({len(batch)} calls)")
+        return tx_hash, batch
+
+    work = list(zip(batches, payloads, fees))
+    if pool is None:
+        sent = [send(args) for args in work]
+    else:
+        with ThreadPoolExecutor(max_workers=len(pool)) as executor:
+            sent = list(executor.map(send, work))
+    sent = [s for s in sent if s is not None]
+
+    for tx_hash, batch in sent:
+        try:
+            status = get_tx_status(tx_hash, network)
+        except TransportError as err:
+            status = f"UNKNOWN ({err})"
+        if pool is not None and status in TERMINAL_STATUSES:
+            pool.settle(tx_hash)
+        for row, _ in batch:
+            outcomes[row] = {"status": status, "tx_hash": tx_hash}
+
+    results = []
+    for row, (alias, function, args) in enumerate(rows):
+        results.append({"row": row, "alias": alias, "function": function, **outcomes[row]})
+    return results
@@ -0,0 +1,234 @@
+"""Load generator: run a mix of calls and invokes at a target rate or concurrency."""
+
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sarayulib.utils import deployments_load, stringify
+from sarayulib.transport import get_transport, classify_error, TransportError
+from sarayulib.abi import load_abi_index
+from sarayulib.cmd.invoke import load_signer, build_execute_calldata, submit_execute
+from sarayulib.fees import resolve_max_fee
+from sarayulib.cmd.tx_status import TERMINAL_STATUSES
+from sarayulib.constants import LOADTEST_CONCURRENCY, LOADTEST_POLL_INTERVAL
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+def _generator(spec):
+    """
+    Build an argument generator:
+    - a literal value is sent as is
+    - {"range": [a, b]}: random int in [a, b]
+    - {"choice": [..]}: random element
+    - {"seq": start}: start, start + 1, ...
+    """
+    if not isinstance(spec, dict):
+        return lambda: spec
+    if "range" in spec:
+        low, high = spec["range"]
+        return lambda: random.randint(low, high)
+    if "choice" in spec:
+        choices = spec["choice"]
+        return lambda: random.choice(choices)
+    if "seq" in spec:
+        counter = itertools.count(spec["seq"])
+        lock = threading.Lock()
+        def next_value():
+            with lock:
+                return next(counter)
+        return next_value
+    raise ValueError(f"Unknown argument generator {spec}")
+
+def percentiles(samples):
+    if len(samples) == 0:
+        return None
+    samples = sorted(samples)
+    def rank(p):
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1000
+    return {"p50_ms": rank(50), "p95_ms": rank(95), "p99_ms": rank(99), "max_ms": samples[-1] * 1000}
+
+class _Operation:
+    def __init__(self, spec, default_contract, network):
+        self.name = spec["name"]
+        self.type = spec.get("type", "invoke")
+        self.weight = spec.get("weight", 1)
+        self.args = [_generator(a) for a in spec.get("args", [])]
+        self.address, self.abi = next(deployments_load(spec.get("contract", default_contract), network))
+        self.index = load_abi_index(self.abi)
+
+    def calldata(self):
+        return self.index.encode_inputs(self.name, [generate() for generate in self.args])
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.submitted = {}
+        self.latencies = {}
+        self.acceptance = []
+        self.rejections = {}
+        self.pending = {}
+
+    def record(self, name, latency=None, rejection=None):
+        with self.lock:
+            if rejection is not None:
+                self.rejections[rejection] = self.rejections.get(rejection, 0) + 1
+            else:
+                self.submitted[name] = self.submitted.get(name, 0) + 1
+                self.latencies.setdefault(name, []).append(latency)
+
+def _poll_acceptance(stats, network, stop, interval, pool=None):
+    """
+    Poll submitted transactions until they settle, recording acceptance latency.
+    A rejected transaction is counted under the kind of its failure reason.
+    """
+    transport = get_transport(network)
+    with ThreadPoolExecutor(max_workers=LOADTEST_CONCURRENCY) as executor:
+        while not stop.is_set() or stats.pending:
+            with stats.lock:
+                pending = list(stats.pending.items())
+            receipts = executor.map(lambda item: _receipt(transport, item[0]), pending)
+            now = time.monotonic()
+            for (tx_hash, submitted_at), receipt in zip(pending, receipts):
+                status = receipt.get("tx_status")
+                if status not in TERMINAL_STATUSES:
+                    continue
+                if pool is not None:
+                    pool.settle(tx_hash)
+                with stats.lock:
+                    del stats.pending[tx_hash]
+                    if status == "REJECTED":
+                        reason = receipt.get("tx_failure_reason") or {}
+                        kind = classify_error(reason.get("error_message", ""), code=reason.get("code"))
+                        stats.rejections[kind] = stats.rejections.get(kind, 0) + 1
+                    else:
+                        stats.acceptance.append(now - submitted_at)
+            stop.wait(interval)
+
+def _receipt(transport, tx_hash):
+    try:
+        return transport.tx_status(tx_hash)
+    except (TransportError, OSError):
+        return {}
+
+def run_loadtest(spec, network="localhost", duration=None, rate=None, concurrency=None, wait=None,
+                 pool=None):
+    """
+    Run a workload spec and return the report as a dict. Invokes are sent from
+    the pkey account, or spread over an AccountPool.
+    """
+    duration = spec.get("duration", 30) if duration is None else duration
+    rate = spec.get("rate") if rate is None else rate
+    concurrency = spec.get("concurrency", LOADTEST_CONCURRENCY) if concurrency is None else concurrency
+    wait = spec.get("wait", True) if wait is None else wait
+    max_fee = resolve_max_fee(spec.get("max_fee"), network)
+
+    operations = [_Operation(o, spec.get("contract"), network) for o in spec["functions"]]
+    weights = [o.weight for o in operations]
+    signer = None
+    if pool is None and any(o.type == "invoke" for o in operations):
+        signer = load_signer(spec.get("pkey", "STARKNET_PRIVATE_KEY"), network)
+        if signer is None:
+            raise Exception("Account not deployed.")
+
+    transport = get_transport(network)
+    stats = _Stats()
+    stop = threading.Event()
+    schedule = itertools.count()
+    schedule_lock = threading.Lock()
+    start = time.monotonic()
+    deadline = start + duration
+
+    def execute(operation, at=None):
+        """
+        Run one operation. Its latency counts from `at`, the time it was
+        scheduled for in rate mode: an operation delayed behind slow ones
+        counts its wait too, instead of hiding it (coordinated omission).
+        """
+        calldata = operation.calldata()
+        began = time.monotonic() if at is None else at
+        try:
+            if operation.type == "call":
+                transport.call(operation.address, operation.abi, operation.name, stringify(calldata))
+            else:
+                execute_calldata = build_execute_calldata([[operation.address, operation.name, calldata]])
+                if pool is None:
+                    priv_key, sender = signer
+                    tx_hash = submit_execute(sender, priv_key, execute_calldata, network, max_fee)
+                else:
+                    tx_hash = pool.submit(execute_calldata, max_fee)
+                if wait:
+                    with stats.lock:
+                        stats.pending[tx_hash] = began
+        except (TransportError, OSError) as err:
+            stats.record(operation.name, rejection=getattr(err, "kind", "transient"))
+            return
+        stats.record(operation.name, latency=time.monotonic() - began)
+
+    def worker():
+        at = None
+        while True:
+            if rate:
+                # Open loop: operation i starts at start + i / rate.
+                with schedule_lock:
+                    at = start + next(schedule) / rate
+                if at >= deadline:
+                    return
+                time.sleep(max(0.0, at - time.monotonic()))
+            elif time.monotonic() >= deadline:
+                return
+            execute(random.choices(operations, weights)[0], at)
+
+    poller = threading.Thread(target=_poll_acceptance,
+                              args=(stats, network, stop, LOADTEST_POLL_INTERVAL, pool), daemon=True)
+    if wait:
+        poller.start()
+
+    logging.info(f"🏋️  Running {len(operations)} functions for {duration}s "
+                 + (f"at {rate} ops/s" if rate else f"with {concurrency} workers"))
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        workers = [executor.submit(worker) for _ in range(concurrency)]
+    elapsed = time.monotonic() - start
+
+    stop.set()
+    if wait:
+        poller.join(timeout=max(LOADTEST_POLL_INTERVAL * 4, duration))
+    # A worker that died on an unexpected error must not go unnoticed.
+    for future in workers:
+        future.result()
+
+    submitted = sum(stats.submitted.values())
+    return {
+        "duration_s": elapsed,
+        "submitted": submitted,
+        "tps": submitted / elapsed if elapsed else 0,
+        "functions": {
+            name: {"count": count, "tps": count / elapsed, "latency": percentiles(stats.latencies[name])}
+            for name, count in stats.submitted.items()
+        },
+        "submission_latency": percentiles([l for ls in stats.latencies.values() for l in ls]),
+        "acceptance_latency": percentiles(stats.acceptance),
+        "accepted": len(stats.acceptance),
+        "unsettled": len(stats.pending),
+        "rejections": stats.rejections,
+    }
+
+def format_report(report):
+    def fmt(p):
+        if p is None:
+            return "n/a"
+        return f"p50 {p['p50_ms']:.1f} ms  p95 {p['p95_ms']:.1f} ms  p99 {p['p99_ms']:.1f} ms"
+
+    lines = [
+        f"⏱  {report['submitted']} operations in {report['duration_s']:.1f}s: {report['tps']:.1f} TPS",
+        f"   submission  {fmt(report['submission_latency'])}",
+        f"   acceptance  {fmt(report['acceptance_latency'])} ({report['accepted']} accepted, "
+        f"{report['unsettled']} unsettled)",
+    ]
+    for name, function in report["functions"].items():
+        lines.append(f"   {name:20} {function['count']:7} ops {function['tps']:8.1f} TPS  {fmt(function['latency'])}")
+    if report["rejections"]:
+        lines.append("🛑 Rejections: " + ", ".join(f"{k}={v}" for k, v in sorted(report["rejections"].items())))
+    return "\n".join(lines)
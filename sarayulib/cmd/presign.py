@@ -0,0 +1,107 @@
+"""Pre-sign transactions in bulk and replay them later."""
+
+import json
+import logging
+from collections import deque
+
+from sarayulib.utils import (
+    hex_address,
+    is_string, normalize_number,
+    deployments_load,
+)
+from sarayulib.calldata import encode_felts
+from sarayulib.transport import get_transport, TransportError
+from sarayulib.signing import sign_transactions
+from sarayulib.cmd.invoke import get_nonce, load_signer, build_execute_calldata
+from sarayulib.cmd.tx_status import wait_for_txs
+from sarayulib.constants import MAX_FEE
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+def _read_jsonl(path):
+    with open(path) as fp:
+        for line in fp:
+            if line.strip():
+                yield json.loads(line)
+
+def presign_transactions(input_file, output_file, network="localhost", jobs=None):
+    """
+    Sign every transaction of a JSONL file across a process pool.
+
+    Input lines: {"pkey": "STARKNET_PRIVATE_KEY", "calls": [[alias, function, [args]], ..],
+                  "nonce": optional, "max_fee": optional}
+    Without a nonce, transactions of an account get consecutive nonces starting
+    at its current nonce. Output lines keep the input order.
+    """
+    signers, nonces, targets = {}, {}, {}
+    metadata = deque()
+
+    def target_address(alias):
+        if alias not in targets:
+            key = alias if is_string(alias) else normalize_number(alias)
+            targets[alias], _ = next(deployments_load(key, network))
+        return targets[alias]
+
+    def unsigned():
+        for row in _read_jsonl(input_file):
+            pkey = row.get("pkey", "STARKNET_PRIVATE_KEY")
+            if pkey not in signers:
+                signers[pkey] = load_signer(pkey, network)
+                if signers[pkey] is None:
+                    raise Exception(f"Account of {pkey} is not deployed on {network}")
+            priv_key, sender = signers[pkey]
+
+            nonce = row.get("nonce")
+            if nonce is None:
+                if sender not in nonces:
+                    nonces[sender] = get_nonce(sender, network)
+                nonce = nonces[sender]
+            nonces[sender] = nonce + 1
+
+            calls = [[target_address(alias), function, encode_felts(args)]
+                     for alias, function, args in row["calls"]]
+            execute_calldata = build_execute_calldata(calls)
+            max_fee = row.get("max_fee", MAX_FEE)
+
+            metadata.append((sender, execute_calldata, nonce, max_fee))
+            yield priv_key, sender, execute_calldata, nonce, max_fee
+
+    count = 0
+    with open(output_file, "w") as out:
+        for transaction_hash, signature in sign_transactions(unsigned(), jobs):
+            sender, execute_calldata, nonce, max_fee = metadata.popleft()
+            out.write(json.dumps({
+                "sender": hex_address(sender),
+                "nonce": nonce,
+                "max_fee": max_fee,
+                "calldata": [str(x) for x in execute_calldata],
+                "signature": signature,
+                "transaction_hash": hex(transaction_hash),
+            }) + "\n")
+            count += 1
+
+    logging.info(f"✍️  Signed {count} transactions into {output_file}")
+    return count
+
+def replay_transactions(signed_file, network="localhost", wait=False):
+    """Send pre-signed transactions in order. Returns the transaction hashes."""
+    transport = get_transport(network)
+    abis = {}
+    tx_hashes = []
+
+    for tx in _read_jsonl(signed_file):
+        sender = normalize_number(tx["sender"])
+        if sender not in abis:
+            _, abis[sender] = next(deployments_load(sender, network))
+        try:
+            tx_hash = transport.invoke(sender, abis[sender], "__execute__", tx["calldata"],
+                                       tx["signature"], tx["max_fee"], nonce=tx["nonce"])
+        except TransportError as err:
+            logging.error(f"😰 {tx['transaction_hash']} (nonce {tx['nonce']}): {err}")
+            continue
+        print(tx_hash, flush=True)
+        tx_hashes.append(tx_hash)
+
+    if wait:
+        wait_for_txs(tx_hashes, network, lambda tx_hash, status: logging.info(f"{tx_hash} {status}"))
+    return tx_hashes
@@ -3,19 +3,48 @@
 import os
 import json
 import logging
-import subprocess
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from sarayulib.utils import (
-    GATEWAY, 
     deployments_register, hex_address,
     get_account_file_name,
-    normalize_number, parse_information,
-    set_network_var
+    normalize_number,
+    derive_private_key,
     )
+from sarayulib.transport import get_transport, TransportError
+from sarayulib.deployments import list_deployments, register_deployments
+from sarayulib.cmd.tx_status import wait_for_txs
+from sarayulib.constants import SETUP_CONCURRENCY
 from starkware.crypto.signature.signature import private_to_stark_key
 
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 
+@lru_cache(maxsize=None)
+def get_public_key(priv_key):
+    """Derive (once per private key) the stark public key."""
+    return private_to_stark_key(priv_key)
+
+_accounts_cache = {}
+
+def _read_accounts(file):
+    """Read an accounts file, reusing the parsed content while it is unchanged."""
+    stat = os.stat(file)
+    key = (os.path.abspath(file), stat.st_mtime_ns, stat.st_size)
+    if key not in _accounts_cache:
+        with open(file) as fp:
+            _accounts_cache.clear()
+            _accounts_cache[key] = json.load(fp)
+    return _accounts_cache[key]
+
+def _accounts_file(network):
+    """Return the accounts file name, creating an empty file if needed."""
+    file = get_account_file_name(network)
+    if not os.path.exists(file):
+        with open(file, "w") as fp:
+            json.dump({}, fp)
+    return file
+
 def account_exists(pubkey, network):
     """Return whether an account exists or not."""
     account = next(account_load(pubkey, network), None)
@@ -24,19 +53,14 @@ def account_exists(pubkey, network):
 
 def account_load(pubkey, network):
     """Load account that matches a pubkey."""
-    file = get_account_file_name(network)
-
-    if not os.path.exists(file):
-        with open(file, "w") as fp:
-            json.dump({}, fp)
-
-    with open(file) as fp:
-        accounts = json.load(fp)
-        # pubkey in file is in hex format
-        pubkey = hex(pubkey)
-        if pubkey in accounts:
-            accounts[pubkey]["address"] = normalize_number(accounts[pubkey]["address"])
-            yield accounts[pubkey]
+    file = _accounts_file(network)
+    accounts = _read_accounts(file)
+    # pubkey in file is in hex format
+    pubkey = hex(pubkey)
+    if pubkey in accounts:
+        account = dict(accounts[pubkey])
+        account["address"] = normalize_number(account["address"])
+        yield account
 
 
 def current_index(network):
@@ -47,30 +71,45 @@ def current_index(network):
         accounts = json.load(fp)
         return len(accounts.keys())
 
+def free_indexes(count, network):
+    """Return `count` account indexes whose `account-N` alias is free in the registry."""
+    taken = {alias for _, _, alias in list_deployments(network) if alias is not None}
+    taken.update(f"account-{account['index']}" for account in _read_accounts(_accounts_file(network)).values())
+    indexes = []
+    index = 0
+    while len(indexes) < count:
+        if f"account-{index}" not in taken:
+            indexes.append(index)
+        index += 1
+    return indexes
+
 def accounts_register(pubkey, address, index, alias, network):
     """Register a new account."""
-    file = get_account_file_name(network)
+    accounts_register_many([(pubkey, {"address": address, "index": index, "alias": alias})], network)
 
-    if account_exists(pubkey, network):
-        raise Exception(f"account-{index} already exists in {file}")
+def accounts_register_many(entries, network):
+    """Register [(pubkey, account)] accounts with a single atomic write of the accounts file."""
+    file = _accounts_file(network)
 
     with open(file, "r") as fp:
         accounts = json.load(fp)
+    for pubkey, account in entries:
         # Save public key as hex
         pubkey = hex(pubkey)
-        accounts[pubkey] = {
-            "address": hex_address(address),
-            "index": index,
-            "alias": alias,
-        }
-    with open(file, "w") as file:
-        json.dump(accounts, file)
+        if pubkey in accounts:
+            raise Exception(f"account-{account['index']} already exists in {file}")
+        accounts[pubkey] = dict(account, address=hex_address(account["address"]))
+
+    tmp = f"{file}.{os.getpid()}.tmp"
+    with open(tmp, "w") as fp:
+        json.dump(accounts, fp)
+    os.replace(tmp, file)
 
 
 def account_setup(private_key, network="localhost"):
     "Deploy an account contract"
     try:
-        public_key = private_to_stark_key(normalize_number(os.environ[private_key]))
+        public_key = get_public_key(normalize_number(os.environ[private_key]))
         #print("private: ", os.environ[private_key])
         #print("public:  ", public_key)
         #print("private: ", hex_address(os.environ[private_key]))
@@ -80,25 +119,12 @@ def account_setup(private_key, network="localhost"):
         logging.error(f"\n❌ Cannot find {private_key} in env.\nCheck spelling and that it exists.\nTry moving the .env to the root of your project.")
         return
     
-    abi_path = os.path.dirname(os.path.realpath(__file__)).replace("/cmd", "/artifacts/account_abi.json")
-    contract_path = os.path.dirname(os.path.realpath(__file__)).replace("/cmd", "/artifacts/account_contract.json")
+    abi_path, contract_path = _account_artifacts()
 
     if not account_exists(public_key,network):
-        index = current_index(network)
+        index = free_indexes(1, network)[0]
         logging.info(f"🚀 Deploying Account")
-        command = ["starknet", "deploy", "--contract", contract_path, "--inputs", f"{public_key}"]
-
-        if set_network_var(network) is None:
-            command.append(f"--gateway_url={GATEWAY.get(network)}")
-
-        command.append("--no_wallet")
-
-        logging.info(command)
-
-        #print(command)
-        output = subprocess.check_output(command)
-
-        address, tx_hash = parse_information(output)
+        address, tx_hash = get_transport(network).deploy(contract_path, [public_key])
 
         logging.info(f"⏳ ️Deployment of Account successfully sent at {hex_address(address)}")
         logging.info(f"🧾 Transaction hash: {hex(tx_hash)}")
@@ -110,5 +136,96 @@ def account_setup(private_key, network="localhost"):
         print("Account exists...")
 
 
+def _account_artifacts():
+    artifacts = os.path.dirname(os.path.realpath(__file__)).replace("/cmd", "/artifacts")
+    return f"{artifacts}/account_abi.json", f"{artifacts}/account_contract.json"
+
+def _public_keys(priv_keys, jobs=None):
+    """Derive public keys, across processes when there are many."""
+    if len(priv_keys) < 16 or jobs == 1:
+        return [get_public_key(k) for k in priv_keys]
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(private_to_stark_key, priv_keys, chunksize=max(1, len(priv_keys) // (4 * jobs))))
+
+def accounts_setup_many(seed, count, network="localhost", fund=None,
+                        concurrency=SETUP_CONCURRENCY, jobs=None):
+    """
+    Deploy `count` accounts whose keys are derived from the seed in env var `seed`.
+    Deployments are sent concurrently and awaited in parallel; accepted accounts
+    are registered in one write of the deployments and accounts files. Accounts
+    that already exist are skipped, so the command can be rerun to resume.
+    With `fund` (devnet only), every registered account is then minted that amount
+    of fee tokens; a failed mint is logged and does not stop the others.
+    """
+    try:
+        seed_value = os.environ[seed]
+    except KeyError:
+        logging.error(f"\n❌ Cannot find {seed} in env.\nCheck spelling and that it exists.")
+        return
+
+    file = _accounts_file(network)
+    existing = _read_accounts(file)
+
+    logging.info(f"🔑 Deriving {count} keys from {seed}")
+    public_keys = _public_keys([derive_private_key(seed_value, i) for i in range(count)], jobs)
+    todo = [(i, pk) for i, pk in enumerate(public_keys) if hex(pk) not in existing]
+    if len(todo) == 0:
+        print(f"All {count} accounts exist...")
+        return
+
+    abi_path, contract_path = _account_artifacts()
+    transport = get_transport(network)
+
+    def deploy(item):
+        derivation, public_key = item
+        try:
+            address, tx_hash = transport.deploy(contract_path, [public_key])
+        except (TransportError, OSError) as err:
+            logging.error(f"❌ Deployment of account {derivation} failed: {err}")
+            return None
+        return derivation, public_key, address, hex(tx_hash)
+
+    logging.info(f"🚀 Deploying {len(todo)} accounts")
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        sent = [d for d in pool.map(deploy, todo) if d is not None]
+
+    logging.info(f"⏳ Waiting for {len(sent)} deployments")
+    statuses = wait_for_txs([tx_hash for *_, tx_hash in sent], network)
+    accepted = [d for d in sent if statuses.get(d[3]) in ("ACCEPTED_ON_L2", "ACCEPTED_ON_L1")]
+    for derivation, _, address, tx_hash in sent:
+        if statuses.get(tx_hash) not in ("ACCEPTED_ON_L2", "ACCEPTED_ON_L1"):
+            logging.error(f"❌ Account {derivation} at {hex_address(address)}: {statuses.get(tx_hash)}")
+
+    indexes = free_indexes(len(accepted), network)
+    register_deployments(
+        [(address, abi_path, f"account-{k}") for k, (_, _, address, _) in zip(indexes, accepted)], network)
+    accounts_register_many([
+        (public_key, {"address": address, "index": k, "alias": seed, "derivation": derivation})
+        for k, (derivation, public_key, address, _) in zip(indexes, accepted)
+    ], network)
+    logging.info(f"✅ {len(accepted)} accounts registered in {file}")
+
+    if fund:
+        if network != "localhost":
+            logging.warning("⚠️  --fund only works on a local devnet, skipped.")
+        else:
+            devnet = get_transport(network, "http")
+
+            def mint(item):
+                derivation, _, address, _ = item
+                try:
+                    devnet.mint(address, fund)
+                except (TransportError, OSError) as err:
+                    logging.error(f"❌ Funding of account {derivation} at {hex_address(address)} failed: {err}")
+                    return False
+                return True
+
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                funded = sum(pool.map(mint, accepted))
+            logging.info(f"💰 Funded {funded} of {len(accepted)} accounts with {fund}")
+    return accepted
+
+
 if __name__ == "__main__":
     account_setup('STARKNET_PRIVATE_KEY')
\ No newline at end of file
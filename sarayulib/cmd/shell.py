@@ -0,0 +1,158 @@
+"""Long running sarayu: an interactive shell and a UNIX socket daemon.
+
+Both run sarayu commands in the same process, so imports, deployment
+registries, derived keys and gateway connections stay warm between commands.
+The `sarayu` entry script forwards its arguments to the daemon when it is
+running (see sarayulib/client.py).
+"""
+
+import contextlib
+import json
+import logging
+import os
+import shlex
+import socket
+import traceback
+
+import click
+
+from sarayulib.constants import DAEMON_SOCKET
+
+
+def get_socket_path(path=None):
+    return os.path.expanduser(path or os.environ.get("SARAYU_SOCKET", DAEMON_SOCKET))
+
+
+def run_command(cli, argv):
+    """Run one sarayu command in-process. Returns its exit code."""
+    try:
+        cli.main(argv, prog_name="sarayu", standalone_mode=False)
+    except click.exceptions.Exit as e:
+        return e.exit_code
+    except click.ClickException as e:
+        e.show()
+        return e.exit_code
+    except click.Abort:
+        click.echo("Aborted!", err=True)
+        return 1
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 0 if e.code is None else 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+def shell(cli):
+    """Read sarayu commands from the terminal until exit/quit or EOF."""
+    try:
+        import readline  # noqa: F401 (line editing and history for input())
+    except ImportError:
+        pass
+
+    click.echo("sarayu shell. Type 'help' for the commands, 'exit' to quit.")
+    while True:
+        try:
+            line = input("sarayu> ")
+        except (EOFError, KeyboardInterrupt):
+            click.echo()
+            return
+        try:
+            argv = shlex.split(line)
+        except ValueError as e:
+            click.echo(f"😰 {e}", err=True)
+            continue
+        if len(argv) == 0:
+            continue
+        if argv[0] in ("exit", "quit"):
+            return
+        if argv[0] == "help":
+            argv = ["--help"]
+        if argv[0] in ("shell", "daemon"):
+            click.echo(f"😰 '{argv[0]}' cannot be run from the shell", err=True)
+            continue
+        run_command(cli, argv)
+
+
+class _SocketStream:
+    """File-like object that streams writes to the client as JSON lines."""
+
+    def __init__(self, conn, name):
+        self.conn = conn
+        self.name = name
+
+    def write(self, data):
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode(errors="replace")
+        if data:
+            message = json.dumps({"stream": self.name, "data": data}) + "\n"
+            self.conn.sendall(message.encode())
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+@contextlib.contextmanager
+def _request_context(conn, request):
+    """Run with the client's cwd, environment and output streams."""
+    cwd = os.getcwd()
+    environ = dict(os.environ)
+    out, err = _SocketStream(conn, "stdout"), _SocketStream(conn, "stderr")
+    handlers = [h for h in logging.getLogger().handlers if isinstance(h, logging.StreamHandler)]
+    streams = [h.stream for h in handlers]
+
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    for handler in handlers:
+        handler.setStream(err)
+    try:
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            yield
+    finally:
+        for handler, stream in zip(handlers, streams):
+            handler.setStream(stream)
+        os.environ.clear()
+        os.environ.update(environ)
+        os.chdir(cwd)
+
+
+def serve(cli, path=None):
+    """Serve sarayu commands on a UNIX socket, one at a time."""
+    path = get_socket_path(path)
+    if os.path.exists(path):
+        os.unlink(path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(old_umask)
+    server.listen()
+    logging.info(f"🌱 sarayu daemon listening on {path}")
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                request = json.loads(conn.makefile("rb").readline())
+                if request.get("shutdown"):
+                    conn.sendall(json.dumps({"exit": 0}).encode() + b"\n")
+                    break
+                try:
+                    with _request_context(conn, request):
+                        code = run_command(cli, request["argv"])
+                    conn.sendall(json.dumps({"exit": code}).encode() + b"\n")
+                except OSError:
+                    logging.debug("client went away")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.unlink(path)
+        logging.info("🛑 sarayu daemon stopped")
@@ -1,24 +1,74 @@
+import asyncio
 import logging
-import subprocess
-import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from sarayulib.utils import (
-    set_network_var,
-    GATEWAY
+from sarayulib.transport import get_transport, TransportError
+from sarayulib.trace import span
+from sarayulib.constants import (
+    TX_WAIT_CONCURRENCY, TX_WAIT_INTERVAL, TX_WAIT_MAX_INTERVAL, TX_WAIT_TIMEOUT
 )
 
+TERMINAL_STATUSES = ("ACCEPTED_ON_L2", "ACCEPTED_ON_L1", "REJECTED")
+
 def get_tx_status(tx_hash: str, network="localhost"):
     """Returns transaction receipt in dict."""
 
-    command = ["starknet", "tx_status", "--hash", tx_hash]
-    
-    if set_network_var(network) is None:
-        command.append(f"--feeder_gateway_url={GATEWAY.get(network)}")
-
     logging.debug("⏳ Querying the network to check transaction status and identify contracts...")
-    logging.debug(command)
-    
-    out = subprocess.check_output(command)
-    receipt = json.loads(out)
+
+    with span("tx status", tx_hash=tx_hash):
+        receipt = get_transport(network).tx_status(tx_hash)
     logging.debug(f"TX_STATUS: {receipt}")
     return receipt["tx_status"]
+
+async def _wait_for_tx(tx_hash, network, executor, interval, max_interval, timeout):
+    """Poll one transaction until it reaches a terminal status or times out."""
+    loop = asyncio.get_running_loop()
+    deadline = time.monotonic() + timeout
+    delay = interval
+    status = None
+
+    while True:
+        try:
+            new_status = await loop.run_in_executor(executor, get_tx_status, tx_hash, network)
+        except TransportError as err:
+            logging.debug(f"{tx_hash}: {err}")
+            new_status = status
+
+        if new_status in TERMINAL_STATUSES:
+            return tx_hash, new_status
+        if time.monotonic() + delay > deadline:
+            return tx_hash, new_status or "UNKNOWN"
+
+        # Back off while nothing happens; poll quickly again once the status moves.
+        delay = interval if new_status != status else min(delay * 2, max_interval)
+        status = new_status
+        await asyncio.sleep(delay)
+
+async def _wait_for_txs(tx_hashes, network, on_result, concurrency, interval, max_interval, timeout):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        tasks = [
+            _wait_for_tx(tx_hash, network, executor, interval, max_interval, timeout)
+            for tx_hash in tx_hashes
+        ]
+        results = {}
+        for task in asyncio.as_completed(tasks):
+            tx_hash, status = await task
+            results[tx_hash] = status
+            if on_result is not None:
+                on_result(tx_hash, status)
+        return results
+
+def wait_for_txs(tx_hashes, network="localhost", on_result=None,
+                 concurrency=TX_WAIT_CONCURRENCY, interval=TX_WAIT_INTERVAL,
+                 max_interval=TX_WAIT_MAX_INTERVAL, timeout=TX_WAIT_TIMEOUT):
+    """
+    Wait concurrently until every transaction reaches a terminal status.
+    on_result(tx_hash, status) is called as soon as each transaction settles.
+    Returns {tx_hash: status}.
+    """
+    tx_hashes = list(dict.fromkeys(tx_hashes))
+    if len(tx_hashes) == 0:
+        return {}
+    return asyncio.run(_wait_for_txs(tx_hashes, network, on_result,
+                                     concurrency, interval, max_interval, timeout))
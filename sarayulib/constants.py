@@ -4,4 +4,50 @@ ABIS_DIR      = f"{CACHE_DIR}/abis"
 CONTRACTS_DIR =  "contracts"
 MAX_FEE       = 0
 TRANSACTION_VERSION=1
-NETWORKS      = ("localhost", "goerli", "mainnet")
\ No newline at end of file
+# Version of fee estimation queries: same hash as TRANSACTION_VERSION, but not executable.
+QUERY_VERSION = 2**128 + TRANSACTION_VERSION
+NETWORKS      = ("localhost", "goerli", "mainnet")
+TRANSPORTS    = ("http", "cli")
+TRANSPORT     = "http"
+HTTP_POOL_SIZE = 8
+HTTP_TIMEOUT  = 60
+BATCH_MAX_CALLDATA = 1000
+BATCH_MAX_CALLS = 50
+NONCE_TTL     = 30
+TX_WAIT_CONCURRENCY = 32
+TX_WAIT_INTERVAL = 1
+TX_WAIT_MAX_INTERVAL = 15
+TX_WAIT_TIMEOUT = 600
+DAEMON_SOCKET = "~/.sarayu.sock"
+SIGN_CHUNK_SIZE = 64
+LOADTEST_CONCURRENCY = 16
+LOADTEST_POLL_INTERVAL = 0.5
+POOL_STRATEGIES = ("round-robin", "least-loaded")
+POOL_STRATEGY = "round-robin"
+SETUP_CONCURRENCY = 32
+DEPLOY_CONCURRENCY = 16
+CALL_CACHE_SIZE = 1024
+CALL_CACHE_TTL = 5
+CALL_CACHE_DISK_SIZE = 100000
+CALL_CACHE_BLOCK_TTL = 86400
+CALL_MANY_CONCURRENCY = 32
+DEVNET_DIR    = f"{CACHE_DIR}/devnets"
+DEVNET_START_TIMEOUT = 60
+DEVNET_LEASE_TIMEOUT = 600
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.25
+RETRY_MAX_DELAY = 8
+INDEX_CONCURRENCY = 16
+INDEX_BATCH   = 100
+FEE_NETWORKS  = ("goerli", "mainnet")
+FEE_MULTIPLIER = 1.5
+FEE_CACHE_BLOCKS = 10
+FEE_CACHE_TTL = 3600
+FEE_CONCURRENCY = 16
+CLASSES_DIR   = f"{CACHE_DIR}/classes"
+# Universal Deployer Contract, at the same address on goerli, mainnet and starknet-devnet.
+UDC_ADDRESS   = 0x041a78e741e5af2fec34b695679bc6891742439f7afb8484ecd7766661ad02bf
+COMPILE_CACHE_FILE = f"{CACHE_DIR}/compile.json"
+COMPILE_WATCH_INTERVAL = 0.5
+# Calls with more calldata are split (see sarayulib.calldata); also keeps starknet CLI argv under ARG_MAX.
+CALLDATA_MAX_FELTS = 5000
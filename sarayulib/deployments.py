@@ -0,0 +1,214 @@
+"""Indexed deployment registry.
+
+Deployments are indexed by alias and by address in `<network>.deployments.db`
+(SQLite). The `<network>.deployments.txt` file is still appended to on every
+registration, and lines added to it by other tools are imported incrementally,
+so both files stay in sync. An existing text file is imported the first time
+the index is opened. The index is rebuilt when the text file is replaced,
+rewritten or truncated, and emptied when it is removed.
+
+The classes known to be declared on the network are recorded there too.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+
+from sarayulib.utils import hex_address, normalize_number, state_path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deployments (
+    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    address TEXT NOT NULL,
+    abi     TEXT NOT NULL,
+    alias   TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS deployments_address ON deployments (address);
+CREATE TABLE IF NOT EXISTS classes (
+    class_hash TEXT PRIMARY KEY,
+    tx_hash    TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_local = threading.local()
+
+
+class AliasExistsError(Exception):
+    """Raised when registering an alias that is already taken."""
+
+
+def get_deployments_file_name(network):
+    return state_path(f"{network}.deployments.txt")
+
+
+def get_deployments_db_name(network):
+    return state_path(f"{network}.deployments.db")
+
+
+def _connect(network):
+    """Return this thread's connection to the network's registry."""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    path = os.path.abspath(get_deployments_db_name(network))
+    entry = connections.get(network)
+    if entry is None or entry[0] != path:
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.executescript(SCHEMA)
+        entry = connections[network] = (path, conn, [False])
+    _, conn, seen = entry
+
+    # Import lines appended to the text file since the last sync.
+    file = get_deployments_file_name(network)
+    try:
+        stat = os.stat(file)
+        current = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    except FileNotFoundError:
+        current = None
+    if current != seen[0]:
+        with _transaction(conn):
+            _import_tail(conn, file)
+        seen[0] = current
+    return conn
+
+
+class _transaction:
+    """BEGIN IMMEDIATE ... COMMIT, serializing writers across processes."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def _get_meta(conn, key):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+def _identity(fp):
+    """Inode and digest of the first line of the open text file."""
+    fp.seek(0)
+    digest = hashlib.sha1(fp.readline()).hexdigest()
+    return f"{os.fstat(fp.fileno()).st_ino}:{digest}"
+
+
+def _parse_line(line):
+    [address, abi, *aliases] = line.strip().split(":")
+    return hex_address(normalize_number(address)), abi, aliases
+
+
+def _insert(conn, address, abi, aliases):
+    if len(aliases) == 0:
+        conn.execute("INSERT INTO deployments (address, abi) VALUES (?, ?)", (address, abi))
+    for alias in aliases:
+        conn.execute("INSERT OR IGNORE INTO deployments (address, abi, alias) VALUES (?, ?, ?)",
+                     (address, abi, alias))
+
+
+def _import_tail(conn, file):
+    """Import the lines of the text file that were not indexed yet."""
+    offset = int(_get_meta(conn, "txt_offset") or 0)
+    try:
+        fp = open(file, "rb")
+    except FileNotFoundError:
+        # The file was removed: so are its deployments.
+        conn.execute("DELETE FROM deployments")
+        conn.execute("DELETE FROM meta WHERE key IN ('txt_offset', 'txt_identity')")
+        return
+
+    with fp:
+        identity = _identity(fp)
+        if identity != _get_meta(conn, "txt_identity") or offset > os.fstat(fp.fileno()).st_size:
+            # The file was replaced, rewritten or truncated: rebuild the index from it.
+            conn.execute("DELETE FROM deployments")
+            offset = 0
+        fp.seek(offset)
+        for line in fp:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            if line.strip():
+                _insert(conn, *_parse_line(line.decode()))
+    _set_meta(conn, "txt_offset", offset)
+    _set_meta(conn, "txt_identity", identity)
+
+
+def find_deployments(address_or_alias, network="localhost"):
+    """
+    Return [(address, abi)] deployments matching an identifier.
+    - If address_or_alias is an int, address is assumed.
+    - If address_or_alias is a str, alias is assumed.
+    """
+    conn = _connect(network)
+    if type(address_or_alias) is int:
+        rows = conn.execute("SELECT address, abi FROM deployments WHERE address = ? ORDER BY id",
+                            (hex_address(address_or_alias),))
+    else:
+        rows = conn.execute("SELECT address, abi FROM deployments WHERE alias = ? ORDER BY id",
+                            (address_or_alias,))
+    return [(normalize_number(address), abi) for address, abi in rows]
+
+
+def list_deployments(network="localhost"):
+    """Return [(address, abi, alias)] for every registered deployment."""
+    conn = _connect(network)
+    rows = conn.execute("SELECT address, abi, alias FROM deployments ORDER BY id")
+    return [(normalize_number(address), abi, alias) for address, abi, alias in rows]
+
+
+def register_deployments(entries, network="localhost"):
+    """
+    Atomically register [(address, abi, alias)] deployments.
+    Either every entry is registered or, if an alias is taken, none is.
+    """
+    conn = _connect(network)
+    file = get_deployments_file_name(network)
+
+    with _transaction(conn):
+        # Lines appended by other tools must be indexed before our offset moves past them.
+        _import_tail(conn, file)
+
+        lines = []
+        for address, abi, alias in entries:
+            address = hex_address(address)
+            try:
+                conn.execute("INSERT INTO deployments (address, abi, alias) VALUES (?, ?, ?)",
+                             (address, abi, alias))
+            except sqlite3.IntegrityError:
+                raise AliasExistsError(f"Alias {alias} already exists in {file}")
+            lines.append(f"{address}:{abi}" + (f":{alias}" if alias is not None else "") + "\n")
+
+        with open(file, "ab+") as fp:
+            fp.write("".join(lines).encode())
+            fp.flush()
+            _set_meta(conn, "txt_offset", fp.tell())
+            _set_meta(conn, "txt_identity", _identity(fp))
+
+
+def is_declared(class_hash, network="localhost"):
+    """Return whether a class is recorded as declared on the network."""
+    row = _connect(network).execute("SELECT 1 FROM classes WHERE class_hash = ?",
+                                    (hex_address(class_hash),)).fetchone()
+    return row is not None
+
+
+def register_declared(class_hash, tx_hash=None, network="localhost"):
+    """Record a class as declared on the network (by tx_hash, if we declared it)."""
+    _connect(network).execute("INSERT OR IGNORE INTO classes (class_hash, tx_hash) VALUES (?, ?)",
+                              (hex_address(class_hash), tx_hash))
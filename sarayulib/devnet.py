@@ -0,0 +1,298 @@
+"""Pool of local starknet-devnet instances for parallel test shards.
+
+`sarayu devnet start -n K` starts K devnets on free ports and records them in
+`.cache/devnets/pool.json`. A shard leases one instance (an flock on
+`.cache/devnets/<port>.lock`, released when the shard exits), optionally
+restores a snapshot taken with devnet's /dump after a shared setup, and talks
+to it through SARAYU_GATEWAY_URL. The localhost registry, accounts, nonces
+and caches of a leased devnet live in its own state directory
+(`.cache/devnets/<port>/`, through SARAYU_STATE_DIR), so shards don't see
+each other's deployments; snapshots save and restore them with the chain:
+
+    $ sarayu devnet start -n 4
+    $ sarayu devnet lease -- sh -c "sarayu setup --count 20 && sarayu devnet snapshot base"
+    $ sarayu devnet lease --restore base -- pytest tests/shard_1
+"""
+
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import time
+import urllib.request
+
+from sarayulib.utils import gateway_url, state_path
+from sarayulib.constants import DEVNET_DIR, DEVNET_START_TIMEOUT, DEVNET_LEASE_TIMEOUT
+
+
+class DevnetError(Exception):
+    """Raised when devnets cannot be started, reached or leased."""
+
+
+def get_pool_file_name():
+    return f"{DEVNET_DIR}/pool.json"
+
+
+def get_snapshot_path(name):
+    # devnet resolves the path itself: make it absolute.
+    return os.path.abspath(f"{DEVNET_DIR}/{name}.pkl")
+
+
+def _lock_file_name(instance):
+    return f"{DEVNET_DIR}/{instance['port']}.lock"
+
+
+def get_state_dir(instance):
+    """The state directory of an instance (see sarayulib.utils.state_path)."""
+    return os.path.abspath(f"{DEVNET_DIR}/{instance['port']}")
+
+
+def get_snapshot_state_dir(name):
+    return f"{DEVNET_DIR}/{name}.state"
+
+
+# The localhost state files that describe the chain, saved with its snapshots.
+# The call cache and event index are not: they check the chain themselves.
+_SNAPSHOT_FILES = ("localhost.deployments.txt", "localhost.deployments.db",
+                   "localhost.accounts.json", "localhost.nonces.json")
+
+
+def _copy_state(source, destination):
+    """Replace the snapshot files of directory destination with those of source."""
+    os.makedirs(destination, exist_ok=True)
+    for name in _SNAPSHOT_FILES:
+        target = os.path.join(destination, name)
+        if os.path.exists(target):
+            os.remove(target)
+        path = os.path.join(source, name)
+        if not os.path.exists(path):
+            continue
+        if name.endswith(".db"):
+            # A consistent copy, even while another process writes to it.
+            with contextlib.closing(sqlite3.connect(path)) as src, contextlib.closing(sqlite3.connect(target)) as dst:
+                src.backup(dst)
+        else:
+            shutil.copyfile(path, target)
+
+
+def free_port(host="127.0.0.1"):
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def devnet_request(url, path, body=None, timeout=30):
+    """GET (or POST a JSON body to) a devnet endpoint. Returns the response body."""
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url.rstrip("/") + path, data=data,
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+def is_alive(url):
+    try:
+        devnet_request(url, "/is_alive", timeout=1)
+        return True
+    except OSError:
+        return False
+
+
+@contextlib.contextmanager
+def _pool():
+    """The pool description, locked for update."""
+    os.makedirs(DEVNET_DIR, exist_ok=True)
+    file = get_pool_file_name()
+    with open(f"{file}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        pool = {"instances": []}
+        if os.path.exists(file):
+            with open(file) as fp:
+                pool = json.load(fp)
+        yield pool
+        tmp = f"{file}.{os.getpid()}.tmp"
+        with open(tmp, "w") as fp:
+            json.dump(pool, fp, indent=2)
+        os.replace(tmp, file)
+
+
+def load_instances():
+    file = get_pool_file_name()
+    if not os.path.exists(file):
+        return []
+    with open(file) as fp:
+        return json.load(fp)["instances"]
+
+
+def start_devnets(count, host="127.0.0.1", seed=None, args=(), timeout=DEVNET_START_TIMEOUT):
+    """Start `count` devnets on free ports and wait until they are alive. Returns their instances."""
+    with _pool() as pool:
+        started = []
+        for _ in range(count):
+            port = free_port(host)
+            # A new devnet: drop the state a previous one on this port left.
+            shutil.rmtree(get_state_dir({"port": port}), ignore_errors=True)
+            command = ["starknet-devnet", "--host", host, "--port", str(port), *args]
+            if seed is not None:
+                command.extend(["--seed", str(seed)])
+            with open(f"{DEVNET_DIR}/{port}.log", "w") as log:
+                try:
+                    process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT,
+                                               start_new_session=True)
+                except FileNotFoundError:
+                    raise DevnetError("Could not find starknet-devnet. Install it with:\n"
+                                      "    pip install starknet-devnet")
+            started.append({"url": f"http://{host}:{port}/", "port": port, "pid": process.pid,
+                            "process": process})
+
+        try:
+            _wait_alive(started, timeout)
+        except DevnetError:
+            for instance in started:
+                with contextlib.suppress(ProcessLookupError):
+                    os.killpg(instance["pid"], signal.SIGTERM)
+            raise
+
+        for instance in started:
+            del instance["process"]
+        pool["instances"].extend(started)
+    return started
+
+
+def _wait_alive(instances, timeout):
+    """The instances boot in parallel: wait for all of them at once."""
+    deadline = time.monotonic() + timeout
+    waiting = list(instances)
+    while waiting:
+        for instance in list(waiting):
+            if is_alive(instance["url"]):
+                waiting.remove(instance)
+            elif instance["process"].poll() is not None:
+                raise DevnetError(f"devnet on port {instance['port']} exited, "
+                                  f"see {DEVNET_DIR}/{instance['port']}.log")
+        if waiting and time.monotonic() > deadline:
+            raise DevnetError(f"devnets on ports {[i['port'] for i in waiting]} did not start in {timeout}s")
+        time.sleep(0.1)
+
+
+def stop_devnets():
+    """Stop every devnet of the pool."""
+    with _pool() as pool:
+        for instance in pool["instances"]:
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(instance["pid"], signal.SIGTERM)
+        stopped, pool["instances"] = pool["instances"], []
+    return stopped
+
+
+def _try_lock(instance):
+    fp = open(_lock_file_name(instance), "a")
+    try:
+        fcntl.flock(fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        fp.close()
+        return None
+    return fp
+
+
+def devnet_status():
+    """Return [(instance, alive, leased)] for the pool."""
+    status = []
+    for instance in load_instances():
+        fp = _try_lock(instance)
+        if fp is not None:
+            fp.close()
+        status.append((instance, is_alive(instance["url"]), fp is None))
+    return status
+
+
+def snapshot(name, url=None):
+    """
+    Dump the state of a devnet (the current localhost gateway by default),
+    with the current localhost registry, accounts and nonces.
+    """
+    path = get_snapshot_path(name)
+    os.makedirs(DEVNET_DIR, exist_ok=True)
+    devnet_request(url or gateway_url("localhost"), "/dump", {"path": path})
+    _copy_state(state_path("") or ".", get_snapshot_state_dir(name))
+    return path
+
+
+def restore(name, url=None, state_dir=None):
+    """
+    Load a snapshot into a devnet (the current localhost gateway by default),
+    and its registry, accounts and nonces into state_dir (the current one by default).
+    """
+    path = get_snapshot_path(name)
+    if not os.path.exists(path):
+        raise DevnetError(f"No snapshot {name} ({path})")
+    devnet_request(url or gateway_url("localhost"), "/load", {"path": path})
+    _copy_state(get_snapshot_state_dir(name), state_dir or state_path("") or ".")
+
+
+class DevnetLease:
+    """
+    An instance held by this process. While entered, localhost points to it
+    and its state lives in the instance's state directory.
+    """
+
+    def __init__(self, instance, lock):
+        self.instance = instance
+        self.url = instance["url"]
+        self.state_dir = get_state_dir(instance)
+        self._lock = lock
+        self._previous = {}
+
+    def release(self):
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    def __enter__(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        for name, value in (("SARAYU_GATEWAY_URL", self.url), ("SARAYU_STATE_DIR", self.state_dir)):
+            self._previous[name] = os.environ.get(name)
+            os.environ[name] = value
+        return self
+
+    def __exit__(self, *exc):
+        for name, value in self._previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        self.release()
+
+
+def lease_devnet(restore_snapshot=None, timeout=DEVNET_LEASE_TIMEOUT):
+    """Lease a free, alive devnet of the pool, restored to a snapshot if given."""
+    deadline = time.monotonic() + timeout
+    while True:
+        instances = load_instances()
+        if len(instances) == 0:
+            raise DevnetError("No devnet in the pool. Start some with `sarayu devnet start -n K`.")
+        for instance in instances:
+            lock = _try_lock(instance)
+            if lock is None:
+                continue
+            if not is_alive(instance["url"]):
+                lock.close()
+                continue
+            if restore_snapshot is not None:
+                start = time.perf_counter()
+                try:
+                    restore(restore_snapshot, instance["url"], get_state_dir(instance))
+                except BaseException:
+                    lock.close()
+                    raise
+                logging.debug(f"restored {restore_snapshot} in {(time.perf_counter() - start) * 1000:.1f} ms")
+            return DevnetLease(instance, lock)
+        if time.monotonic() > deadline:
+            raise DevnetError(f"No devnet became free in {timeout}s")
+        time.sleep(0.2)
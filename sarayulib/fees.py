@@ -0,0 +1,149 @@
+"""Fee estimation for __execute__ transactions (max_fee "auto").
+
+The gas used by a transaction depends on what it calls much more than on the
+values it passes, so estimates are cached (in the call cache, see
+sarayulib.cache) per calls shape: the target contracts, selectors and calldata
+lengths. A cached estimate is reused for FEE_CACHE_BLOCKS blocks and priced at
+the gas price of the latest block, so gas price changes are followed without
+estimating again.
+
+    max_fee = gas usage * gas price * multiplier
+
+The multiplier is FEE_MULTIPLIER, or SARAYU_FEE_MULTIPLIER.
+"""
+
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from sarayulib.cache import get_call_cache
+from sarayulib.calldata import encode_felts
+from sarayulib.signing import sign_execute
+from sarayulib.trace import span
+from sarayulib.transport import get_transport, TransportError
+from sarayulib.utils import deployments_load, normalize_number, stringify
+from sarayulib.constants import (
+    MAX_FEE, QUERY_VERSION, FEE_NETWORKS, FEE_MULTIPLIER, FEE_CACHE_BLOCKS, FEE_CACHE_TTL, FEE_CONCURRENCY,
+)
+
+AUTO = "auto"
+
+
+def resolve_max_fee(max_fee, network="localhost"):
+    """
+    Normalize a max_fee option: "auto", or a number of wei. None means "auto" on
+    the networks that charge fees (FEE_NETWORKS) and MAX_FEE elsewhere.
+    """
+    if max_fee is None:
+        return AUTO if network in FEE_NETWORKS else MAX_FEE
+    if max_fee == AUTO:
+        return AUTO
+    return normalize_number(max_fee)
+
+
+def fee_multiplier():
+    return float(os.environ.get("SARAYU_FEE_MULTIPLIER", FEE_MULTIPLIER))
+
+
+def calls_shape(execute_calldata):
+    """[[to, selector, calldata length]] of the calls of an __execute__ calldata."""
+    calldata = [normalize_number(x) for x in execute_calldata]
+    return [[hex(to), hex(selector), length]
+            for to, selector, _, length in zip(*[iter(calldata[1:1 + 4 * calldata[0]])] * 4)]
+
+
+class FeeEstimator:
+    """Cached fee estimates of __execute__ transactions."""
+
+    def __init__(self, network="localhost", multiplier=None):
+        self.network = network
+        self._multiplier = multiplier
+
+    @property
+    def cache(self):
+        return get_call_cache(self.network)
+
+    @property
+    def multiplier(self):
+        if self._multiplier is not None:
+            return self._multiplier
+        return fee_multiplier()
+
+    def _key(self, execute_calldata):
+        return json.dumps(["fee", self.network, calls_shape(execute_calldata)])
+
+    def _cached(self, key, latest):
+        estimate = self.cache.get(key)
+        if estimate is None or latest["block_number"] - estimate["block_number"] > FEE_CACHE_BLOCKS:
+            return None
+        return estimate
+
+    def _max_fee(self, estimate, latest):
+        gas_price = latest["gas_price"] or estimate["gas_price"]
+        fee = estimate["gas_usage"] * gas_price if estimate["gas_usage"] else estimate["overall_fee"]
+        return math.ceil(fee * self.multiplier)
+
+    def _query(self, transport, sender, priv_key, execute_calldata):
+        """estimate_fee() arguments: a query signed with the current nonce of the sender."""
+        nonce = transport.get_nonce(sender)
+        signature = sign_execute(sender, execute_calldata, nonce, priv_key, 0, QUERY_VERSION)
+        address, abi = next(deployments_load(sender, self.network))
+        return address, abi, "__execute__", stringify(encode_felts(execute_calldata)), signature, nonce, QUERY_VERSION
+
+    def _estimate(self, transport, queries, concurrency):
+        if len(queries) > 1:
+            try:
+                return transport.estimate_fee_bulk(queries)
+            except TransportError as err:
+                # Gateways before estimate_fee_bulk: estimate one by one.
+                if err.status != 404:
+                    raise
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(lambda query: transport.estimate_fee(*query), queries))
+
+    def max_fees(self, transactions, concurrency=FEE_CONCURRENCY):
+        """
+        Return the max_fee of each (sender, priv_key, execute_calldata). Shapes
+        that are not cached are estimated together, once each.
+        """
+        transport = get_transport(self.network)
+        latest = self.cache.latest(transport)
+        keys = [self._key(execute_calldata) for _, _, execute_calldata in transactions]
+        estimates = {key: self._cached(key, latest) for key in keys}
+
+        missing = {}
+        for key, transaction in zip(keys, transactions):
+            if estimates[key] is None:
+                missing.setdefault(key, transaction)
+        if missing:
+            with span("fee estimate", shapes=len(missing)):
+                with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                    queries = list(executor.map(lambda tx: self._query(transport, *tx), missing.values()))
+                results = self._estimate(transport, queries, concurrency)
+            for key, result in zip(missing, results):
+                estimates[key] = {
+                    "block_number": latest["block_number"],
+                    "overall_fee": normalize_number(result["overall_fee"]),
+                    "gas_usage": normalize_number(result.get("gas_usage") or 0),
+                    "gas_price": normalize_number(result.get("gas_price") or 0),
+                }
+                self.cache.put(key, estimates[key], FEE_CACHE_TTL)
+        return [self._max_fee(estimates[key], latest) for key in keys]
+
+    def max_fee(self, sender, priv_key, execute_calldata):
+        return self.max_fees([(sender, priv_key, execute_calldata)])[0]
+
+    def forget(self, execute_calldata):
+        """Drop the cached estimate of a shape (after a rejection for insufficient fee)."""
+        self.cache.put(self._key(execute_calldata), None, 0)
+
+
+_ESTIMATORS = {}
+
+
+def get_fee_estimator(network="localhost"):
+    """Return the process-wide fee estimator of a network."""
+    if network not in _ESTIMATORS:
+        _ESTIMATORS[network] = FeeEstimator(network)
+    return _ESTIMATORS[network]
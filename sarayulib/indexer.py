@@ -0,0 +1,295 @@
+"""Local index of the transactions and events of registered contracts.
+
+`sarayu index sync` pulls blocks with their receipts from the gateway and keeps
+the transactions sent to (directly, or as a call of an account's __execute__),
+and the events emitted by, the contracts of `<network>.deployments.txt` in
+`<network>.index.db` (SQLite). Blocks are
+fetched concurrently and written in order, in batches, so an interrupted sync
+resumes after the last written block. When the chain no longer has the last
+indexed block (a devnet restarted or restored from a snapshot), the index is
+rewound to the last block both agree on.
+
+Contracts registered after a sync are indexed from the next synced block; use
+`--from-block` to index their history.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from sarayulib.abi import get_selector, load_abi_index
+from sarayulib.deployments import list_deployments, find_deployments
+from sarayulib.transport import get_transport, TransportError
+from sarayulib.trace import span
+from sarayulib.utils import hex_address, normalize_number, state_path
+from sarayulib.constants import INDEX_CONCURRENCY, INDEX_BATCH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    number      INTEGER PRIMARY KEY,
+    hash        TEXT NOT NULL,
+    timestamp   INTEGER
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    hash         TEXT PRIMARY KEY,
+    block_number INTEGER NOT NULL,
+    tx_index     INTEGER NOT NULL,
+    type         TEXT,
+    address      TEXT,
+    calldata     TEXT,
+    actual_fee   TEXT
+);
+CREATE INDEX IF NOT EXISTS transactions_address ON transactions (address, block_number);
+CREATE TABLE IF NOT EXISTS events (
+    tx_hash      TEXT NOT NULL,
+    event_index  INTEGER NOT NULL,
+    block_number INTEGER NOT NULL,
+    address      TEXT NOT NULL,
+    key          TEXT,
+    keys         TEXT NOT NULL,
+    data         TEXT NOT NULL,
+    PRIMARY KEY (tx_hash, event_index)
+);
+CREATE INDEX IF NOT EXISTS events_address ON events (address, key, block_number);
+CREATE TABLE IF NOT EXISTS contracts (
+    address TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _targets(tx):
+    """The contracts a transaction is sent to: its own, and the calls of an __execute__."""
+    target = tx.get("sender_address") or tx.get("contract_address")
+    if target is None:
+        return []
+    targets = [hex_address(target)]
+    if "sender_address" in tx:
+        # [call_array_len, (to, selector, data_offset, data_len)..., calldata_len, calldata...]
+        try:
+            calldata = tx.get("calldata") or []
+            count = normalize_number(calldata[0])
+            targets.extend(hex_address(normalize_number(calldata[1 + 4 * i])) for i in range(count))
+        except (IndexError, ValueError):
+            pass
+    return targets
+
+
+def get_index_db_name(network):
+    return state_path(f"{network}.index.db")
+
+
+class EventIndex:
+    """The index database of a network."""
+
+    def __init__(self, network="localhost"):
+        self.network = network
+        self.path = get_index_db_name(network)
+        self._local = threading.local()
+
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def synced(self):
+        """The last block of the contiguous indexed range, -1 when nothing is indexed."""
+        row = self._db().execute("SELECT value FROM meta WHERE key = 'synced'").fetchone()
+        return int(row[0]) if row else -1
+
+    def _set_synced(self, conn, number):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('synced', ?)", (str(number),))
+
+    def block_hash(self, number):
+        row = self._db().execute("SELECT hash FROM blocks WHERE number = ?", (number,)).fetchone()
+        return row[0] if row else None
+
+    def track(self, addresses):
+        """Start indexing new addresses from the next synced block. Returns the new ones."""
+        conn = self._db()
+        known = {address for address, in conn.execute("SELECT address FROM contracts")}
+        new = [hex_address(a) for a in addresses if hex_address(a) not in known]
+        conn.executemany("INSERT OR IGNORE INTO contracts (address) VALUES (?)", [(address,) for address in new])
+        return new
+
+    def addresses(self):
+        return {address for address, in self._db().execute("SELECT address FROM contracts")}
+
+    def write(self, blocks, addresses):
+        """Write fetched blocks, keeping what concerns addresses, and advance the synced block."""
+        transactions, events = [], []
+        for block in blocks:
+            number = block["block_number"]
+            receipts = {r["transaction_hash"]: r for r in block.get("transaction_receipts", [])}
+            for tx_index, tx in enumerate(block.get("transactions", [])):
+                receipt = receipts.get(tx["transaction_hash"], {})
+                emitted = [e for e in receipt.get("events", []) if hex_address(e["from_address"]) in addresses]
+                # The registered contract the transaction is for: a call target, or the sender.
+                targets = _targets(tx)
+                target = next((t for t in reversed(targets) if t in addresses), targets[0] if targets else None)
+                if target not in addresses and len(emitted) == 0:
+                    continue
+                transactions.append((tx["transaction_hash"], number, tx_index, tx.get("type"), target,
+                                     json.dumps(tx.get("calldata") or tx.get("constructor_calldata", [])),
+                                     receipt.get("actual_fee")))
+                for event_index, event in enumerate(receipt.get("events", [])):
+                    if hex_address(event["from_address"]) not in addresses:
+                        continue
+                    keys = event.get("keys", [])
+                    events.append((tx["transaction_hash"], event_index, number,
+                                   hex_address(event["from_address"]),
+                                   hex(normalize_number(keys[0])) if keys else None,
+                                   json.dumps(keys), json.dumps(event.get("data", []))))
+
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR REPLACE INTO blocks (number, hash, timestamp) VALUES (?, ?, ?)",
+                             [(b["block_number"], b["block_hash"], b.get("timestamp")) for b in blocks])
+            conn.executemany("INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?)", transactions)
+            conn.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?)", events)
+            synced = self.synced()
+            first, last = blocks[0]["block_number"], blocks[-1]["block_number"]
+            if first <= synced + 1 < last + 1:
+                self._set_synced(conn, last)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(transactions), len(events)
+
+    def rewind(self, transport):
+        """Drop the indexed blocks the chain no longer has. Returns the new synced block."""
+        synced = self.synced()
+        while synced >= 0:
+            try:
+                block = transport.get_block(synced)
+            except TransportError as err:
+                if err.kind == "transient":
+                    raise
+                block = None
+            if block is not None and block["block_hash"] == self.block_hash(synced):
+                break
+            synced -= 1
+
+        if synced < self.synced():
+            logging.warning(f"⚠️  The chain changed after block {synced}: dropped the blocks indexed after it.")
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            for table, column in (("blocks", "number"), ("transactions", "block_number"),
+                                  ("events", "block_number")):
+                conn.execute(f"DELETE FROM {table} WHERE {column} > ?", (synced,))
+            self._set_synced(conn, synced)
+            conn.execute("COMMIT")
+        return synced
+
+    def events(self, address, name=None, from_block=None, to_block=None):
+        """Return the indexed events of an address (of one event name) in a block range."""
+        query = "SELECT block_number, tx_hash, event_index, keys, data FROM events WHERE address = ?"
+        params = [hex_address(address)]
+        if name is not None:
+            query += " AND key = ?"
+            params.append(hex(get_selector(name)))
+        if from_block is not None:
+            query += " AND block_number >= ?"
+            params.append(from_block)
+        if to_block is not None:
+            query += " AND block_number <= ?"
+            params.append(to_block)
+        query += " ORDER BY block_number, tx_hash, event_index"
+        return [{"block_number": number, "transaction_hash": tx_hash, "event_index": index,
+                 "keys": json.loads(keys), "data": json.loads(data)}
+                for number, tx_hash, index, keys, data in self._db().execute(query, params)]
+
+
+def _fetch_blocks(transport, numbers, concurrency):
+    """Yield the blocks of numbers in order, with at most 2 * concurrency requests in flight."""
+    window = 2 * concurrency
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = deque()
+        for number in numbers:
+            pending.append(executor.submit(transport.get_block, number))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def sync_index(network="localhost", from_block=None, to_block=None, concurrency=INDEX_CONCURRENCY,
+               batch=INDEX_BATCH):
+    """
+    Index the blocks after the last synced one (or from_block) up to the
+    latest one (or to_block). Returns (blocks, transactions, events) written.
+    """
+    index = EventIndex(network)
+    transport = get_transport(network)
+
+    new = index.track([address for address, _, _ in list_deployments(network)])
+    if new and index.synced() >= 0 and from_block is None:
+        logging.warning(f"⚠️  Indexing {len(new)} new contracts from block {index.synced() + 1}. "
+                        "Use --from-block to index their history.")
+    addresses = index.addresses()
+
+    synced = index.rewind(transport)
+    start = synced + 1 if from_block is None else from_block
+    with span("block number"):
+        head = transport.block_number("latest")
+    stop = head if to_block is None else min(to_block, head)
+    if start > stop:
+        return 0, 0, 0
+    logging.info(f"🔎 Indexing blocks {start}..{stop} of {network}")
+
+    counts = [0, 0, 0]
+    chunk = []
+
+    def flush():
+        with span("index write", blocks=len(chunk)):
+            transactions, events = index.write(chunk, addresses)
+        counts[0] += len(chunk)
+        counts[1] += transactions
+        counts[2] += events
+        logging.debug(f"indexed blocks {chunk[0]['block_number']}..{chunk[-1]['block_number']}")
+        chunk.clear()
+
+    with span("index sync", blocks=stop - start + 1):
+        for block in _fetch_blocks(transport, range(start, stop + 1), concurrency):
+            chunk.append(block)
+            if len(chunk) >= batch:
+                flush()
+        if chunk:
+            flush()
+    return tuple(counts)
+
+
+def query_events(address_or_alias, network="localhost", name=None, from_block=None, to_block=None,
+                 decode=False):
+    """
+    Return the indexed events of a contract. With decode=True the event name
+    and its data decoded with the contract ABI are added.
+    """
+    if isinstance(address_or_alias, str) and address_or_alias.startswith("0x"):
+        address_or_alias = normalize_number(address_or_alias)
+    deployments = find_deployments(address_or_alias, network)
+    if len(deployments) == 0:
+        raise ValueError(f"Unknown contract {address_or_alias}")
+    address, abi = deployments[0]
+
+    events = EventIndex(network).events(address, name, from_block, to_block)
+    if decode and os.path.exists(abi):
+        index = load_abi_index(abi)
+        for event in events:
+            event["name"] = index.event_name(event["keys"][0]) if event["keys"] else None
+            if event["name"] is not None:
+                event["decoded"] = index.decode_event(event["name"], event["data"])
+    return events
@@ -0,0 +1,91 @@
+"""Local nonce manager.
+
+Nonces are fetched from the gateway once per account and then handed out
+locally, so several transactions of one account can be in flight at the same
+time. Reservations are stored in `<network>.nonces.json` under a file lock,
+which makes them visible to every sarayu process working in the directory.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import time
+
+from sarayulib.constants import NONCE_TTL
+from sarayulib.utils import hex_address, state_path
+from sarayulib.transport import get_transport, classify_error
+from sarayulib.trace import span
+
+
+def get_nonce_file_name(network):
+    return state_path(f"{network}.nonces.json")
+
+
+def is_nonce_error(err):
+    """Return whether a gateway rejection is caused by a wrong nonce."""
+    return getattr(err, "kind", None) == "nonce" or classify_error(err) == "nonce"
+
+
+class NonceManager:
+    """Hand out monotonically increasing nonces per account."""
+
+    def __init__(self, network="localhost", ttl=NONCE_TTL):
+        self.network = network
+        self.ttl = ttl
+        self.file = get_nonce_file_name(network)
+
+    def _locked(self):
+        fp = open(f"{self.file}.lock", "a")
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        return fp
+
+    def _load(self):
+        if not os.path.exists(self.file):
+            return {}
+        with open(self.file) as fp:
+            return json.load(fp)
+
+    def _save(self, nonces):
+        tmp = f"{self.file}.{os.getpid()}.tmp"
+        with open(tmp, "w") as fp:
+            json.dump(nonces, fp)
+        os.replace(tmp, self.file)
+
+    def _fetch(self, address):
+        with span("get_nonce"):
+            nonce = get_transport(self.network).get_nonce(address)
+        logging.debug(f"fetched nonce {nonce} for {hex_address(address)}")
+        return {"next": nonce, "updated": time.time()}
+
+    def reserve(self, address, count=1):
+        """Reserve `count` consecutive nonces for address. Returns the first one."""
+        key = hex_address(address)
+        with self._locked():
+            nonces = self._load()
+            entry = nonces.get(key)
+            # After a quiet period nothing is in flight any more, so resync.
+            if entry is None or time.time() - entry["updated"] > self.ttl:
+                entry = self._fetch(address)
+            nonce = entry["next"]
+            entry["next"] = nonce + count
+            entry["updated"] = time.time()
+            nonces[key] = entry
+            self._save(nonces)
+        return nonce
+
+    def last_reserved(self, addresses):
+        """Return when each address last reserved a nonce (0 if never)."""
+        with self._locked():
+            nonces = self._load()
+        return {address: nonces.get(hex_address(address), {}).get("updated", 0) for address in addresses}
+
+    def resync(self, address):
+        """Forget local reservations and refetch the nonce from the gateway."""
+        key = hex_address(address)
+        with self._locked():
+            nonces = self._load()
+            nonces[key] = self._fetch(address)
+            self._save(nonces)
+        logging.info(f"🔄 Resynced nonce of {key}: {nonces[key]['next']}")
+        return nonces[key]["next"]
@@ -0,0 +1,111 @@
+"""Account pool.
+
+Spreads invokes over every account registered in `<network>.accounts.json`.
+Each account keeps its own nonce sequence (see sarayulib.nonce), so with N
+accounts N transactions can be in flight without nonce collisions.
+
+- round-robin: the account that least recently reserved a nonce, also across
+  sarayu processes of the same directory
+- least-loaded: the account with the fewest unsettled transactions in this
+  process
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from sarayulib.utils import get_account_file_name, normalize_number, hex_address, derive_private_key
+from sarayulib.nonce import NonceManager
+from sarayulib.constants import MAX_FEE, POOL_STRATEGY, POOL_STRATEGIES
+
+
+class AccountPool:
+    """A set of (private_key, address) signers with per-account load tracking."""
+
+    def __init__(self, network="localhost", strategy=POOL_STRATEGY):
+        if strategy not in POOL_STRATEGIES:
+            raise ValueError(f"Unknown pool strategy {strategy}, expected one of {POOL_STRATEGIES}")
+        self.network = network
+        self.strategy = strategy
+        self.signers = load_signers(network)
+        if len(self.signers) == 0:
+            raise Exception(f"No usable account in {get_account_file_name(network)}.")
+
+        self._lock = threading.Lock()
+        self._last_used = NonceManager(network).last_reserved([a for _, a in self.signers])
+        self._in_flight = {address: 0 for _, address in self.signers}
+        self._senders = {}
+
+    def __len__(self):
+        return len(self.signers)
+
+    def acquire(self):
+        """Pick the next signer. Returns (private_key, address)."""
+        with self._lock:
+            if self.strategy == "least-loaded":
+                key = lambda s: (self._in_flight[s[1]], self._last_used[s[1]])
+            else:
+                key = lambda s: self._last_used[s[1]]
+            priv_key, address = min(self.signers, key=key)
+            self._last_used[address] = time.time()
+            self._in_flight[address] += 1
+        return priv_key, address
+
+    def release(self, address):
+        with self._lock:
+            self._in_flight[address] = max(0, self._in_flight[address] - 1)
+
+    def submit(self, execute_calldata, max_fee=MAX_FEE):
+        """
+        Sign and send an __execute__ transaction from the next account.
+        The account counts as loaded until `settle(tx_hash)`.
+        """
+        # Imported here: sarayulib.cmd.invoke builds on the pool.
+        from sarayulib.cmd.invoke import submit_execute
+
+        priv_key, sender = self.acquire()
+        try:
+            tx_hash = submit_execute(sender, priv_key, execute_calldata, self.network, max_fee)
+        except BaseException:
+            self.release(sender)
+            raise
+        with self._lock:
+            self._senders[tx_hash] = sender
+        return tx_hash
+
+    def settle(self, tx_hash):
+        """Mark a transaction sent by `submit` as accepted or rejected."""
+        with self._lock:
+            sender = self._senders.pop(tx_hash, None)
+        if sender is not None:
+            self.release(sender)
+
+
+def load_signers(network):
+    """Return (private_key, address) for every account whose key is available."""
+    file = get_account_file_name(network)
+    if not os.path.exists(file):
+        return []
+    with open(file) as fp:
+        accounts = json.load(fp)
+
+    signers = []
+    for entry in sorted(accounts.values(), key=lambda e: e["index"]):
+        priv_key = _private_key(entry)
+        if priv_key is None:
+            logging.warning(f"⚠️  No private key for account {entry['address']} ({entry['alias']}), skipped.")
+            continue
+        signers.append((priv_key, normalize_number(entry["address"])))
+    logging.debug(f"pool: {[hex_address(a) for _, a in signers]}")
+    return signers
+
+
+def _private_key(entry):
+    """The key is in the env var named by the alias, or derived from the seed it names."""
+    if entry.get("alias") not in os.environ:
+        return None
+    if "derivation" in entry:
+        return derive_private_key(os.environ[entry["alias"]], entry["derivation"])
+    return normalize_number(os.environ[entry["alias"]])
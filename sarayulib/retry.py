@@ -0,0 +1,52 @@
+"""Retries of transient gateway failures, with exponential backoff and jitter.
+
+The policy is read from SARAYU_RETRY_ATTEMPTS, SARAYU_RETRY_BASE_DELAY and
+SARAYU_RETRY_MAX_DELAY (set by `sarayu --retries/--retry-delay`), with the
+constants.RETRY_* defaults.
+"""
+
+import logging
+import os
+import random
+import time
+
+from sarayulib.trace import span
+from sarayulib.constants import RETRY_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+
+
+class RetryPolicy:
+    """Retry up to `attempts` extra times, sleeping a random time in [0, base * 2**n] capped at max_delay."""
+
+    def __init__(self, attempts=RETRY_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            int(os.environ.get("SARAYU_RETRY_ATTEMPTS", RETRY_ATTEMPTS)),
+            float(os.environ.get("SARAYU_RETRY_BASE_DELAY", RETRY_BASE_DELAY)),
+            float(os.environ.get("SARAYU_RETRY_MAX_DELAY", RETRY_MAX_DELAY)),
+        )
+
+    def delay(self, attempt):
+        # "Full jitter": concurrent clients that failed together do not retry together.
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def with_retries(fn, policy=None, retryable=lambda err: getattr(err, "kind", None) == "transient"):
+    """Call fn(), retrying the failures for which retryable(err) holds."""
+    policy = policy or RetryPolicy.from_env()
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as err:
+            if attempt >= policy.attempts or not retryable(err):
+                raise
+            delay = policy.delay(attempt)
+            logging.debug(f"retry {attempt + 1}/{policy.attempts} in {delay:.2f}s: {err}")
+            with span("retry backoff", attempt=attempt + 1):
+                time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,94 @@
+"""Transaction hashing and signing, optionally spread across a process pool."""
+
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from starkware.crypto.signature.signature import sign
+from starkware.starknet.core.os.transaction_hash.transaction_hash import TransactionHashPrefix, calculate_transaction_hash_common
+from starkware.starknet.definitions.general_config import StarknetChainId
+
+from sarayulib.trace import span
+from sarayulib.constants import MAX_FEE, TRANSACTION_VERSION, SIGN_CHUNK_SIZE
+
+
+def execute_transaction_hash(sender, execute_calldata, nonce, max_fee=MAX_FEE, version=TRANSACTION_VERSION):
+    """Hash of an __execute__ invoke transaction (or fee estimation query, version=QUERY_VERSION)."""
+    return calculate_transaction_hash_common(
+        tx_hash_prefix=TransactionHashPrefix.INVOKE,
+        version=version,
+        contract_address=sender,
+        entry_point_selector=0,
+        calldata=execute_calldata,
+        max_fee=max_fee,
+        chain_id=StarknetChainId.TESTNET.value,
+        additional_data=[nonce]
+    )
+
+
+def declare_transaction_hash(sender, class_hash, nonce, max_fee=MAX_FEE, version=TRANSACTION_VERSION):
+    """Hash of a declare transaction. Takes the class hash, which is slow to compute, instead of the class."""
+    return calculate_transaction_hash_common(
+        tx_hash_prefix=TransactionHashPrefix.DECLARE,
+        version=version,
+        contract_address=sender,
+        entry_point_selector=0,
+        calldata=[class_hash],
+        max_fee=max_fee,
+        chain_id=StarknetChainId.TESTNET.value,
+        additional_data=[nonce]
+    )
+
+
+def sign_declare(sender, class_hash, nonce, priv_key, max_fee=MAX_FEE, version=TRANSACTION_VERSION):
+    """Sign a declare transaction. Returns the signature as strings."""
+    with span("transaction hash"):
+        transaction_hash = declare_transaction_hash(sender, class_hash, nonce, max_fee, version)
+    sig_r, sig_s = sign(transaction_hash, priv_key)
+    return [str(sig_r), str(sig_s)]
+
+
+def sign_execute(sender, execute_calldata, nonce, priv_key, max_fee=MAX_FEE, version=TRANSACTION_VERSION):
+    """Sign an __execute__ transaction. Returns the signature as strings."""
+    with span("transaction hash"):
+        transaction_hash = execute_transaction_hash(sender, execute_calldata, nonce, max_fee, version)
+    with span("sign"):
+        sig_r, sig_s = sign(transaction_hash, priv_key)
+    return [str(sig_r), str(sig_s)]
+
+
+def _sign_chunk(chunk):
+    """Worker: sign a list of (priv_key, sender, execute_calldata, nonce, max_fee)."""
+    signed = []
+    for priv_key, sender, execute_calldata, nonce, max_fee in chunk:
+        transaction_hash = execute_transaction_hash(sender, execute_calldata, nonce, max_fee)
+        sig_r, sig_s = sign(transaction_hash, priv_key)
+        signed.append((transaction_hash, [str(sig_r), str(sig_s)]))
+    return signed
+
+
+def sign_transactions(transactions, jobs=None, chunk_size=SIGN_CHUNK_SIZE):
+    """
+    Sign a stream of (priv_key, sender, execute_calldata, nonce, max_fee) tuples.
+    Yields (transaction_hash, signature) in input order. Work is sent to `jobs`
+    processes in chunks, with a bounded number of chunks in flight, so the input
+    can be arbitrarily long.
+    """
+    jobs = jobs if jobs else (os.cpu_count() or 1)
+    transactions = iter(transactions)
+    chunks = iter(lambda: list(itertools.islice(transactions, chunk_size)), [])
+
+    if jobs == 1:
+        for chunk in chunks:
+            yield from _sign_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_sign_chunk, chunk))
+            if len(pending) >= 2 * jobs:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
@@ -0,0 +1,99 @@
+"""Per-phase timing of sarayu commands (`sarayu --trace ...`).
+
+Code marks phases with `span(name)`. Spans are only recorded once tracing is
+enabled, and are reported as an indented tree or written as Chrome trace-event
+JSON (chrome://tracing, Perfetto).
+"""
+
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+_state = {"enabled": False, "events": [], "origin": 0.0}
+_local = threading.local()
+
+
+def enable():
+    """Start recording spans (and forget the previous ones)."""
+    _state.update(enabled=True, events=[], origin=time.perf_counter())
+
+
+def disable():
+    _state["enabled"] = False
+
+
+def is_enabled():
+    return _state["enabled"]
+
+
+@contextlib.contextmanager
+def span(name, **args):
+    """Time the enclosed block as one phase."""
+    if not _state["enabled"]:
+        yield
+        return
+
+    depth = getattr(_local, "depth", 0)
+    _local.depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        _local.depth = depth
+        _state["events"].append({
+            "name": name,
+            "start": start - _state["origin"],
+            "duration": end - start,
+            "depth": depth,
+            "tid": threading.get_ident(),
+            "args": {k: str(v) for k, v in args.items()},
+        })
+
+
+def format_tree():
+    """Return the recorded spans as an indented tree, per thread."""
+    lines = []
+    threads = {}
+    for event in _state["events"]:
+        threads.setdefault(event["tid"], []).append(event)
+
+    for i, (tid, events) in enumerate(threads.items()):
+        if len(threads) > 1:
+            lines.append(f"thread {i}:")
+        # Parents end after their children: sort by start, then outermost first.
+        for event in sorted(events, key=lambda e: (e["start"], e["depth"])):
+            detail = " ".join(f"{k}={v}" for k, v in event["args"].items())
+            lines.append(f"{'  ' * event['depth']}{event['duration'] * 1000:9.2f} ms  {event['name']}"
+                         + (f"  ({detail})" if detail else ""))
+    return "\n".join(lines)
+
+
+def chrome_trace():
+    """Return the recorded spans as Chrome trace-event JSON."""
+    pid = os.getpid()
+    return json.dumps({"traceEvents": [
+        {
+            "name": event["name"],
+            "ph": "X",
+            "ts": event["start"] * 1e6,
+            "dur": event["duration"] * 1e6,
+            "pid": pid,
+            "tid": event["tid"],
+            "args": event["args"],
+        }
+        for event in _state["events"]
+    ]})
+
+
+def report(trace_format="tree", path=None):
+    """Print or write the trace."""
+    content = chrome_trace() if trace_format == "chrome" else format_tree()
+    if path is None:
+        print(content, file=sys.stderr)
+        return
+    with open(path, "w") as fp:
+        fp.write(content + "\n")
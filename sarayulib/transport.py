@@ -0,0 +1,568 @@
+"""Transports used to talk to the StarkNet gateway.
+
+Two transports are available:
+- "http": talks to the feeder gateway and gateway HTTP APIs directly, reusing
+  pooled keep-alive connections per gateway endpoint.
+- "cli":  spawns the `starknet` CLI for every request (the original behaviour).
+
+The transport is selected with the SARAYU_TRANSPORT environment variable and
+defaults to constants.TRANSPORT.
+"""
+
+import base64
+import functools
+import gzip
+import http.client
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import socket
+import subprocess
+import threading
+from urllib.parse import urlencode, urlsplit
+
+from sarayulib.abi import get_selector
+from sarayulib.trace import span
+from sarayulib.retry import with_retries
+from sarayulib.constants import TRANSPORT, TRANSPORTS, HTTP_POOL_SIZE, HTTP_TIMEOUT
+from sarayulib.utils import (
+    gateway_url,
+    hex_address, normalize_number,
+    parse_information, parse_send,
+    set_network_var,
+)
+
+
+class TransportError(Exception):
+    """
+    Raised when the gateway (or the starknet CLI) rejects a request. `kind`
+    classifies the failure (see classify_error); transient ones are retried.
+    """
+
+    def __init__(self, message, kind=None, status=None):
+        super().__init__(message)
+        self.status = status
+        self.kind = kind or classify_error(message, status)
+
+    def to_dict(self):
+        """Structured form of the error, as printed by the commands."""
+        return {"error": self.kind, "status": self.status, "message": str(self)}
+
+
+ERROR_KINDS = ("transient", "nonce", "fee", "revert", "other")
+
+# StarknetErrorCode names of the gateway errors, by kind.
+_ERROR_CODES = {
+    "INVALID_TRANSACTION_NONCE": "nonce",
+    "INSUFFICIENT_MAX_FEE": "fee",
+    "INSUFFICIENT_ACCOUNT_BALANCE": "fee",
+    "OUT_OF_RANGE_FEE": "fee",
+    "TRANSACTION_FAILED": "revert",
+    "ENTRY_POINT_NOT_FOUND_IN_CONTRACT": "revert",
+    "UNINITIALIZED_CONTRACT": "revert",
+}
+
+# Phrases of error messages without a code (the starknet CLI, connection failures).
+_ERROR_MARKERS = (
+    ("nonce", ("invalid transaction nonce",)),
+    ("fee", ("max_fee must be bigger than 0", "actual fee exceeded max fee")),
+    ("revert", ("error at pc", "got an exception while executing a hint", "transaction failed")),
+    ("transient", ("timed out", "connection refused", "connection reset", "temporarily unavailable",
+                   "service unavailable", "too many requests", "bad gateway")),
+)
+
+_TRANSIENT_STATUSES = (429, 500, 502, 503, 504)
+
+_CODE = re.compile(r"StarknetErrorCode\.(\w+)")
+# URLs and gateway paths: their names ("feeder_gateway", "get_nonce") and hashes are not part of the error.
+_LOCATION = re.compile(r"(https?://|/(feeder_)?gateway/)\S*")
+_CLI_STATUS = re.compile(r"Status code: (\d{3})")
+
+
+def classify_error(message, status=None, code=None):
+    """
+    Return the kind of a failure: transient, nonce, fee, revert or other.
+    message is the error message of the gateway, or the output of the
+    starknet CLI; code its StarknetErrorCode, when known.
+    """
+    message = str(message)
+    if code is None:
+        match = _CODE.search(message)
+        code = match.group(1) if match else None
+    if status is None:
+        match = _CLI_STATUS.search(message)
+        status = int(match.group(1)) if match else None
+    if code is not None:
+        # The gateway also answers 500 for the StarkNet errors it knows: those are final.
+        return _ERROR_CODES.get(code.rpartition(".")[2], "other")
+
+    message = _LOCATION.sub("", message).lower()
+    for kind, markers in _ERROR_MARKERS:
+        if any(marker in message for marker in markers):
+            return kind
+    if status in _TRANSIENT_STATUSES:
+        return "transient"
+    return "other"
+
+
+class _ConnectionPool:
+    """Pool of keep-alive HTTP connections to one gateway endpoint."""
+
+    def __init__(self, url, size=HTTP_POOL_SIZE, timeout=HTTP_TIMEOUT):
+        parts = urlsplit(url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def _release(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(self, method, path, body=None):
+        """Send a request and return (status, body)."""
+        headers = {"Connection": "keep-alive"}
+        if body is not None:
+            body = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+
+        conn, reused = self._acquire()
+        with span(f"http {method} {path.split('?')[0]}", reused=reused):
+            resp, data, conn = self._send(conn, reused, method, path, body, headers)
+
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        return resp.status, data
+
+    def _send(self, conn, reused, method, path, body, headers):
+        while True:
+            try:
+                conn.request(method, self.prefix + path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                conn.close()
+                # A reused connection may have been closed by the server while idle.
+                if not reused:
+                    raise
+                conn, reused = self._connect(), False
+        return resp, data, conn
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _get_pool(url):
+    with _POOLS_LOCK:
+        if url not in _POOLS:
+            _POOLS[url] = _ConnectionPool(url)
+        return _POOLS[url]
+
+
+def compress_contract(contract):
+    """The contract definition the gateway takes: the program gzipped and base64 encoded."""
+    program = json.dumps(contract["program"]).encode()
+    return {
+        "program": base64.b64encode(gzip.compress(program)).decode(),
+        "entry_points_by_type": contract["entry_points_by_type"],
+        "abi": contract.get("abi", []),
+    }
+
+
+@functools.lru_cache(maxsize=16)
+def _contract_definition(contract_path, mtime_ns, size):
+    """Compressed contract definition of a compiled contract, built once per file version."""
+    with open(contract_path) as fp:
+        return compress_contract(json.load(fp))
+
+
+def _definition(contract):
+    """Definition of a contract given as a compiled file path or a store class (see sarayulib.classes)."""
+    if hasattr(contract, "definition"):
+        return contract.definition()
+    stat = os.stat(contract)
+    return _contract_definition(contract, stat.st_mtime_ns, stat.st_size)
+
+
+def _path(contract):
+    return contract.path() if hasattr(contract, "path") else contract
+
+
+# Failures of requests that never reached the gateway, and answers of a gateway
+# that did not process the request: a write can be resent after those.
+_NOT_SENT_ERRORS = (ConnectionRefusedError, socket.gaierror)
+_NOT_PROCESSED_STATUSES = (429, 503)
+
+
+def _unsent(err):
+    """Whether a failed write certainly did not reach the gateway, so it can be retried."""
+    if getattr(err, "kind", None) != "transient":
+        return False
+    return isinstance(err.__cause__, _NOT_SENT_ERRORS) or err.status in _NOT_PROCESSED_STATUSES
+
+
+class HttpTransport:
+    """Talk to the feeder gateway and gateway HTTP APIs directly."""
+
+    name = "http"
+
+    def __init__(self, network="localhost"):
+        self.network = network
+        url = gateway_url(network)
+        if url is None:
+            raise TransportError(f"No gateway url known for network {network}")
+        self.pool = _get_pool(url)
+
+    def _request(self, method, path, params=None, body=None):
+        """
+        Send a request, retrying transient failures. A write (a POST outside the
+        feeder gateway) is only retried when the gateway cannot have taken it,
+        since resending an accepted transaction would execute it twice.
+        """
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        if method == "POST" and not path.startswith("/feeder_gateway/"):
+            return with_retries(lambda: self._request_once(method, path, body), retryable=_unsent)
+        return with_retries(lambda: self._request_once(method, path, body))
+
+    def _request_once(self, method, path, body):
+        logging.debug(f"{method} {path}")
+        try:
+            status, data = self.pool.request(method, path, body)
+        except (OSError, http.client.HTTPException) as err:
+            raise TransportError(f"Connection to the gateway failed for {path}: {err!r}", "transient") from err
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            payload = data.decode(errors="replace")
+        if status != 200:
+            code = None
+            if isinstance(payload, dict):
+                code = payload.get("code")
+                message = f"{code}: {payload.get('message')}"
+            else:
+                message = payload
+            # Classified from what the gateway answered only, not from the path.
+            detail = payload.get("message") if isinstance(payload, dict) else payload
+            kind = classify_error(detail, status, code)
+            raise TransportError(f"Gateway returned {status} for {path}: {message}", kind, status)
+        return payload
+
+    def call(self, address, abi, function, inputs, block="pending"):
+        """Call a view function at a block ("pending", "latest" or a number). Returns the result felts as strings."""
+        body = {
+            "contract_address": hex_address(address),
+            "entry_point_selector": hex(get_selector(function)),
+            "calldata": [str(normalize_number(x)) for x in inputs],
+            "signature": [],
+        }
+        out = self._request("POST", "/feeder_gateway/call_contract",
+                            params={"blockNumber": block}, body=body)
+        return [str(normalize_number(x)) for x in out["result"]]
+
+    def block_number(self, block="latest"):
+        """Return the number of a block ("latest" or a number)."""
+        return self.get_block(block)["block_number"]
+
+    def get_block(self, block="latest"):
+        """Return a block ("latest" or a number) with its transactions and receipts."""
+        return self._request("GET", "/feeder_gateway/get_block", params={"blockNumber": block})
+
+    def invoke(self, address, abi, function, inputs, signature, max_fee, nonce=None, version=1):
+        """Send an account (__execute__) invoke transaction. Returns the tx hash."""
+        if nonce is None:
+            nonce = self.get_nonce(address)
+        tx = {
+            "type": "INVOKE_FUNCTION",
+            "sender_address": hex_address(address),
+            "calldata": [str(normalize_number(x)) for x in inputs],
+            "signature": [str(s) for s in signature],
+            "max_fee": hex(max_fee),
+            "version": hex(version),
+            "nonce": hex(nonce),
+        }
+        out = self._request("POST", "/gateway/add_transaction", body=tx)
+        return out["transaction_hash"]
+
+    def _query_tx(self, address, inputs, signature, nonce, version):
+        return {
+            "type": "INVOKE_FUNCTION",
+            "sender_address": hex_address(address),
+            "calldata": [str(normalize_number(x)) for x in inputs],
+            "signature": [str(s) for s in signature],
+            "max_fee": hex(0),
+            "version": hex(version),
+            "nonce": hex(nonce),
+        }
+
+    def estimate_fee(self, address, abi, function, inputs, signature, nonce, version):
+        """Estimate the fee of an account (__execute__) invoke, signed with a query version."""
+        return self._request("POST", "/feeder_gateway/estimate_fee", params={"blockNumber": "pending"},
+                             body=self._query_tx(address, inputs, signature, nonce, version))
+
+    def estimate_fee_bulk(self, queries):
+        """Estimate the fees of many estimate_fee() queries in one request."""
+        body = [self._query_tx(address, inputs, signature, nonce, version)
+                for address, _, _, inputs, signature, nonce, version in queries]
+        return self._request("POST", "/feeder_gateway/estimate_fee_bulk",
+                             params={"blockNumber": "pending"}, body=body)
+
+    def deploy(self, contract, inputs=None):
+        """Deploy a compiled contract (a file path or a store class). Returns (address, tx_hash) as ints."""
+        tx = {
+            "type": "DEPLOY",
+            "contract_address_salt": hex(secrets.randbits(251)),
+            "contract_definition": _definition(contract),
+            "constructor_calldata": [str(normalize_number(x)) for x in inputs or []],
+            "version": hex(0),
+        }
+        out = self._request("POST", "/gateway/add_transaction", body=tx)
+        return normalize_number(out["address"]), normalize_number(out["transaction_hash"])
+
+    def _declare_tx(self, sender, contract, signature, nonce, max_fee, version):
+        return {
+            "type": "DECLARE",
+            "sender_address": hex_address(sender),
+            "contract_class": _definition(contract),
+            "signature": [str(s) for s in signature],
+            "max_fee": hex(max_fee),
+            "version": hex(version),
+            "nonce": hex(nonce),
+        }
+
+    def declare(self, sender, contract, signature, nonce, max_fee, version=1):
+        """Declare a class through an account. Returns (class_hash, tx_hash) as ints."""
+        out = self._request("POST", "/gateway/add_transaction",
+                            body=self._declare_tx(sender, contract, signature, nonce, max_fee, version))
+        return normalize_number(out["class_hash"]), normalize_number(out["transaction_hash"])
+
+    def estimate_declare_fee(self, sender, contract, signature, nonce, version):
+        """Estimate the fee of a declare transaction signed with a query version."""
+        return self._request("POST", "/feeder_gateway/estimate_fee", params={"blockNumber": "pending"},
+                             body=self._declare_tx(sender, contract, signature, nonce, 0, version))
+
+    def class_exists(self, class_hash):
+        """Return whether a class is declared."""
+        try:
+            self._request("GET", "/feeder_gateway/get_class_by_hash", params={"classHash": hex(class_hash)})
+        except TransportError as err:
+            if err.kind == "transient":
+                raise
+            return False
+        return True
+
+    def mint(self, address, amount):
+        """Fund an address with fee tokens (starknet-devnet only). Returns the new balance."""
+        out = self._request("POST", "/mint",
+                            body={"address": hex_address(address), "amount": amount, "lite": True})
+        return out["new_balance"]
+
+    def get_nonce(self, address):
+        out = self._request("GET", "/feeder_gateway/get_nonce",
+                            params={"contractAddress": hex(normalize_number(address)),
+                                    "blockNumber": "pending"})
+        return normalize_number(out)
+
+    def tx_status(self, tx_hash):
+        """Return the transaction status as a dict (contains 'tx_status')."""
+        return self._request("GET", "/feeder_gateway/get_transaction_status",
+                             params={"transactionHash": tx_hash})
+
+
+class CliTransport:
+    """Spawn the `starknet` CLI for every request."""
+
+    name = "cli"
+
+    def __init__(self, network="localhost"):
+        self.network = network
+
+    def _gateway_args(self, feeder=True, gateway=True):
+        args = []
+        if set_network_var(self.network) is None:
+            if feeder:
+                args.append(f"--feeder_gateway_url={gateway_url(self.network)}")
+            if gateway:
+                args.append(f"--gateway_url={gateway_url(self.network)}")
+        return args
+
+    def _run(self, command, retry=True):
+        """Run a starknet CLI command. Transient failures are retried unless retry is False."""
+        if not retry:
+            return self._run_once(command)
+        return with_retries(lambda: self._run_once(command))
+
+    def _run_once(self, command):
+        logging.debug(command)
+        with span("subprocess spawn", command=" ".join(command[:2])):
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with span("subprocess exec", command=" ".join(command[:2])):
+            out, error = process.communicate()
+
+        if process.returncode != 0:
+            message = error.decode(errors="replace").strip() or out.decode(errors="replace").strip()
+            raise TransportError(message or f"{' '.join(command[:2])} exited with {process.returncode}")
+        return out.strip().decode("utf-8")
+
+    def call(self, address, abi, function, inputs, block="pending"):
+        command = ["starknet", "call", "--address", hex_address(address), "--abi", abi, "--function", function]
+
+        if len(inputs) > 0:
+            command.append("--inputs")
+            command.extend(inputs)
+
+        if block != "pending":
+            command.extend(["--block_number", str(block)])
+        command.extend(self._gateway_args())
+        command.append("--no_wallet")
+        return self._run(command).split()
+
+    def block_number(self, block="latest"):
+        return self.get_block(block)["block_number"]
+
+    def get_block(self, block="latest"):
+        command = ["starknet", "get_block", "--number", str(block)]
+        command.extend(self._gateway_args(gateway=False))
+        return json.loads(self._run(command))
+
+    def invoke(self, address, abi, function, inputs, signature, max_fee, nonce=None, version=1):
+        command = ["starknet", "invoke", "--address", hex_address(address), "--abi", abi, "--function", function]
+        command.extend(self._gateway_args())
+
+        if len(inputs) > 0:
+            command.append("--inputs")
+            command.extend(inputs)
+
+        if signature is not None:
+            command.append("--signature")
+            command.extend(signature)
+
+        command.append("--max_fee")
+        command.append(str(max_fee))
+
+        if nonce is not None:
+            command.append("--nonce")
+            command.append(str(nonce))
+
+        command.append("--no_wallet")
+        # A failed run may still have sent the transaction: a retry could execute it twice.
+        _, tx_hash = parse_send(self._run(command, retry=False))
+        return tx_hash
+
+    def estimate_fee(self, address, abi, function, inputs, signature, nonce, version):
+        command = ["starknet", "estimate_fee", "--address", hex_address(address), "--abi", abi,
+                   "--function", function, "--nonce", str(nonce)]
+        command.extend(self._gateway_args(gateway=False))
+        if len(inputs) > 0:
+            command.append("--inputs")
+            command.extend(inputs)
+        command.append("--signature")
+        command.extend(signature)
+        command.append("--no_wallet")
+        out = self._run(command)
+        # The estimated fee is: 1234 WEI (1.234e-15 ETH).\nGas usage: 12\nGas price: 100 WEI
+        numbers = [int(n) for n in re.findall(r":\s*(\d+)", out)]
+        if len(numbers) < 3:
+            raise TransportError(f"Unexpected estimate_fee output: {out}")
+        return {"overall_fee": numbers[0], "gas_usage": numbers[1], "gas_price": numbers[2], "unit": "wei"}
+
+    def estimate_fee_bulk(self, queries):
+        return [self.estimate_fee(*query) for query in queries]
+
+    def declare(self, sender, contract, signature, nonce, max_fee, version=1):
+        command = ["starknet", "declare", "--contract", _path(contract), "--sender", hex_address(sender),
+                   "--nonce", str(nonce), "--max_fee", str(max_fee)]
+        command.append("--signature")
+        command.extend(signature)
+        command.extend(self._gateway_args(feeder=False))
+        command.append("--no_wallet")
+        out = self._run(command, retry=False)
+        class_hash = re.search(r"Contract class hash: (0x[0-9a-fA-F]+)", out)
+        tx_hash = re.search(r"Transaction hash: (0x[0-9a-fA-F]+)", out)
+        if class_hash is None or tx_hash is None:
+            raise TransportError(f"Unexpected declare output: {out}")
+        return int(class_hash.group(1), 16), int(tx_hash.group(1), 16)
+
+    def estimate_declare_fee(self, sender, contract, signature, nonce, version):
+        raise TransportError("Estimating declare fees needs the http transport (SARAYU_TRANSPORT=http)")
+
+    def class_exists(self, class_hash):
+        command = ["starknet", "get_class_by_hash", "--class_hash", hex(class_hash)]
+        command.extend(self._gateway_args(gateway=False))
+        try:
+            self._run(command)
+        except TransportError as err:
+            if err.kind == "transient":
+                raise
+            return False
+        return True
+
+    def deploy(self, contract, inputs=None):
+        command = ["starknet", "deploy", "--contract", _path(contract)]
+
+        if inputs:
+            command.append("--inputs")
+            command.extend(str(x) for x in inputs)
+
+        command.extend(self._gateway_args(feeder=False))
+        command.append("--no_wallet")
+        logging.info(command)
+
+        # The CLI picks a new salt on every run: a retry could deploy twice.
+        return parse_information(self._run(command, retry=False))
+
+    def get_nonce(self, address):
+        # Starknet CLI requires a hex string for get_nonce command
+        if not str(address).startswith("0x"):
+            address = hex(int(address))
+
+        command = ["starknet", "get_nonce", "--contract_address", address]
+        command.extend(self._gateway_args(gateway=False))
+        return int(self._run(command))
+
+    def tx_status(self, tx_hash):
+        command = ["starknet", "tx_status", "--hash", tx_hash]
+        command.extend(self._gateway_args(gateway=False))
+        return json.loads(self._run(command))
+
+
+_TRANSPORT_CLASSES = {
+    HttpTransport.name: HttpTransport,
+    CliTransport.name: CliTransport,
+}
+
+_TRANSPORTS = {}
+
+
+def get_transport(network="localhost", name=None):
+    """Return the (cached) transport for a network and its current gateway url."""
+    name = name or os.environ.get("SARAYU_TRANSPORT", TRANSPORT)
+    if name not in TRANSPORTS:
+        raise TransportError(f"Unknown transport '{name}'. Use one of {TRANSPORTS}")
+
+    key = (name, network, gateway_url(network))
+    if key not in _TRANSPORTS:
+        _TRANSPORTS[key] = _TRANSPORT_CLASSES[name](network)
+    return _TRANSPORTS[key]
@@ -1,13 +1,28 @@
 """Utilities"""
 
+import hashlib
+import json
 import os
 import logging
 import re
 import subprocess
 
-from starkware.starknet.public.abi import get_selector_from_name
+GATEWAY={
+    "localhost": "http://127.0.0.1:5050/",
+    "goerli": "https://alpha4.starknet.io/",
+    "mainnet": "https://alpha-mainnet.starknet.io/",
+}
 
-GATEWAY={"localhost": "http://127.0.0.1:5050/"}
+def gateway_url(network="localhost"):
+    """
+    Return the gateway base url of a network. SARAYU_GATEWAY_URL_<NETWORK>
+    overrides it, and SARAYU_GATEWAY_URL overrides localhost (another devnet,
+    a leased devnet of the pool or a mock gateway). Read on every call.
+    """
+    url = os.environ.get(f"SARAYU_GATEWAY_URL_{network.upper()}")
+    if url is None and network == "localhost":
+        url = os.environ.get("SARAYU_GATEWAY_URL")
+    return url or GATEWAY.get(network)
 
 def set_network_var(network="localhost"):
     if network == "mainnet":
@@ -19,8 +34,24 @@ def set_network_var(network="localhost"):
 
     return
 
+def state_path(name):
+    """
+    Path of a per-network state file (registry, accounts, nonces, caches). They
+    live in the working directory, or in SARAYU_STATE_DIR: a leased devnet
+    has its own (see sarayulib.devnet). Read on every call.
+    """
+    return os.path.join(os.environ.get("SARAYU_STATE_DIR", ""), name)
+
 def get_account_file_name(network):
-    return f"{network}.accounts.json"
+    return state_path(f"{network}.accounts.json")
+
+# Order of the STARK curve: private keys live in [1, EC_ORDER).
+_EC_ORDER = 0x800000000000010FFFFFFFFFFFFFFFFB781126DCAE7B2321E66A241ADC64D2F
+
+def derive_private_key(seed, index):
+    """Deterministically derive the index-th private key of a seed."""
+    digest = hashlib.sha256(f"{seed}:{index}".encode()).digest()
+    return int.from_bytes(digest, "big") % (_EC_ORDER - 1) + 1
 
 # Taken from nile.
 def str_to_felt(text):
@@ -70,6 +101,7 @@ def _pad_hex_to_64(hexadecimal):
     if len(hexadecimal) < 66:
         missing_zeros = 66 - len(hexadecimal)
         return hexadecimal[:2] + missing_zeros * "0" + hexadecimal[2:]
+    return hexadecimal
 
 
 def stringify(x, process_short_strings=False):
@@ -82,6 +114,18 @@ def stringify(x, process_short_strings=False):
         return str(x)
 
 
+def load_document(path):
+    """Load a JSON file, or a YAML file (.yaml/.yml) when PyYAML is installed."""
+    with open(path) as fp:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise Exception(f"PyYAML is needed to read {path}: pip install pyyaml, or use JSON.")
+            return yaml.safe_load(fp)
+        return json.load(fp)
+
+
 def parse_information(x):
     """Extract information from deploy/declare command."""
     # address is 64, tx_hash is 64 chars long
@@ -105,50 +149,39 @@ def deployments_load(address_or_alias, network="localhost"):
     - If address_or_alias is an int, address is assumed.
     - If address_or_alias is a str, alias is assumed.
     """
-    file = f"{network}.deployments.txt"
-    if not os.path.exists(file):
-        return
-
-    with open(file) as fp:
-        for line in fp:
-            [address, abi, *alias] = line.strip().split(":")
-            address = normalize_number(address)
-            identifiers = [address]
-            if type(address_or_alias) is not int:
-                identifiers = alias
-            if address_or_alias in identifiers:
-                yield address, abi
+    from sarayulib.deployments import find_deployments
+    from sarayulib.trace import span
+
+    with span("deployments lookup", key=address_or_alias):
+        deployments = find_deployments(address_or_alias, network)
+    yield from deployments
 
 def deployments_register(address, abi, network, alias):
     """Register a new deployment."""
-    file = f"{network}.deployments.txt"
+    from sarayulib.deployments import register_deployments, get_deployments_file_name
 
+    file = get_deployments_file_name(network)
     if alias is not None:
-        if deployment_exists(alias, network):
-            raise Exception(f"Alias {alias} already exists in {file}")
-
-    with open(file, "a") as fp:
-        # Save address as hex
-        address = hex_address(address)
-        if alias is not None:
-            logging.info(f"📦 Registering deployment as {alias} in {file}")
-        else:
-            logging.info(f"📦 Registering {address} in {file}")
-
-        fp.write(f"{address}:{abi}")
-        if alias is not None:
-            fp.write(f":{alias}")
-        fp.write("\n")
+        logging.info(f"📦 Registering deployment as {alias} in {file}")
+    else:
+        logging.info(f"📦 Registering {hex_address(address)} in {file}")
+
+    from sarayulib.trace import span
+
+    with span("deployments register", alias=alias):
+        register_deployments([(address, abi, alias)], network)
 
 def from_call_to_call_array(calls):
     """Transform from Call to CallArray."""
+    from sarayulib.abi import get_selector
+
     call_array = []
     calldata = []
     for _, call in enumerate(calls):
         assert len(call) == 3, "Invalid call parameters"
         entry = (
             call[0],
-            get_selector_from_name(call[1]),
+            get_selector(call[1]),
             len(calldata),
             len(call[2]),
         )
@@ -0,0 +1,54 @@
+"""Encoding of inputs and decoding of outputs with an ABI (sarayulib.abi.AbiIndex)."""
+
+import pytest
+
+from sarayulib import abi
+from sarayulib.utils import str_to_felt
+
+ABI = [
+    {"type": "struct", "name": "Uint256", "size": 2,
+     "members": [{"name": "low", "type": "felt", "offset": 0}, {"name": "high", "type": "felt", "offset": 1}]},
+    {"type": "struct", "name": "Point", "size": 2,
+     "members": [{"name": "x", "type": "felt", "offset": 0}, {"name": "y", "type": "felt", "offset": 1}]},
+    {"type": "function", "name": "set",
+     "inputs": [{"name": "owner", "type": "felt"}, {"name": "amount", "type": "Uint256"},
+                {"name": "points_len", "type": "felt"}, {"name": "points", "type": "Point*"}],
+     "outputs": []},
+    {"type": "function", "name": "get", "inputs": [],
+     "outputs": [{"name": "total", "type": "Uint256"}, {"name": "values_len", "type": "felt"},
+                 {"name": "values", "type": "felt*"}, {"name": "pair", "type": "(felt, felt)"}]},
+]
+
+
+@pytest.fixture
+def index(monkeypatch):
+    # Selectors come from starkware: any distinct number does here.
+    monkeypatch.setattr(abi, "get_selector", lambda name: sum(name.encode()))
+    return abi.AbiIndex(ABI)
+
+
+def test_flat_values_are_calldata_already(index):
+    assert index.encode_inputs("set", ["1", "0x2", "abc"]) == [1, 2, str_to_felt("abc")]
+
+
+def test_structured_values_follow_the_inputs(index):
+    calldata = index.encode_inputs("set", [5, 2**128 + 1, [{"x": 1, "y": 2}, [3, 4]]])
+    assert calldata == [5, 1, 1, 2, 1, 2, 3, 4]
+    assert index.encode_inputs("set", {"owner": 5, "amount": [7, 0], "points": []}) == [5, 7, 0, 0]
+
+
+def test_wrong_inputs_are_rejected(index):
+    with pytest.raises(ValueError):
+        index.encode_inputs("set", [5, [[1, 2]]])
+    with pytest.raises(ValueError):
+        index.encode_inputs("set", [5, 1, [[1, 2, 3]]])
+    with pytest.raises(ValueError):
+        index.encode_inputs("missing", [[1]])
+
+
+def test_decode_outputs(index):
+    assert index.decode_outputs("get", ["0x1", "0", "2", "7", "8", "9", "10"]) == {
+        "total": {"low": 1, "high": 0},
+        "values": [7, 8],
+        "pair": [9, 10],
+    }
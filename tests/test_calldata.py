@@ -0,0 +1,82 @@
+"""Bulk calldata encoding and felt arrays read from files (sarayulib.calldata)."""
+
+import pytest
+
+from sarayulib.calldata import encode_felts, read_words, split_arguments, split_uint256
+from sarayulib.utils import str_to_felt
+
+
+class _Index:
+    """encode_inputs of a function taking (felt, felt*): the array is prefixed with its length."""
+
+    def encode_inputs(self, function, arguments):
+        head, items = arguments
+        return [head, len(items), *items]
+
+
+def test_encode_felts_parses_numbers_and_falls_back_to_short_strings():
+    assert encode_felts([7, "12", "0x1f", "hello"]) == [7, 12, 0x1f, str_to_felt("hello")]
+    # Not hex after all: a short string that starts with 0x.
+    assert encode_felts(["0xzz"]) == [str_to_felt("0xzz")]
+
+
+def test_split_uint256_bounds():
+    assert split_uint256([1, 2**128 + 3]) == [1, 0, 3, 1]
+    assert split_uint256([2**256 - 1]) == [2**128 - 1, 2**128 - 1]
+    assert split_uint256([]) == []
+    with pytest.raises(ValueError):
+        split_uint256([2**256])
+    with pytest.raises(ValueError):
+        split_uint256([-1])
+
+
+def test_read_words(tmp_path):
+    path = tmp_path / "values.bin"
+    path.write_bytes((1).to_bytes(32, "big") + (2**255).to_bytes(32, "big"))
+    assert read_words(str(path)) == [1, 2**255]
+
+    empty = tmp_path / "empty.bin"
+    empty.write_bytes(b"")
+    assert read_words(str(empty)) == []
+
+    path.write_bytes(b"\0" * 33)
+    with pytest.raises(ValueError):
+        read_words(str(path))
+
+
+def test_small_calldata_is_not_split():
+    calls = split_arguments(_Index(), "f", [9, [1, 2, 3]], 10)
+    assert calls == [([9, [1, 2, 3]], [9, 3, 1, 2, 3])]
+    assert split_arguments(_Index(), "f", [9, [1, 2, 3]], None) == calls
+
+
+def test_array_is_split_in_chunks_within_the_limit():
+    items = list(range(10))
+    calls = split_arguments(_Index(), "f", [9, items], 6)
+    # base = 2 felts (head and length), per_item = 1: chunks of 4 items.
+    assert [arguments[1] for arguments, _ in calls] == [items[0:4], items[4:8], items[8:10]]
+    assert all(len(calldata) <= 6 for _, calldata in calls)
+    assert all(arguments[0] == 9 for arguments, _ in calls)
+
+
+def test_chunk_size_accounts_for_felts_per_item():
+    class _Uint256Index:
+        def encode_inputs(self, function, arguments):
+            head, items = arguments
+            return [head, len(items), *split_uint256(items)]
+
+    calls = split_arguments(_Uint256Index(), "f", [9, list(range(7))], 8)
+    # base = 2 felts, per_item = 2: chunks of 3 items.
+    assert [len(arguments[1]) for arguments, _ in calls] == [3, 3, 1]
+    assert [len(calldata) for _, calldata in calls] == [8, 8, 4]
+
+
+def test_calldata_that_cannot_be_split_is_one_call():
+    # The other arguments already take the whole budget.
+    calls = split_arguments(_Index(), "f", [9, list(range(10))], 2)
+    assert len(calls) == 1
+    # Flat calldata, without an array argument.
+    class _Flat:
+        def encode_inputs(self, function, arguments):
+            return list(arguments)
+    assert split_arguments(_Flat(), "f", list(range(10)), 4) == [(list(range(10)), list(range(10)))]
@@ -0,0 +1,60 @@
+"""Deployment registry and its import of the text file (sarayulib.deployments)."""
+
+import os
+
+import pytest
+
+from sarayulib.deployments import (
+    AliasExistsError, find_deployments, get_deployments_file_name, list_deployments, register_deployments,
+)
+
+
+@pytest.fixture
+def txt(tmp_path, monkeypatch):
+    monkeypatch.setenv("SARAYU_STATE_DIR", str(tmp_path))
+    return get_deployments_file_name("localhost")
+
+
+def test_existing_text_file_is_imported(txt):
+    with open(txt, "w") as fp:
+        fp.write("0x1:abis/a.json:a\n0x2:abis/b.json:b:c\n0x3:abis/d.json\n")
+    assert list_deployments() == [(1, "abis/a.json", "a"), (2, "abis/b.json", "b"),
+                                  (2, "abis/b.json", "c"), (3, "abis/d.json", None)]
+    assert find_deployments("c") == [(2, "abis/b.json")]
+    assert find_deployments(3) == [(3, "abis/d.json")]
+
+
+def test_appended_lines_are_imported_once_complete(txt):
+    register_deployments([(1, "abis/a.json", "a")])
+    with open(txt, "a") as fp:
+        fp.write("0x2:abis/b.json:b\n0x3:abis/c.j")
+    assert [alias for _, _, alias in list_deployments()] == ["a", "b"]
+    with open(txt, "a") as fp:
+        fp.write("son:c\n")
+    assert [alias for _, _, alias in list_deployments()] == ["a", "b", "c"]
+
+
+def test_registration_is_atomic(txt):
+    register_deployments([(1, "abis/a.json", "a")])
+    with pytest.raises(AliasExistsError):
+        register_deployments([(2, "abis/b.json", "b"), (3, "abis/c.json", "a")])
+    assert [alias for _, _, alias in list_deployments()] == ["a"]
+    with open(txt) as fp:
+        assert len(fp.readlines()) == 1
+
+
+def test_replaced_or_removed_file_rebuilds_the_index(txt):
+    register_deployments([(1, "abis/a.json", "a"), (2, "abis/b.json", "b")])
+    # Rewritten with a shorter file, and replaced by another file of the same size.
+    with open(txt, "w") as fp:
+        fp.write("0x3:abis/c.json:c\n")
+    assert [alias for _, _, alias in list_deployments()] == ["c"]
+    with open(f"{txt}.new", "w") as fp:
+        fp.write("0x4:abis/d.json:d\n")
+    os.replace(f"{txt}.new", txt)
+    assert [alias for _, _, alias in list_deployments()] == ["d"]
+
+    os.remove(txt)
+    assert list_deployments() == []
+    register_deployments([(5, "abis/e.json", "e")])
+    assert [alias for _, _, alias in list_deployments()] == ["e"]
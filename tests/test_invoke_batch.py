@@ -0,0 +1,34 @@
+"""Packing of calls into __execute__ transactions (sarayulib.cmd.invoke_batch.pack_calls)."""
+
+import pytest
+
+# Signing (sarayulib.cmd.invoke) needs starkware.
+invoke_batch = pytest.importorskip("sarayulib.cmd.invoke_batch")
+pack_calls = invoke_batch.pack_calls
+
+
+def _calls(*sizes):
+    return [(row, [0x1, "f", [0] * size]) for row, size in enumerate(sizes)]
+
+
+def _size(batch):
+    return invoke_batch.EXECUTE_HEADER_SIZE + sum(
+        invoke_batch.CALL_ARRAY_ENTRY_SIZE + len(call[2]) for _, call in batch)
+
+
+def test_batches_stay_within_the_calldata_budget():
+    batches = pack_calls(_calls(3, 3, 3, 3), max_calldata=16, max_calls=10)
+    # Header (2) + 2 calls of 4 + 3 felts = 16.
+    assert [[row for row, _ in batch] for batch in batches] == [[0, 1], [2, 3]]
+    assert all(_size(batch) <= 16 for batch in batches)
+
+
+def test_batches_stay_within_the_call_budget():
+    batches = pack_calls(_calls(*[0] * 5), max_calldata=1000, max_calls=2)
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+
+
+def test_rows_keep_their_order_and_oversized_calls_go_alone():
+    batches = pack_calls(_calls(1, 50, 1), max_calldata=20, max_calls=10)
+    assert [[row for row, _ in batch] for batch in batches] == [[0], [1], [2]]
+    assert pack_calls([], max_calldata=20) == []
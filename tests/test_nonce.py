@@ -0,0 +1,64 @@
+"""Local nonce reservations (sarayulib.nonce.NonceManager)."""
+
+import pytest
+
+from sarayulib import nonce
+from sarayulib.nonce import NonceManager
+from sarayulib.transport import TransportError
+
+
+class _Transport:
+    """Answers get_nonce with the nonce of the gateway, counting the requests."""
+
+    def __init__(self, value):
+        self.value = value
+        self.fetches = 0
+
+    def get_nonce(self, address):
+        self.fetches += 1
+        return self.value
+
+
+@pytest.fixture
+def transport(tmp_path, monkeypatch):
+    monkeypatch.setenv("SARAYU_STATE_DIR", str(tmp_path))
+    transport = _Transport(5)
+    monkeypatch.setattr(nonce, "get_transport", lambda network: transport)
+    return transport
+
+
+def test_reservations_are_consecutive_and_fetched_once(transport):
+    nonces = NonceManager()
+    assert [nonces.reserve(0x1) for _ in range(3)] == [5, 6, 7]
+    assert nonces.reserve(0x1, count=4) == 8
+    # Another manager (another process) continues the same sequence.
+    assert NonceManager().reserve(0x1) == 12
+    assert transport.fetches == 1
+
+
+def test_accounts_have_their_own_sequence(transport):
+    nonces = NonceManager()
+    assert nonces.reserve(0x1) == 5
+    assert nonces.reserve(0x2) == 5
+    assert nonces.last_reserved([0x1, 0x3])[0x3] == 0
+
+
+def test_nonce_is_refetched_after_the_ttl(transport):
+    nonces = NonceManager(ttl=-1)
+    nonces.reserve(0x1)
+    transport.value = 9
+    assert nonces.reserve(0x1) == 9
+    assert transport.fetches == 2
+
+
+def test_resync_drops_local_reservations(transport):
+    nonces = NonceManager()
+    nonces.reserve(0x1, count=3)
+    assert nonces.resync(0x1) == 5
+    assert nonces.reserve(0x1) == 5
+
+
+def test_nonce_errors():
+    assert nonce.is_nonce_error(TransportError("Invalid nonce", "nonce"))
+    assert nonce.is_nonce_error(Exception("StarknetErrorCode.INVALID_TRANSACTION_NONCE: Invalid"))
+    assert not nonce.is_nonce_error(TransportError("Gateway returned 500 for /feeder_gateway/get_nonce", "other"))
@@ -0,0 +1,102 @@
+"""Classification of gateway failures (sarayulib.transport.classify_error), and their retries."""
+
+import json
+
+import pytest
+
+from sarayulib.transport import HttpTransport, TransportError, classify_error
+
+
+class _Pool:
+    """Answers every request with one status and body."""
+
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+        self.attempts = 0
+
+    def request(self, method, path, body=None):
+        self.attempts += 1
+        return self.status, json.dumps(self.body).encode()
+
+
+def _error(status, body, path):
+    transport = HttpTransport.__new__(HttpTransport)
+    transport.pool = _Pool(status, body)
+    with pytest.raises(TransportError) as info:
+        transport._request_once("GET", path, None)
+    return info.value
+
+
+def test_503_on_feeder_path_is_transient():
+    err = _error(503, "Service Unavailable",
+                 "/feeder_gateway/get_transaction_status?transactionHash=0xfee5030429")
+    assert err.kind == "transient"
+    assert err.status == 503
+
+
+def test_revert_on_call_contract_is_revert():
+    err = _error(500, {"code": "StarknetErrorCode.TRANSACTION_FAILED", "message": "Error at pc=0:12"},
+                 "/feeder_gateway/call_contract?blockNumber=pending")
+    assert err.kind == "revert"
+
+
+def test_error_on_nonce_path_is_not_nonce():
+    err = _error(500, {"code": "StarknetErrorCode.UNINITIALIZED_CONTRACT", "message": "Requested contract "
+                       "address 0x1 is not deployed."}, "/feeder_gateway/get_nonce?contractAddress=0x1")
+    assert err.kind == "revert"
+    err = _error(503, "Service Unavailable", "/feeder_gateway/get_nonce?contractAddress=0x1")
+    assert err.kind == "transient"
+
+
+def test_codes_are_matched_exactly():
+    assert _error(500, {"code": "StarknetErrorCode.INVALID_TRANSACTION_NONCE", "message": "Invalid nonce"},
+                  "/gateway/add_transaction").kind == "nonce"
+    assert _error(500, {"code": "StarknetErrorCode.INSUFFICIENT_MAX_FEE", "message": "Max fee too low"},
+                  "/gateway/add_transaction").kind == "fee"
+    # A StarkNet error is final, even when answered with a 500.
+    assert _error(500, {"code": "StarknetErrorCode.BLOCK_NOT_FOUND", "message": "Block number not found"},
+                  "/feeder_gateway/get_block?blockNumber=7").kind == "other"
+
+
+def test_cli_output_is_classified_without_its_url():
+    message = ("Got BadRequest while trying to access "
+               "https://alpha4.starknet.io/feeder_gateway/get_nonce?contractAddress=0xfee. "
+               "Status code: 503; text: Service Unavailable.")
+    assert classify_error(message) == "transient"
+    message = ("Got BadRequest while trying to access https://alpha4.starknet.io/gateway/add_transaction. "
+               "Status code: 500; text: {\"code\": \"StarknetErrorCode.INSUFFICIENT_MAX_FEE\"}.")
+    assert classify_error(message) == "fee"
+
+
+class _FailingPool:
+    """Fails every request with an error, counting the attempts."""
+
+    def __init__(self, error):
+        self.error = error
+        self.attempts = 0
+
+    def request(self, method, path, body=None):
+        self.attempts += 1
+        raise self.error
+
+
+def _attempts(pool, method, path, monkeypatch):
+    monkeypatch.setenv("SARAYU_RETRY_ATTEMPTS", "2")
+    monkeypatch.setenv("SARAYU_RETRY_BASE_DELAY", "0")
+    transport = HttpTransport.__new__(HttpTransport)
+    transport.pool = pool
+    with pytest.raises(TransportError):
+        transport._request(method, path, body={})
+    return pool.attempts
+
+
+def test_timed_out_write_is_not_resent(monkeypatch):
+    assert _attempts(_FailingPool(TimeoutError()), "POST", "/gateway/add_transaction", monkeypatch) == 1
+    assert _attempts(_FailingPool(TimeoutError()), "POST", "/feeder_gateway/call_contract", monkeypatch) == 3
+
+
+def test_unsent_write_is_retried(monkeypatch):
+    pool = _FailingPool(ConnectionRefusedError())
+    assert _attempts(pool, "POST", "/gateway/add_transaction", monkeypatch) == 3
+    assert _attempts(_Pool(503, "Service Unavailable"), "POST", "/gateway/add_transaction", monkeypatch) == 3